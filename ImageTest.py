@@ -1,11 +1,14 @@
 import wx
 import os
+import cv2
+import camera_script.image_cache as image_cache
 import camera_script.SFR as SFR
 import camera_script.ColorSaturation as ColorSaturation
 import camera_script.SNR as SNR
 import camera_script.hdr as hdr
 import camera_script.ChromaticAberration as ChromaticAberration
 import camera_script.Contrast as Contrast
+import camera_script.SFRChart as SFRChart
 
 
 
@@ -13,7 +16,7 @@ class ImageViewerFrame(wx.Frame):
     def __init__(self, parent, title):
         super(ImageViewerFrame, self).__init__(parent, title=title, size=(300, 200))
 
-        self.funcs = ["空间频率响应", "色彩饱和度", "信噪比", "横向色差", "动态范围", "对比度"]
+        self.funcs = ["空间频率响应", "色彩饱和度", "信噪比", "横向色差", "动态范围", "对比度", "全图空间频率响应"]
         self.func = ""
         self.path = ''
         
@@ -109,9 +112,11 @@ class ImageViewerFrame(wx.Frame):
         if self.func == self.funcs[5]:
             result = Contrast.analyze_contrast(self.path, block_size=32, method='RMS')
             Contrast.output(result)
+        if self.func == self.funcs[6]:
+            SFRChart.main(self.path)
 
     def LoadImage(self, path):
-        """加载并显示图片"""
+        """加载图片（解码结果进入共享缓存，后续测试直接复用）"""
         try:
             # 检查文件是否存在
             if not os.path.exists(path):
@@ -119,7 +124,9 @@ class ImageViewerFrame(wx.Frame):
                 return
                 
             # 加载图片
-            image = wx.Image(path, wx.BITMAP_TYPE_ANY)
+            image = image_cache.get(path)
+            if image is None:
+                raise ValueError("无法解码图像")
             
             self.image = image
 
@@ -133,20 +140,10 @@ class ImageViewerFrame(wx.Frame):
         self.SetStatusText("测试方法： " + tag)
     
     def ScaleImage(self, image, maxWidth, maxHeight):
-        """按比例缩放图片"""
-        origWidth = image.GetWidth()
-        origHeight = image.GetHeight()
-        
-        # 计算缩放比例
-        widthRatio = maxWidth / origWidth
-        heightRatio = maxHeight / origHeight
-        scale = min(widthRatio, heightRatio)
-        
-        # 应用缩放
-        newWidth = int(origWidth * scale)
-        newHeight = int(origHeight * scale)
-        
-        return image.Scale(newWidth, newHeight, wx.IMAGE_QUALITY_HIGH)
+        """按比例缩放图片（从缓存的预览金字塔取最接近的一级缩放）"""
+        preview = cv2.cvtColor(image.preview(maxWidth, maxHeight), cv2.COLOR_BGR2RGB)
+        height, width = preview.shape[:2]
+        return wx.Image(width, height, preview.tobytes())
     
     
     def OnExit(self, event):
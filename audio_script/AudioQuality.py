@@ -7,10 +7,11 @@ from sklearn.metrics import mean_squared_error
 from scipy.stats import pearsonr
 from pystoi import stoi
 import soundfile as sf
+from audio_loader import load_audio
 
 def compute_mel_spectrogram(audio_path, sr=16000, n_mels=80, hop_length=160):
     """计算梅尔图谱（转置为 (时间帧, 梅尔频带) 格式）"""
-    y, sr = librosa.load(audio_path, sr=sr)
+    y, sr = load_audio(audio_path, sr=sr)
     mel_spec = librosa.feature.melspectrogram(
         y=y, sr=sr, n_mels=n_mels, hop_length=hop_length, fmax=8000
     )
@@ -10,6 +10,7 @@ from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as FigureCanvas
 from matplotlib.figure import Figure
 import librosa
 from dtw import dtw
+from audio_loader import load_audio
 
 # 设置matplotlib中文字体支持
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans']
@@ -596,7 +597,7 @@ class SpeechQualityWorker(Thread):
                 pub.sendMessage("output", message=message)
             
             # 加载参考音频
-            ref_audio, sr_ref = librosa.load(self.ref_path, sr=None)
+            ref_audio, sr_ref = load_audio(self.ref_path, sr=None)
             pub.sendMessage("log", message=f"已加载参考音频: {self.ref_path} (采样率: {sr_ref}Hz)")
             
             total_files = len(self.audio_files)
@@ -609,7 +610,7 @@ class SpeechQualityWorker(Thread):
                 
                 try:
                     # 加载待分析音频
-                    test_audio, sr_test = librosa.load(test_file, sr=sr_ref)
+                    test_audio, sr_test = load_audio(test_file, sr=sr_ref)
                     
                     # 检查采样率
                     if sr_ref != sr_test:
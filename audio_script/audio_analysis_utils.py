@@ -2,6 +2,7 @@ import numpy as np
 import librosa
 from pesq import pesq
 from scipy.signal import correlate
+from audio_loader import load_audio
 
 # 音频对齐（互相关或DTW）
 def align_audio_signal(ref_audio, test_audio, sr, method='cc'):
@@ -43,8 +44,8 @@ def calculate_snr(ref_audio, test_audio):
 # PESQ主流程（自动采样率、增益归一化、长度对齐）
 def pesq_score(ref_path, deg_path, method='cc'):
     # 加载音频
-    ref_audio, sr_ref = librosa.load(ref_path, sr=None, mono=True)
-    deg_audio, sr_deg = librosa.load(deg_path, sr=sr_ref, mono=True)
+    ref_audio, sr_ref = load_audio(ref_path, sr=None, mono=True)
+    deg_audio, sr_deg = load_audio(deg_path, sr=sr_ref, mono=True)
     # 对齐
     aligned_audio, offset = align_audio_signal(ref_audio, deg_audio, sr_ref, method=method)
     # 增益归一化
@@ -0,0 +1,132 @@
+import os
+import struct
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import firwin, resample_poly
+
+# soundfile子类型 -> 可直接内存映射的numpy数据类型
+_NATIVE_DTYPES = {
+    'PCM_16': np.dtype('<i2'),
+    'PCM_32': np.dtype('<i4'),
+    'FLOAT': np.dtype('<f4'),
+    'DOUBLE': np.dtype('<f8'),
+}
+
+# 多声道读取时的分块大小（帧），避免整段多声道数据的临时拷贝
+BLOCK_FRAMES = 65536
+
+
+@lru_cache(maxsize=32)
+def _polyphase_filter(up, down):
+    """设计并缓存多相重采样的低通FIR滤波器（与scipy默认参数一致）"""
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    taps = firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+    taps = taps.astype(np.float32)
+    taps.setflags(write=False)
+    return taps
+
+
+def resample(y, orig_sr, target_sr, axis=-1):
+    """多相滤波重采样，采样率相同时直接返回原数组"""
+    if orig_sr == target_sr:
+        return y
+    g = gcd(int(orig_sr), int(target_sr))
+    up, down = int(target_sr) // g, int(orig_sr) // g
+    y = resample_poly(y, up, down, axis=axis, window=_polyphase_filter(up, down))
+    return y.astype(np.float32, copy=False)
+
+
+def _wav_data_offset(path):
+    """解析RIFF头，返回data块的字节偏移；非小端RIFF/WAVE文件返回None"""
+    with open(path, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            return None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = struct.unpack('<4sI', chunk)
+            if chunk_id == b'data':
+                return f.tell()
+            f.seek(size + (size & 1), os.SEEK_CUR)
+
+
+def _memmap_wav(path, info, native, start, frames):
+    offset = _wav_data_offset(path)
+    if offset is None:
+        return None
+    offset += start * info.channels * native.itemsize
+    shape = (frames, info.channels) if info.channels > 1 else (frames,)
+    return np.memmap(path, dtype=native, mode='c', offset=offset, shape=shape)
+
+
+def load_audio(path, sr=None, mono=True, offset=0.0, duration=None,
+               channel=None, dtype=np.float32, mmap=True):
+    """
+    读取音频文件，接口与librosa.load保持一致，返回 (y, sr)
+
+    - sr: 目标采样率，None表示保持原始采样率；仅在需要时做多相重采样
+    - offset/duration: 读取的起始时间和时长（秒）
+    - channel: 只读取指定声道（优先于mono）
+    - mmap: PCM/浮点WAV无需任何转换时返回内存映射数组（写时复制）
+    多声道文件返回 (声道数, 帧数)，与librosa一致。
+    """
+    dtype = np.dtype(dtype)
+    info = sf.info(path)
+    file_sr = info.samplerate
+    start = min(int(round(offset * file_sr)), info.frames)
+    frames = info.frames - start
+    if duration is not None:
+        frames = min(frames, int(round(duration * file_sr)))
+    if channel is not None and not 0 <= channel < info.channels:
+        raise ValueError(f"声道索引 {channel} 超出范围 (共 {info.channels} 声道)")
+    downmix = channel is None and mono and info.channels > 1
+    need_resample = sr is not None and sr != file_sr
+
+    native = _NATIVE_DTYPES.get(info.subtype)
+    if (mmap and frames > 0 and info.format == 'WAV' and native is not None
+            and native == dtype and not need_resample and not downmix):
+        y = _memmap_wav(path, info, native, start, frames)
+        if y is not None:
+            if info.channels > 1:
+                y = y[:, channel] if channel is not None else y.T
+            return y, file_sr
+
+    with sf.SoundFile(path) as f:
+        if start:
+            f.seek(start)
+        if info.channels == 1:
+            y = np.empty(frames, dtype=dtype)
+            n = len(f.read(dtype=dtype.name, out=y))
+            y = y[:n]
+        elif channel is None and not mono:
+            buf = np.empty((frames, info.channels), dtype=dtype)
+            n = len(f.read(dtype=dtype.name, out=buf))
+            y = buf[:n].T
+        else:
+            # 分块读取多声道数据，直接写入单声道输出缓冲
+            y = np.empty(frames, dtype=dtype)
+            block = np.empty((min(BLOCK_FRAMES, max(frames, 1)), info.channels), dtype=dtype)
+            pos = 0
+            while pos < frames:
+                want = min(len(block), frames - pos)
+                got = f.read(dtype=dtype.name, out=block[:want])
+                n = len(got)
+                if n == 0:
+                    break
+                if channel is not None:
+                    y[pos:pos + n] = got[:, channel]
+                else:
+                    np.mean(got, axis=1, out=y[pos:pos + n])
+                pos += n
+            y = y[:pos]
+
+    if need_resample:
+        y = resample(y, file_sr, sr)
+        return y, sr
+    return y, file_sr
@@ -6,6 +6,167 @@ from threading import Thread
 import time
 import wave
 from datetime import datetime
+from scipy.signal import chirp, max_len_seq
+
+class AudioRingBuffer:
+    """预分配的多声道int16环形缓冲区，写入过程不分配内存，供回调线程使用"""
+    def __init__(self, capacity, channels):
+        self.capacity = capacity
+        self.channels = channels
+        self.data = np.zeros((capacity, channels), dtype=np.int16)
+        self.written = 0  # 累计写入帧数
+
+    def write(self, frames):
+        """写入 (n, channels) 的帧数据（回调中调用）"""
+        n = len(frames)
+        pos = self.written % self.capacity
+        first = min(n, self.capacity - pos)
+        self.data[pos:pos + first] = frames[:first]
+        if first < n:
+            self.data[:n - first] = frames[first:]
+        self.written += n
+
+    def read(self, start, out):
+        """将从第start帧开始的 len(out) 帧复制到out，数据已被覆盖时返回False"""
+        n = len(out)
+        if start < self.written - self.capacity or start + n > self.written:
+            return False
+        pos = start % self.capacity
+        first = min(n, self.capacity - pos)
+        out[:first] = self.data[pos:pos + first]
+        if first < n:
+            out[first:] = self.data[:n - first]
+        return True
+
+
+def make_latency_stimulus(sample_rate, kind='chirp', duration=0.05):
+    """生成延迟测量激励信号（对数扫频或MLS），返回float32数组，幅度为1"""
+    if kind == 'mls':
+        nbits = max(8, int(np.ceil(np.log2(duration * sample_rate + 1))))
+        seq = max_len_seq(nbits)[0].astype(np.float32)
+        return 2 * seq - 1
+    n = int(duration * sample_rate)
+    t = np.arange(n) / sample_rate
+    sweep = chirp(t, f0=100, t1=t[-1], f1=0.45 * sample_rate, method='logarithmic')
+    fade = min(n // 10, int(0.002 * sample_rate))
+    sweep[:fade] *= np.hanning(2 * fade)[:fade]
+    sweep[n - fade:] *= np.hanning(2 * fade)[fade:]
+    return sweep.astype(np.float32)
+
+
+class LatencyMeasurement(Thread):
+    """
+    往返延迟测量：按固定周期重复播放激励信号，后台线程从环形缓冲区逐周期读取录音，
+    用匹配滤波（FFT互相关）定位激励在line-in与line-out中的位置，抛物线插值得到亚采样精度。
+    单声道录音时以激励的播放位置作为参考。
+    """
+    def __init__(self, sample_rate, channels, trials=10, kind='chirp',
+                 period=0.5, amplitude=0.5, on_done=None):
+        Thread.__init__(self)
+        self.daemon = True
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.trials = trials
+        self.on_done = on_done
+        self._cancelled = False
+
+        self.stimulus = make_latency_stimulus(sample_rate, kind)
+        self.period = max(int(period * sample_rate), 2 * len(self.stimulus))
+        self.ring = AudioRingBuffer(4 * self.period, channels)
+
+        # 预先生成全部播放数据（末尾多留一个静音周期），回调中只返回只读切片，不做拷贝
+        pcm = np.zeros((self.period * (trials + 1), channels), dtype=np.int16)
+        burst = (self.stimulus * amplitude * 32767).astype(np.int16)
+        for k in range(trials):
+            pcm[k * self.period:k * self.period + len(burst)] = burst[:, None]
+        self._playback = memoryview(pcm.tobytes())
+        self._frame_bytes = channels * 2
+        self._play_pos = 0
+
+        # 匹配滤波所需的FFT长度和激励频谱只计算一次
+        self._nfft = 1 << int(np.ceil(np.log2(self.period + len(self.stimulus))))
+        self._stim_fft = np.conj(np.fft.rfft(self.stimulus, self._nfft))
+        self._window = np.zeros((self.period, channels), dtype=np.int16)
+
+        self.latencies = []
+        self.missed = 0
+
+    def stop(self):
+        self._cancelled = True
+
+    def callback(self, in_data, frame_count, time_info, status):
+        """全双工流回调：录音写入环形缓冲区，播放预生成的激励"""
+        self.ring.write(np.frombuffer(in_data, dtype=np.int16).reshape(-1, self.channels))
+        start = self._play_pos * self._frame_bytes
+        end = start + frame_count * self._frame_bytes
+        self._play_pos += frame_count
+        if self._cancelled:
+            return (self._playback[:0], pyaudio.paComplete)
+        if end > len(self._playback):
+            # 不足一个块时PortAudio补零并结束流
+            return (self._playback[start:], pyaudio.paComplete)
+        return (self._playback[start:end], pyaudio.paContinue)
+
+    def _locate(self, x):
+        """返回激励在x中的亚采样位置，检测不到时返回None"""
+        corr = np.fft.irfft(np.fft.rfft(x, self._nfft) * self._stim_fft, self._nfft)
+        corr = np.abs(corr[:len(x) - len(self.stimulus) + 1])
+        peak = int(np.argmax(corr))
+        if corr[peak] < 8 * (np.median(corr) + 1e-12):
+            return None
+        if 0 < peak < len(corr) - 1:
+            y0, y1, y2 = corr[peak - 1], corr[peak], corr[peak + 1]
+            denom = y0 - 2 * y1 + y2
+            if denom != 0:
+                return peak + 0.5 * (y0 - y2) / denom
+        return float(peak)
+
+    def measure_trial(self, window):
+        """计算单次测量的往返延迟（秒）"""
+        line_in = window[:, 0].astype(np.float32)
+        t_in = self._locate(line_in)
+        if self.channels >= 2:
+            t_out = self._locate(window[:, 1].astype(np.float32))
+        else:
+            t_out = 0.0
+        if t_in is None or t_out is None:
+            return None
+        return (t_in - t_out) / self.sample_rate
+
+    def run(self):
+        deadline = time.time() + self.trials * self.period / self.sample_rate + 5.0
+        for k in range(self.trials):
+            while self.ring.written < (k + 1) * self.period:
+                if self._cancelled or time.time() > deadline:
+                    break
+                time.sleep(0.01)
+            if self._cancelled or not self.ring.read(k * self.period, self._window):
+                self.missed += self.trials - k
+                break
+            latency = self.measure_trial(self._window)
+            if latency is None:
+                self.missed += 1
+            else:
+                self.latencies.append(latency)
+        self._cancelled = True
+        if self.on_done:
+            self.on_done(self.statistics())
+
+    def statistics(self):
+        """延迟统计（毫秒）：均值、抖动（标准差）、最小、最大"""
+        if not self.latencies:
+            return {'trials': self.trials, 'valid': 0, 'missed': self.missed}
+        ms = np.array(self.latencies) * 1000.0
+        return {
+            'trials': self.trials,
+            'valid': len(ms),
+            'missed': self.missed,
+            'mean_ms': float(np.mean(ms)),
+            'jitter_ms': float(np.std(ms)),
+            'min_ms': float(np.min(ms)),
+            'max_ms': float(np.max(ms)),
+            'latencies_ms': ms.tolist(),
+        }
 
 class AudioPlotWindow(wx.Frame):
     """显示音频时域信号的新窗口"""
@@ -144,6 +305,8 @@ class DualChannelRecorderGUI(wx.Frame):
         self.channels = 2
         self.audio_start_time = None
         self.first_audio_time = None
+        self.latency_measurement = None
+        self.latency_stream = None
         
         # 初始化UI
         self.init_ui()
@@ -195,9 +358,17 @@ class DualChannelRecorderGUI(wx.Frame):
         self.plot_btn = wx.Button(panel, label="显示波形图")
         self.save_btn = wx.Button(panel, label="保存录音")
         
+        # 往返延迟测量
+        self.latency_trials_label = wx.StaticText(panel, label="延迟测量次数:")
+        self.latency_trials_ctrl = wx.SpinCtrl(panel, value="10", min=1, max=200)
+        self.latency_signal_choice = wx.Choice(panel, choices=["chirp", "mls"])
+        self.latency_signal_choice.SetSelection(0)
+        self.latency_btn = wx.Button(panel, label="测量往返延迟")
+        
         # 状态信息
         self.recording_status = wx.StaticText(panel, label="状态: 准备就绪")
         self.first_audio_label = wx.StaticText(panel, label="首次检测到音频时间: 未检测到")
+        self.latency_label = wx.StaticText(panel, label="往返延迟: 未测量")
         
         # 设备信息显示
         self.device_info = wx.TextCtrl(panel, style=wx.TE_MULTILINE|wx.TE_READONLY, 
@@ -238,6 +409,11 @@ class DualChannelRecorderGUI(wx.Frame):
         control_grid.Add(self.plot_btn, 0, wx.EXPAND)
         control_grid.Add(self.save_btn, 0, wx.EXPAND)
         
+        control_grid.Add(self.latency_trials_label, 0, wx.ALIGN_CENTER_VERTICAL)
+        control_grid.Add(self.latency_trials_ctrl, 0, wx.EXPAND)
+        control_grid.Add(self.latency_signal_choice, 0, wx.EXPAND)
+        control_grid.Add(self.latency_btn, 0, wx.EXPAND)
+        
         control_box.Add(control_grid, 1, wx.EXPAND|wx.ALL, 5)
         vbox.Add(control_box, 0, wx.EXPAND|wx.ALL, 5)
         
@@ -245,6 +421,7 @@ class DualChannelRecorderGUI(wx.Frame):
         status_box = wx.StaticBoxSizer(wx.VERTICAL, panel, "状态信息")
         status_box.Add(self.recording_status, 0, wx.EXPAND|wx.ALL, 5)
         status_box.Add(self.first_audio_label, 0, wx.EXPAND|wx.ALL, 5)
+        status_box.Add(self.latency_label, 0, wx.EXPAND|wx.ALL, 5)
         vbox.Add(status_box, 0, wx.EXPAND|wx.ALL, 5)
         
         # 设备详细信息
@@ -260,6 +437,7 @@ class DualChannelRecorderGUI(wx.Frame):
         self.stop_btn.Bind(wx.EVT_BUTTON, self.on_stop)
         self.plot_btn.Bind(wx.EVT_BUTTON, self.on_plot)
         self.save_btn.Bind(wx.EVT_BUTTON, self.on_save)
+        self.latency_btn.Bind(wx.EVT_BUTTON, self.on_measure_latency)
         self.refresh_devices_btn.Bind(wx.EVT_BUTTON, self.update_device_lists)
     
     def update_device_lists(self, event=None):
@@ -471,6 +649,66 @@ class DualChannelRecorderGUI(wx.Frame):
             self.first_audio_time = time.time() - self.audio_start_time
             wx.CallAfter(self.update_first_audio_label)
     
+    def on_measure_latency(self, event):
+        """开始往返延迟测量：全双工播放激励并录制line-in/line-out"""
+        if self.is_recording or self.latency_measurement is not None:
+            return
+        
+        input_index = self.get_selected_device_index(self.input_device_choice)
+        output_index = self.get_selected_device_index(self.output_device_choice)
+        
+        self.latency_measurement = LatencyMeasurement(
+            self.sample_rate,
+            self.channels,
+            trials=self.latency_trials_ctrl.GetValue(),
+            kind=self.latency_signal_choice.GetStringSelection(),
+            on_done=lambda stats: wx.CallAfter(self.on_latency_done, stats)
+        )
+        
+        try:
+            self.latency_stream = self.p.open(
+                format=pyaudio.paInt16,
+                channels=self.channels,
+                rate=self.sample_rate,
+                input=True,
+                output=True,
+                frames_per_buffer=1024,
+                stream_callback=self.latency_measurement.callback,
+                input_device_index=input_index,
+                output_device_index=output_index
+            )
+        except Exception as e:
+            self.latency_measurement = None
+            wx.LogError(f"无法开始延迟测量: {str(e)}")
+            return
+        
+        self.latency_label.SetLabel("往返延迟: 测量中...")
+        self.record_btn.Disable()
+        self.latency_btn.Disable()
+        self.latency_measurement.start()
+    
+    def on_latency_done(self, stats):
+        """延迟测量结束，关闭音频流并显示统计结果"""
+        if self.latency_stream is not None:
+            try:
+                self.latency_stream.stop_stream()
+                self.latency_stream.close()
+            except Exception:
+                pass
+            self.latency_stream = None
+        self.latency_measurement = None
+        
+        self.record_btn.Enable()
+        self.latency_btn.Enable()
+        
+        if not stats.get('valid'):
+            self.latency_label.SetLabel(f"往返延迟: 未检测到激励信号 (失败 {stats['missed']}/{stats['trials']})")
+            return
+        self.latency_label.SetLabel(
+            f"往返延迟: {stats['mean_ms']:.3f} ms, 抖动 {stats['jitter_ms']:.3f} ms "
+            f"(最小 {stats['min_ms']:.3f}, 最大 {stats['max_ms']:.3f}, "
+            f"有效 {stats['valid']}/{stats['trials']})")
+    
     def on_plot(self, event):
         """显示音频信号图"""
         if not self.line_in_data or not self.line_out_data:
@@ -503,6 +741,16 @@ class DualChannelRecorderGUI(wx.Frame):
         # 停止录音（如果正在录制）
         if hasattr(self, 'is_recording') and self.is_recording:
             self.on_stop(None)
+        
+        # 停止延迟测量
+        if self.latency_measurement is not None:
+            self.latency_measurement.stop()
+        if self.latency_stream is not None:
+            try:
+                self.latency_stream.stop_stream()
+                self.latency_stream.close()
+            except:
+                pass
 
         # 安全关闭绘图窗口
         if hasattr(self, 'plot_window') and self.is_window_alive(self.plot_window):
@@ -1,88 +1,153 @@
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.fft import fft2, fftshift
-
-def analyze_image_noise(image_path, n_frame = 10):
-
-    bright_images = []
-    for filename in image_path:
-        img = cv2.imread(filename, cv2.IMREAD_GRAYSCALE).astype(np.float32)
-        bright_images.append(img)
-    bright_stack = np.stack(bright_images, axis=0)
-
-    # 计算时域噪声（标准差）
-    temporal_noise = np.std(bright_stack, axis=0)
+from concurrent.futures import ThreadPoolExecutor
+from camera_script.nps import noise_power_spectrum
+import camera_script.frame_source as frame_source
+import camera_script.image_cache as image_cache
+import camera_script.raw_reader as raw_reader
+import camera_script.render as render
+import camera_script.tiling as tiling
+
+
+class TemporalNoiseAccumulator:
+    """
+    逐帧累积的时域噪声统计（Welford算法）
+    原地更新逐像素均值与平方差和，内存占用与帧数无关
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._mean = None
+        self._m2 = None
+        self._delta = None
+
+    def update(self, frame):
+        frame = np.asarray(frame)
+        if self._mean is None:
+            self._mean = np.zeros(frame.shape, dtype=np.float64)
+            self._m2 = np.zeros(frame.shape, dtype=np.float64)
+            self._delta = np.empty(frame.shape, dtype=np.float64)
+        elif frame.shape != self._mean.shape:
+            raise ValueError(f"帧尺寸不一致: {frame.shape} != {self._mean.shape}")
+        self.count += 1
+        delta = self._delta
+        np.subtract(frame, self._mean, out=delta)
+        self._mean += delta / self.count
+        # m2 += (x - mean_old) * (x - mean_new)
+        delta *= frame - self._mean
+        self._m2 += delta
+
+    @property
+    def mean(self):
+        return self._mean
+
+    def variance(self, ddof=0):
+        if self.count <= ddof:
+            raise ValueError("帧数不足，无法计算方差")
+        return self._m2 / (self.count - ddof)
+
+    def std(self, ddof=0):
+        return np.sqrt(self.variance(ddof))
+
+
+def iter_frames(source, max_workers=4, max_frames=None):
+    """
+    逐帧产出float32灰度帧
+    :param source: 图像路径列表（线程池解码，最多预读 2*max_workers 帧）、视频路径（后台线程解码到有界队列）
+                   或 frame_source 帧源
+    """
+    for frame in frame_source.open_frames(source, max_frames, gray=True, max_workers=max_workers):
+        yield frame.astype(np.float32)
+
+
+def temporal_noise_map(frames, tile_size=None, memory_budget=tiling.DEFAULT_MEMORY_BUDGET, workers=None):
+    """
+    分块计算逐像素时域噪声（标准差）
+    各帧保持原始数据类型（或内存映射），只有当前分块的帧堆叠转换为float64
+    :param frames: 同尺寸二维帧列表
+    :return: float32 时域噪声图
+    """
+    stack = tiling.FrameStack(frames)
+
+    def std(tile):
+        return tile.astype(np.float64).std(axis=0)
+
+    # 每像素工作内存：原始帧分块、float64帧堆叠及其去均值临时量
+    bytes_per_pixel = (16 + stack.itemsize) * len(stack) + 8
+    return tiling.map_tiles(std, stack, 0, tile_size, memory_budget, workers, bytes_per_pixel)
+
+
+def single_frame_nps(frame, size=512):
+    """
+    单帧亮场图像中心区域的噪声功率谱
+    :return: (二维NPS, 径向频率bins, 一维径向平均NPS)
+    """
+    # 取单帧亮场图像中心区域（512x512）
+    height, width = frame.shape
+    half = size // 2
+    roi = frame[height//2-half:height//2+half, width//2-half:width//2+half]
+    result = noise_power_spectrum(roi)
+    nps_2d, r_bins, nps_1d = result['nps_2d'], result['r_bins'], result['nps_1d']
+    return nps_2d, r_bins, nps_1d
+
+
+def analyze_image_noise(image_path, n_frame = 10, max_workers=4, memory_budget=None, plot=True):
+    """
+    :param image_path: 同一场景的多帧图像路径（.npy 帧以内存映射方式读取），或视频路径/帧源/RawReader
+                       （视频在后台线程解码后直接逐帧累积，无需先导出图像；RAW帧直接使用传感器原始值）
+    :param n_frame: 视频/RAW最多读取的帧数
+    :param memory_budget: None时逐帧Welford累积（内存与帧数无关）；
+                          给定字节数时各帧保持原始数据类型，时域噪声按该预算分块并行计算（仅图像路径列表）
+    """
+    # 图像路径列表保持原有行为（使用全部帧），视频按n_frame截取
+    max_frames = None if isinstance(image_path, (list, tuple)) else n_frame
+    if memory_budget is not None:
+        if isinstance(image_path, raw_reader.RawReader):
+            # raw8/raw16 帧为内存映射视图，分块时才从磁盘读入
+            frames = [image_path.frame(i) for i in range(min(len(image_path), n_frame))]
+        elif not isinstance(image_path, (list, tuple)):
+            raise ValueError(f"memory_budget 仅支持图像路径列表或RawReader，实际为 {type(image_path).__name__}")
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                frames = list(executor.map(tiling.open_image, image_path))
+        if not frames:
+            raise ValueError("未提供任何图像")
+        temporal_noise = temporal_noise_map(frames, memory_budget=memory_budget, workers=max_workers)
+        nps_2d, r_bins, nps_1d = single_frame_nps(frames[0].astype(np.float32))
+    else:
+        accumulator = TemporalNoiseAccumulator()
+        nps = None
+        with ThreadPoolExecutor(max_workers=1) as nps_executor:
+            for img in iter_frames(image_path, max_workers=max_workers, max_frames=max_frames):
+                if nps is None:
+                    # 噪声功率谱只依赖首帧，与后续帧的读取和累积并行计算
+                    nps = nps_executor.submit(single_frame_nps, img)
+                accumulator.update(img)
+            if nps is None:
+                raise ValueError("未提供任何图像")
+            nps_2d, r_bins, nps_1d = nps.result()
+
+        # 计算时域噪声（标准差）
+        temporal_noise = accumulator.std().astype(np.float32)
     random_noise_mean = np.mean(temporal_noise)
     random_noise_std = np.std(temporal_noise)
 
- # ==================== 3. 噪声功率谱分析 ====================
-    # 取单帧亮场图像中心区域（512x512）
-    height, width = bright_images[0].shape
-    roi = bright_images[0][height//2-256:height//2+256, width//2-256:width//2+256]
-    roi = roi - np.mean(roi)  # 去均值化
-
-    # 计算二维FFT和功率谱
-    fft = fft2(roi)
-    fft_shifted = fftshift(fft)
-    nps_2d = np.abs(fft_shifted)**2 / (roi.size)  # 功率谱密度
-
-    # 径向平均得到一维NPS
-    y, x = np.indices(nps_2d.shape)
-    center = np.array([(x.max()-x.min())/2.0, (y.max()-y.min())/2.0])
-    r = np.hypot(x - center[0], y - center[1])
-    max_radius = int(np.ceil(r.max()))
-    r_bins = np.arange(0, max_radius + 1)
-    r_idx = np.digitize(r.ravel(), r_bins)
-    nps_1d = np.bincount(r_idx, nps_2d.ravel()) / np.bincount(r_idx)
-
-    # ==================== 4. 结果可视化 ====================
-    plt.figure(figsize=(15, 10))
-
-    # 随机噪声热力图
-    plt.subplot(2, 2, 1)
-    plt.imshow(temporal_noise, cmap='hot')
-    plt.colorbar(label='Noise (ADU)')
-    plt.title(f"Random Noise Map\nMean: {random_noise_mean:.2f}, Std: {random_noise_std:.2f}")
-    plt.axis('off')
-
-    # 固定模式噪声（若有）
-    '''if dark_image_path:
-        plt.subplot(2, 2, 2)
-        plt.imshow(dark_image, cmap='gray')
-        plt.title(f"Fixed Pattern Noise (FPN)\nStd: {fpn:.2f}")
-        plt.axis('off')'''
-
-    # 噪声功率谱（2D）
-    plt.subplot(2, 2, 2)
-    plt.imshow(np.log10(nps_2d + 1e-6), cmap='jet')
-    plt.colorbar(label='Log10(NPS)')
-    plt.title("2D Noise Power Spectrum")
-    plt.axis('off')
-
-    # 噪声功率谱（1D径向平均）
-    plt.subplot(2, 2, 3)
-    plt.plot(r_bins[:-1], nps_1d[:-1])
-    plt.yscale('log')
-    plt.xlabel("Spatial Frequency (cycles/pixel)")
-    plt.ylabel("NPS (ADU²)")
-    plt.title("1D Radial NPS")
-    plt.grid(True)
-
-    plt.tight_layout()
-    plt.show()
-
     # 返回统计结果
     results = {
         "random_noise_mean": random_noise_mean,
         "random_noise_std": random_noise_std,
         #"fpn": fpn,
-        "nps_1d": nps_1d
+        "nps_1d": nps_1d,
+        "temporal_noise": temporal_noise,
+        "nps_2d": nps_2d,
+        "r_bins": r_bins,
     }
+    if plot:
+        render.show('noise', results)
     return results
 
 def analyze_color_noise(image_path):
-    img = cv2.imread(image_path)
+    img = image_cache.imread(image_path)
     img_yuv = cv2.cvtColor(img, cv2.COLOR_BGR2YUV)
     y, u, v = cv2.split(img_yuv)
     
@@ -1,17 +1,192 @@
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
 
-def detect_lateral_ca(image_path, edge_threshold=50, roi_size=1000):
+import camera_script.image_cache as image_cache
+import camera_script.render as render
+import camera_script.tiling as tiling
+
+# 分块边缘检测的重叠宽度：Sobel(3x3)与非极大值抑制各需1像素，其余用于滞后阈值的弱边缘连接
+CANNY_HALO = 16
+
+def _phase_correlation(ref, moving, search):
+    """
+    批量相位相关：估计 moving 相对 ref 的亚像素位移
+    :param ref, moving: (N, P, P) 图像块
+    :param search: 最大搜索位移（像素）
+    :return: (N, 2) 位移 (dx, dy)
+    """
+    n, size, _ = ref.shape
+    window = np.outer(np.hanning(size), np.hanning(size)).astype(np.float32)
+    fa = np.fft.rfft2((ref - ref.mean(axis=(1, 2), keepdims=True)) * window)
+    fb = np.fft.rfft2((moving - moving.mean(axis=(1, 2), keepdims=True)) * window)
+    cross = fb * np.conj(fa)
+    cross /= np.abs(cross) + 1e-9
+    corr = np.fft.fftshift(np.fft.irfft2(cross, s=(size, size)), axes=(1, 2))
+
+    # 只在 ±search 范围内寻找相关峰
+    c = size // 2
+    span = 2 * search + 1
+    sub = corr[:, c - search:c + search + 1, c - search:c + search + 1]
+    py, px = np.divmod(sub.reshape(n, -1).argmax(axis=1), span)
+    py += c - search
+    px += c - search
+
+    # 抛物线插值得到亚像素峰值位置
+    idx = np.arange(n)
+    peak = corr[idx, py, px]
+
+    def refine(minus, plus):
+        denom = minus - 2 * peak + plus
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = np.where(np.abs(denom) > 1e-12, 0.5 * (minus - plus) / denom, 0.0)
+        return np.clip(delta, -0.5, 0.5)
+
+    dx = px - c + refine(corr[idx, py, (px - 1) % size], corr[idx, py, (px + 1) % size])
+    dy = py - c + refine(corr[idx, (py - 1) % size, px], corr[idx, (py + 1) % size, px])
+    return np.column_stack([dx, dy])
+
+
+def radial_ca_profile(xs, ys, normals, shifts, center, r_max, n_bins=10, min_cos=0.7):
+    """
+    径向色差曲线：将位移投影到边缘法向（孔径问题下唯一可靠的分量），
+    只取法向与径向夹角较小的边缘，换算为径向位移后按视场半径分段平均
+    :param xs, ys: 边缘点坐标
+    :param normals: (N, 2) 单位法向（梯度方向）
+    :param shifts: {'red': (N, 2), 'blue': (N, 2)} 位移
+    :param center: 光轴中心 (cx, cy)
+    :param r_max: 归一化半径（通常为半对角线长度）
+    :return: {'radius': 归一化视场, 'red', 'blue': 各段平均径向位移, 'count': 各段边缘数}
+    """
+    rx = xs - center[0]
+    ry = ys - center[1]
+    rad = np.hypot(rx, ry)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos = (normals[:, 0] * rx + normals[:, 1] * ry) / rad
+    keep = (rad > 0) & (np.abs(cos) >= min_cos)
+
+    edges = np.linspace(0, 1, n_bins + 1)
+    idx = np.clip(np.digitize(rad[keep] / r_max, edges) - 1, 0, n_bins - 1)
+    counts = np.bincount(idx, minlength=n_bins)
+    profile = {'radius': (edges[:-1] + edges[1:]) / 2, 'count': counts}
+    for ch, shift in shifts.items():
+        radial = (shift[keep, 0] * normals[keep, 0] + shift[keep, 1] * normals[keep, 1]) / cos[keep]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            profile[ch] = np.bincount(idx, radial, minlength=n_bins) / counts
+    return profile
+
+
+def edge_candidates(gray, edge_threshold=50, max_edges=1000, margin=0, tile_size=None,
+                    memory_budget=tiling.DEFAULT_MEMORY_BUDGET, workers=None):
+    """
+    分块检测Canny边缘点，按梯度强度选取最强的max_edges个
+    每块只保留块内最强的max_edges个点再全局合并，结果与整幅选取一致；
+    Canny滞后阈值跨块连接的弱边缘由halo覆盖，块边界处可能有极少差异
+    :param margin: 距图像边界不足margin的点不参与选取
+    :return: (ys, xs, gx, gy, magnitude)
+    """
+    h, w = gray.shape
+
+    def candidates(tile_image, tile):
+        edges = cv2.Canny(tile_image, edge_threshold, edge_threshold * 2)[tile.core]
+        gx = cv2.Sobel(tile_image, cv2.CV_32F, 1, 0, ksize=3)[tile.core]
+        gy = cv2.Sobel(tile_image, cv2.CV_32F, 0, 1, ksize=3)[tile.core]
+        ys, xs = np.nonzero(edges)
+        oy, ox = tile.dst[0].start, tile.dst[1].start
+        keep = (ys + oy >= margin) & (ys + oy < h - margin) & (xs + ox >= margin) & (xs + ox < w - margin)
+        ys, xs = ys[keep], xs[keep]
+        gx, gy = gx[ys, xs], gy[ys, xs]
+        magnitude = np.hypot(gx, gy)
+        if len(ys) > max_edges:
+            strongest = np.argpartition(magnitude, -max_edges)[-max_edges:]
+            ys, xs, gx, gy, magnitude = ys[strongest], xs[strongest], gx[strongest], gy[strongest], magnitude[strongest]
+        return ys + oy, xs + ox, gx, gy, magnitude
+
+    # 每像素工作内存：Canny中间结果及两幅float32梯度
+    parts = tiling.reduce_tiles(candidates, gray, CANNY_HALO, tile_size, memory_budget, workers, bytes_per_pixel=24)
+    ys, xs, gx, gy, magnitude = (np.concatenate(arrays) for arrays in zip(*parts))
+    if len(ys) > max_edges:
+        strongest = np.argpartition(magnitude, -max_edges)[-max_edges:]
+        ys, xs, gx, gy, magnitude = ys[strongest], xs[strongest], gx[strongest], gy[strongest], magnitude[strongest]
+    return ys, xs, gx, gy, magnitude
+
+
+def lateral_ca_offsets(roi_img, edge_threshold=50, max_edges=1000, window_size=15, search=5,
+                       center=None, r_max=None, n_bins=10, tile_size=None,
+                       memory_budget=tiling.DEFAULT_MEMORY_BUDGET, workers=None):
+    """
+    计算ROI内红、蓝通道相对于绿通道的偏移（不涉及界面交互）
+    在绿色通道Canny边缘中按梯度强度选取最强的max_edges个点，以步幅视图批量取块，
+    批量相位相关得到亚像素位移
+    :param roi_img: BGR图像ROI
+    :param edge_threshold: 边缘检测阈值（0-255）
+    :param max_edges: 参与计算的边缘点数上限
+    :param window_size: 匹配窗口大小，实际取块为 window_size + 2*search
+    :param search: 最大位移（像素）
+    :param center: 光轴中心在ROI中的坐标，默认ROI中心
+    :param r_max: 径向曲线的归一化半径，默认ROI半对角线
+    :param tile_size: 边缘检测的分块边长，None时按内存预算确定
+    :return: (统计结果, 各边缘点水平偏移量 {"red", "blue"}, 径向色差曲线)
+    """
+    b, g, r = cv2.split(roi_img)
+    h, w = g.shape
+
+    # 1. 绿色通道边缘检测（分块），按梯度强度取样
+    half = window_size // 2 + search
+    ys, xs, gx, gy, magnitude = edge_candidates(g, edge_threshold, max_edges, half, tile_size,
+                                                memory_budget, workers)
+    if len(ys) == 0:
+        raise ValueError("ROI内未检测到可用的边缘")
+
+    # 2. 步幅视图取块（只复制选中的块）并批量相位相关
+    size = 2 * half + 1
+
+    def patches(channel):
+        view = np.lib.stride_tricks.sliding_window_view(channel, (size, size))
+        return view[ys - half, xs - half].astype(np.float32)
+
+    g_patches = patches(g)
+    shifts = {
+        "red": _phase_correlation(g_patches, patches(r), search),
+        "blue": _phase_correlation(g_patches, patches(b), search),
+    }
+    normals = np.column_stack([gx, gy]) / magnitude[:, None]
+
+    # 水平偏移：边缘只约束法向位移，取接近竖直的边缘，由法向位移换算水平分量
+    vertical = np.abs(normals[:, 0]) >= 0.7
+    if not np.any(vertical):
+        raise ValueError("ROI内未检测到接近竖直的边缘")
+    offsets = {ch: (shift[vertical] * normals[vertical]).sum(axis=1) / normals[vertical, 0]
+               for ch, shift in shifts.items()}
+
+    # 3. 统计结果
+    stats = {
+        "red_mean": np.mean(offsets["red"]),
+        "red_std": np.std(offsets["red"]),
+        "blue_mean": np.mean(offsets["blue"]),
+        "blue_std": np.std(offsets["blue"]),
+        "max_abs_offset": max(np.max(np.abs(offsets["red"])), np.max(np.abs(offsets["blue"])))
+    }
+
+    # 4. 径向色差曲线
+    if center is None:
+        center = ((w - 1) / 2, (h - 1) / 2)
+    if r_max is None:
+        r_max = np.hypot(max(center[0], w - 1 - center[0]), max(center[1], h - 1 - center[1]))
+    profile = radial_ca_profile(xs, ys, normals, shifts, center, r_max, n_bins)
+    return stats, offsets, profile
+
+
+def detect_lateral_ca(image_path, edge_threshold=50, roi_size=1000, plot=True):
     """
     检测横向色差（Lateral Chromatic Aberration）
     :param image_path: 输入图像路径
     :param edge_threshold: 边缘检测阈值（0-255）
-    :param roi_size: 分析区域大小（像素）
-    :return: 色差偏移量统计结果及可视化图像
+    :param roi_size: 参与计算的边缘点数上限（按梯度强度选取）
+    :param plot: 是否显示可视化图表
+    :return: 色差偏移量统计结果（含各边缘点偏移量 'offsets'、径向曲线 'profile' 与 'roi_image'）
     """
-    # 1. 读取图像并分离通道
-    img = cv2.imread(image_path)
+    # 1. 读取图像并框选ROI
+    img = image_cache.imread(image_path)
 
     cv2.namedWindow("Select Edge ROI", cv2.WINDOW_NORMAL)
     roi = cv2.selectROI("Select Edge ROI", img)
@@ -20,93 +195,29 @@ def detect_lateral_ca(image_path, edge_threshold=50, roi_size=1000):
 
     if roi_img is None:
         raise FileNotFoundError(f"图像未找到: {image_path}")
-    roi_img_rgb = cv2.cvtColor(roi_img, cv2.COLOR_BGR2RGB)
-    r, g, b = cv2.split(roi_img_rgb)
-
-    # 2. 在绿色通道中检测边缘
-    edges = cv2.Canny(g, edge_threshold, edge_threshold * 2)
-    edge_coords = np.column_stack(np.where(edges > 0))
-    
-
-    # 3. 随机选择部分边缘区域进行偏移量计算
-    #np.random.shuffle(edge_coords)
-    #sampled_coords = edge_coords[:roi_size]
-
-    # 4. 计算红、蓝通道相对于绿通道的横向偏移
-    offsets = {"red": [], "blue": []}
-    window_size = 15  # 互相关窗口大小（奇数）
-
-
-
-    for y, x in edge_coords:
-        if((x - window_size//2) > 5 and (y - window_size//2) > 5) :
-        # 提取绿通道的局部窗口
-            g_patch = g[y - window_size//2 : y + window_size//2 + 1,
-                        x - window_size//2 : x + window_size//2 + 1]
-            if g_patch.shape != (window_size, window_size):
-                continue
-
-            # 红通道偏移计算
-            r_patch = r[y - window_size//2- 5 : y + window_size//2 + 6,
-                        x - window_size//2 - 5 : x + window_size//2 + 6]  # 扩大搜索范围
-            res_r = cv2.matchTemplate(r_patch.astype(np.float32), g_patch.astype(np.float32), cv2.TM_CCOEFF_NORMED)
-            _, _, _, max_loc_r = cv2.minMaxLoc(res_r)
-            offset_r = max_loc_r[0] - 5  # 偏移量（红通道相对于绿通道）
 
-            # 蓝通道偏移计算
-            b_patch = b[y - window_size//2 : y + window_size//2 + 1,
-                        x - window_size//2 - 5 : x + window_size//2 + 6]
-            res_b = cv2.matchTemplate(b_patch.astype(np.float32), g_patch.astype(np.float32), cv2.TM_CCOEFF_NORMED)
-            _, _, _, max_loc_b = cv2.minMaxLoc(res_b)
-            offset_b = max_loc_b[0] - 5  # 偏移量（蓝通道相对于绿通道）
+    # 2. 计算偏移量及统计（径向曲线以整幅图像中心为光轴中心）
+    img_h, img_w = img.shape[:2]
+    center = ((img_w - 1) / 2 - x, (img_h - 1) / 2 - y)
+    r_max = np.hypot(img_w - 1, img_h - 1) / 2
+    stats, offsets, profile = lateral_ca_offsets(roi_img, edge_threshold, max_edges=roi_size,
+                                                 center=center, r_max=r_max)
 
-            offsets["red"].append(offset_r)
-            offsets["blue"].append(offset_b)
-
-    # 5. 统计结果
-    stats = {
-        "red_mean": np.mean(offsets["red"]),
-        "red_std": np.std(offsets["red"]),
-        "blue_mean": np.mean(offsets["blue"]),
-        "blue_std": np.std(offsets["blue"]),
-        "max_abs_offset": max(np.max(np.abs(offsets["red"])), np.max(np.abs(offsets["blue"])))
-    }
-
-    # 6. 可视化
-    plt.figure(figsize=(15, 5))
-    
-    # 原图与边缘标注
-    plt.subplot(1, 3, 1)
-    plt.imshow(roi_img_rgb)
-    #plt.scatter(edge_coords[:, 1], edge_coords[:, 0], c='yellow', s=5, alpha=0.5)
-    plt.title("Original Image with Sampled Edges")
-    plt.axis('off')
-
-    # 红通道偏移分布
-    plt.subplot(1, 3, 2)
-    plt.hist(offsets["red"], bins=20, color='red', alpha=0.7)
-    plt.xlabel("Red Channel Offset (pixels)")
-    plt.ylabel("Frequency")
-    plt.title("Red Channel Offset Distribution")
-
-    # 蓝通道偏移分布
-    plt.subplot(1, 3, 3)
-    plt.hist(offsets["blue"], bins=20, color='blue', alpha=0.7)
-    plt.xlabel("Blue Channel Offset (pixels)")
-    plt.ylabel("Frequency")
-    plt.title("Blue Channel Offset Distribution")
-
-    plt.tight_layout()
-    plt.show()
-
-    return stats
+    result = dict(stats, offsets=offsets, profile=profile, roi_image=roi_img)
+    if plot:
+        render.show('ca', result)
+    return result
 
 def main(path):
     result = detect_lateral_ca(path, edge_threshold=50, roi_size=1000)
     print("===== 横向色差分析结果 =====")
     print(f"红通道平均偏移: {result['red_mean']:.2f} px (±{result['red_std']:.2f})")
     print(f"蓝通道平均偏移: {result['blue_mean']:.2f} px (±{result['blue_std']:.2f})")
-    print(f"最大绝对偏移量: {result['max_abs_offset']} px")
+    print(f"最大绝对偏移量: {result['max_abs_offset']:.2f} px")
+    profile = result['profile']
+    for radius, red, blue, count in zip(profile['radius'], profile['red'], profile['blue'], profile['count']):
+        if count:
+            print(f"视场{radius:.2f}: 红 {red:+.2f} px, 蓝 {blue:+.2f} px ({count}个边缘点)")
     
 
 
@@ -1,6 +1,9 @@
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor
+from camera_script.chart_layout import auto_roi, color_patch_slices, common_patch_shape, stack_patches
+import camera_script.image_cache as image_cache
+import camera_script.render as render
 
 #现有24色卡标准参数
 basic_24color_RBG = [[121, 85, 72], [215, 169, 147], [83, 133, 160], [89, 110, 68], [128, 148, 181], [119, 218, 192], 
@@ -17,7 +20,7 @@ basic_24color_S = [103,81, 123, 97, 75, 116,
 
 def analyze_saturation(image_path):
     # 读取图像并转换到HSV空间
-    image = cv2.imread(image_path)
+    image = image_cache.imread(image_path)
     if image is None:
         raise FileNotFoundError(f"Image not found at {image_path}")
     
@@ -42,12 +45,22 @@ def analyze_saturation(image_path):
     }
     return stats, saturation
 
-def ROI(image_path):
-    #截取24色卡的roi区域
-    image = cv2.imread(image_path)
+def ROI(image_path, auto=False, fixture_id=None):
+    """
+    截取24色卡的roi区域
+    :param auto: 自动检测色卡并校正透视，失败时回退到手动框选
+    :param fixture_id: 治具/相机ID，自动检测时复用该治具缓存的色卡位置
+    """
+    image = image_cache.imread(image_path)
     if image is None:
         raise FileNotFoundError(f"Image not found at {image_path}")
-    
+
+    if auto:
+        roi_image = auto_roi(image, 'color', fixture_id)
+        if roi_image is not None:
+            h, w = roi_image.shape[:2]
+            return roi_image, w, h
+
     cv2.namedWindow("Select Edge ROI", cv2.WINDOW_NORMAL)
     roi = cv2.selectROI("Select Edge ROI", image)
     x, y, w, h = map(int, roi)
@@ -58,50 +71,41 @@ def ROI(image_path):
 
 
 def RGB2HSV(roi, w, h):
-    # 读取图像并转换到HSV空间
-
-    #获取24色块区域数组
-    delta = 1 / 24
-
-    PiecesList = []
-    w_list = [1, 3, 5, 7, 9, 11]
-    h_list = [-1, -3, -5, -7]
-
-    ColorList = []
-
-    for j in h_list:
-        for i in w_list:
-            #point_x = x + w * (i / 12)
-            #point_y = y + h * (j / 8)
-            point_x = w * (i / 12)
-            point_y = -h * (j / 8)
-            color_piece = roi[int(point_y-delta*h):int(point_y+delta*h), int(point_x-delta*w):int(point_x+delta*w)]
-            hsv_image = cv2.cvtColor(color_piece, cv2.COLOR_BGR2HSV)
-            saturation = hsv_image[:, :, 1]
-            ColorList.append(saturation[0:int(delta*2*h-1), 0:int(delta*2*w-1)])
-            # 计算统计指标
-            stats = {
-                "mean": np.mean(saturation),
-                "median": np.median(saturation),
-                "max": np.max(saturation),
-                "min": np.min(saturation),
-                "std": np.std(saturation)
-            }
-            PiecesList.append(stats)
-
-    v_pic = ColorList[0]
-    for i in range(1, 6):
-        v_pic = np.hstack((v_pic, ColorList[i]))
-        
-    for i in range(1, 4):
-        h_pic = ColorList[i*6]
-        for j in range(1, 6):
-            h_pic = np.hstack((h_pic, ColorList[i*6 + j]))
-        v_pic = np.vstack((v_pic, h_pic))    
+    """
+    整个ROI一次转换到HSV空间，按色卡布局的切片索引取出24个色块的饱和度，
+    统计量由堆叠张量一次归约得到，热力图拼接到预分配数组中
+    :return: (各色块统计字典列表, 4x6色块饱和度拼接图)
+    """
+    saturation = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)[:, :, 1]
+    slices = color_patch_slices(w, h)
+    patches = stack_patches(saturation, slices, common_patch_shape(slices), color=False)
+
+    means = patches.mean(axis=(1, 2))
+    medians = np.median(patches, axis=(1, 2))
+    maxs = patches.max(axis=(1, 2))
+    mins = patches.min(axis=(1, 2))
+    stds = patches.std(axis=(1, 2))
+    PiecesList = [
+        {"mean": means[k], "median": medians[k], "max": maxs[k], "min": mins[k], "std": stds[k]}
+        for k in range(len(slices))
+    ]
+
+    # 拼接图中每个色块取 (h/12-1) x (w/12-1) 大小，4行6列
+    rows, cols = 4, 6
+    ph, pw = int(h / 12 - 1), int(w / 12 - 1)
+    v_pic = np.empty((rows * ph, cols * pw), dtype=saturation.dtype)
+    v_pic.reshape(rows, ph, cols, pw)[...] = patches[:, :ph, :pw].reshape(rows, cols, ph, pw).transpose(0, 2, 1, 3)
 
     return PiecesList, v_pic
 
+
+def analyze_roi(roi):
+    """单个色卡ROI的饱和度分析（不涉及界面交互，可在线程池中执行）"""
+    h, w = roi.shape[:2]
+    return RGB2HSV(roi, w, h)
+
 def output(result, saturation):
+    import matplotlib.pyplot as plt
     # 打印结果
     i = 0
     for stats in result:
@@ -144,45 +148,36 @@ def output(result, saturation):
     plt.show()
 
 
-def output_saturation(result, v_pic, roi):
-    i = 0
+def saturation_error(result):
+    """
+    与标准24色卡饱和度的偏差
+    :return: (饱和度均值差, 饱和度标准差)
+    """
     total_mean = 0
     total_std = 0
-    for stats in result:
+    for i, stats in enumerate(result):
         total_mean += abs(stats['mean'] - int(basic_24color_S[i]))
         total_std += (stats['std'] + abs((stats['mean'] - int(basic_24color_S[i]))))
-        i = i + 1
-        
+
     total_mean = total_mean / (len(result))
     total_std = total_std / (len(result))
+    return total_mean, total_std
 
-    print("===== 色彩饱和度分析结果" + str(i) + " =====")
-    print(f"色彩饱和度均值差: {total_mean:.2f}")
-    print(f"色彩饱和度标准差: {total_std:.2f}")
 
-    hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
-    saturation = hsv[:, :, 1]
+def output_saturation(result, v_pic, roi):
+    total_mean, total_std = saturation_error(result)
 
-    # 可视化
-    plt.figure(figsize=(10, 4))
-    plt.subplot(1, 2, 1)
-    plt.imshow(v_pic, cmap='hot')
-    plt.title("Saturation Heatmap")
-    plt.colorbar()
-    plt.axis('off')
-
-    # 直方图
-    plt.subplot(1, 2, 2)
-    plt.hist(v_pic.ravel(), bins=50, range=(0, 255), color='blue', alpha=0.7)
-    plt.title("Saturation Histogram")
-    plt.xlabel("Saturation Value")
-    plt.ylabel("Frequency")
-    plt.grid(True)
+    print("===== 色彩饱和度分析结果" + str(len(result)) + " =====")
+    print(f"色彩饱和度均值差: {total_mean:.2f}")
+    print(f"色彩饱和度标准差: {total_std:.2f}")
 
-    plt.tight_layout()
-    plt.show()
+    render.show('saturation', {'v_pic': v_pic})
 
-def main(filepath):
+def main(filepath, max_workers=None, auto=False, fixture_id=None):
+    """
+    :param filepath: 单张图像路径，或图像路径列表（逐张框选ROI后并行分析）
+    :param auto: 自动检测色卡ROI（同一治具的后续图像复用缓存的色卡位置）
+    """
     '''result = []
     Hotpot = []
 
@@ -195,11 +190,21 @@ def main(filepath):
         
     output(result, Hotpot)'''
 
-    roi, w, h = ROI(filepath)
+    if isinstance(filepath, (list, tuple)):
+        # ROI框选需在主线程中依次完成，分析部分并行执行
+        rois = [ROI(path, auto, fixture_id)[0] for path in filepath]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(analyze_roi, rois))
+        for roi, (stats, v_pic) in zip(rois, results):
+            output_saturation(stats, v_pic, roi)
+        return results
+
+    roi, w, h = ROI(filepath, auto, fixture_id)
     print(w, h)
     stats, v_pic = RGB2HSV(roi, w, h)
 
     output_saturation(stats, v_pic, roi)
+    return stats, v_pic
     
 
 
@@ -1,23 +1,75 @@
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
 from scipy.stats import kurtosis, skew
 
-def analyze_contrast(image_path, block_size=32, method='RMS'):
+import camera_script.image_cache as image_cache
+import camera_script.render as render
+import camera_script.tiling as tiling
+
+def _local_contrast(image, window_size, method='RMS'):
+    """
+    单块局部对比度：盒式滤波（积分图）计算窗口均值/方差，形态学腐蚀/膨胀计算窗口最小/最大值，
+    每个像素O(1)/可分离复杂度。窗口位置与边界（BORDER_REFLECT）与逐像素滑窗实现一致。
+    """
+    kernel = (window_size, window_size)
+    border = cv2.BORDER_REFLECT
+    img64 = image.astype(np.float64)
+    mean = cv2.boxFilter(img64, -1, kernel, normalize=True, borderType=border)
+    if method == 'RMS':
+        # RMS对比度：窗口标准差 sqrt(E[x^2] - E[x]^2)
+        sq_mean = cv2.boxFilter(img64 * img64, -1, kernel, normalize=True, borderType=border)
+        return np.sqrt(np.maximum(sq_mean - mean * mean, 0)).astype(image.dtype)
+    elif method == 'Weber':
+        # Weber对比度：(I_max - I_min) / I_avg
+        square = cv2.getStructuringElement(cv2.MORPH_RECT, kernel)
+        i_max = cv2.dilate(image, square, borderType=border)
+        i_min = cv2.erode(image, square, borderType=border)
+        return ((i_max - i_min) / (mean + 1e-6)).astype(image.dtype)
+    return np.zeros_like(image)
+
+def local_contrast_map(image, window_size, method='RMS', scale=None, tile_size=None,
+                       memory_budget=tiling.DEFAULT_MEMORY_BUDGET, workers=None):
+    """
+    局部对比度图，按内存预算分块（带窗口重叠）并行计算，结果与整幅计算一致
+    :param image: 单通道图像（浮点，或配合scale使用的整型原图/内存映射）
+    :param window_size: 滑动窗口大小
+    :param method: 'RMS'或'Weber'
+    :param scale: 整型图像逐块转换为float32时的缩放系数（如1/255），避免整幅浮点副本
+    :param tile_size: 分块边长，None时按内存预算确定
+    :return: 与image同尺寸的float32对比度图
+    """
+    # 窗口覆盖 [y - top, y + bottom]，分块时各方向扩展对应像素
+    top = window_size // 2
+    halo = (top, window_size - 1 - top)
+
+    def contrast(tile):
+        tile = tile.astype(np.float32)
+        if scale is not None:
+            tile *= scale
+        return _local_contrast(tile, window_size, method)
+
+    # 每像素工作内存：float32输入 + float64副本、均值、平方均值及临时量
+    return tiling.map_tiles(contrast, image, halo, tile_size, memory_budget, workers, bytes_per_pixel=40)
+
+def analyze_contrast(image_path, block_size=32, method='RMS', tile_size=None,
+                     memory_budget=tiling.DEFAULT_MEMORY_BUDGET, workers=None, plot=True):
     """
     图像对比度系统性分析
-    :param image_path: 输入图像路径
+    :param image_path: 输入图像路径（或BGR图像数组）
     :param block_size: 局部对比度分析的窗口大小
     :param method: 局部对比度算法（'RMS'或'Weber'）
+    :param tile_size: 局部对比度分块边长（None时按内存预算确定）
+    :param memory_budget: 局部对比度分块计算的内存预算（字节）
+    :param workers: 并行处理分块的线程数
+    :param plot: 是否显示可视化图表（批量/无界面运行时为False）
     :return: 对比度统计结果及可视化图表
     """
     # ==================== 1. 数据准备 ====================
     # 读取图像并转换为灰度图
-    img = cv2.imread(image_path)
+    img = image_path if isinstance(image_path, np.ndarray) else image_cache.imread(image_path)
     if img is None:
         raise FileNotFoundError(f"图像未找到: {image_path}")
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    gray_float = gray.astype(np.float32) / 255.0  # 归一化到[0,1]
 
     # ==================== 2. 全局对比度分析 ====================
     # 动态范围 (DR)
@@ -27,7 +79,7 @@ def analyze_contrast(image_path, block_size=32, method='RMS'):
     michelson = (gray.max() - gray.min()) / (gray.max() + gray.min() + 1e-6)
     
     # RMS对比度
-    rms_global = np.std(gray_float)
+    rms_global = cv2.meanStdDev(gray)[1][0, 0] / 255.0  # 归一化到[0,1]
     
     # 直方图统计
     hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
@@ -36,86 +88,28 @@ def analyze_contrast(image_path, block_size=32, method='RMS'):
     skewness = skew(hist.ravel())
 
     # ==================== 3. 局部对比度分析 ====================
-    def local_contrast(image, window_size, method='RMS'):
-        h, w = image.shape
-        contrast_map = np.zeros_like(image)
-        pad = window_size // 2
-        padded = cv2.copyMakeBorder(image, pad, pad, pad, pad, cv2.BORDER_REFLECT)
-        
-        for y in range(h):
-            for x in range(w):
-                window = padded[y:y+window_size, x:x+window_size]
-                if method == 'RMS':
-                    # RMS对比度：窗口标准差
-                    contrast_map[y, x] = np.std(window)
-                elif method == 'Weber':
-                    # Weber对比度：(I_max - I_min) / I_avg
-                    i_max = window.max()
-                    i_min = window.min()
-                    i_avg = window.mean()
-                    contrast_map[y, x] = (i_max - i_min) / (i_avg + 1e-6)
-        return contrast_map
-
     # 计算局部对比度图
-    lc_map = local_contrast(gray_float, block_size, method)
+    # 灰度图逐块归一化到[0,1]，不生成整幅浮点副本
+    lc_map = local_contrast_map(gray, block_size, method, 1 / 255.0, tile_size, memory_budget, workers)
     lc_mean = np.mean(lc_map)
     lc_std = np.std(lc_map)
 
-    # ==================== 4. 可视化 ====================
-    plt.figure(figsize=(18, 12))
-    
-    # 原图与灰度图
-    plt.subplot(2, 3, 1)
-    plt.imshow(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-    plt.title("Original Image")
-    plt.axis('off')
-    
-    plt.subplot(2, 3, 2)
-    plt.imshow(gray, cmap='gray')
-    plt.title("Grayscale Image")
-    plt.axis('off')
-
-    # 直方图与统计
-    plt.subplot(2, 3, 3)
-    plt.plot(hist, color='black')
-    plt.fill_between(np.arange(256), hist.ravel(), alpha=0.3)
-    plt.title(f"Histogram\nKurtosis: {kurt:.2f}, Skewness: {skewness:.2f}")
-    plt.xlabel("Pixel Value")
-    plt.ylabel("Frequency")
-    plt.grid(True)
-
-    # 局部对比度热图
-    plt.subplot(2, 3, 4)
-    plt.imshow(lc_map, cmap='hot')
-    plt.colorbar(label='Local Contrast')
-    plt.title(f"Local Contrast Map ({method})\nMean: {lc_mean:.3f}, Std: {lc_std:.3f}")
-    plt.axis('off')
-
-    # 全局对比度指标表格
-    plt.subplot(2, 3, 5)
-    cell_text = [
-        [f"{dr}", "0-255"],
-        [f"{michelson:.3f}", "(Lmax-Lmin)/(Lmax+Lmin)"],
-        [f"{rms_global:.3f}", "标准差"]
-    ]
-    plt.table(cellText=cell_text,
-              rowLabels=["Dynamic Range", "Michelson Contrast", "RMS Contrast"],
-              colLabels=["Value", "Formula"],
-              loc='center')
-    plt.axis('off')
-
-    plt.tight_layout()
-    plt.show()
-
-    return {
+    results = {
         "dynamic_range": dr,
         "michelson_contrast": michelson,
         "rms_contrast": rms_global,
         "histogram_kurtosis": kurt,
         "histogram_skewness": skewness,
         "local_contrast_mean": lc_mean,
-        "local_contrast_std": lc_std
+        "local_contrast_std": lc_std,
+        "histogram": hist,
+        "local_contrast_map": lc_map,
+        "method": method,
+        "image": img,
     }
+    if plot:
+        render.show('contrast', results)
+    return results
 
 def output(results):
     print("===== 对比度分析结果 =====")
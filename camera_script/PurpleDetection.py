@@ -1,161 +1,150 @@
 # encoding: utf-8
-import cv2
-import numpy as np
-import matplotlib.pyplot as plt
-
-
-
-def ImageLAB(image):
-
-    # 转换为LAB颜色空间（更适合边缘检测）
-    image_lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
-    l_channel, a_channel, b_channel = cv2.split(image_lab)
-
-    # 计算亮度梯度（使用Sobel算子）
-    gradient_x = cv2.Sobel(l_channel, cv2.CV_64F, 1, 0, ksize=3)
-    gradient_y = cv2.Sobel(l_channel, cv2.CV_64F, 0, 1, ksize=3)
-    gradient_magnitude = np.sqrt(gradient_x**2 + gradient_y**2)
-    gradient_magnitude = np.uint8(255 * gradient_magnitude / gradient_magnitude.max())
-
-    # 二值化边缘掩膜
-    _, edge_mask = cv2.threshold(gradient_magnitude, 50, 255, cv2.THRESH_BINARY)
-
-    return edge_mask
-
-def PurpleDetection(image, edge_mask):
-    
-    # 使用高斯模糊降噪
-    image_blur = cv2.GaussianBlur(image, (5, 5), 0)
-
-    # 分离RGB通道
-    r_channel = image_blur[:, :, 0]
-    g_channel = image_blur[:, :, 1]
-    b_channel = image_blur[:, :, 2]
-
-    # 计算紫色异常区域（紫边通常表现为R和B通道高，G通道低）
-    purple_mask = np.zeros_like(edge_mask)
-    purple_ratio = (r_channel.astype(float) + b_channel.astype(float)) / (g_channel.astype(float) + 1e-6)  # 防止除零
-    purple_mask[(edge_mask > 0) & (purple_ratio > 2.0) & (b_channel > 150)] = 255  # 阈值可调
-
-    # 标注紫边区域
-    contours, _ = cv2.findContours(purple_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    image_marked = image.copy()
-    cv2.drawContours(image_marked, contours, -1, (255, 0, 0), 2)  # 用蓝色轮廓标记紫边
-
-    # 计算紫边面积占比
-    total_pixels = image.shape[0] * image.shape[1]
-    purple_area = np.sum(purple_mask) / 255
-    purple_ratio = purple_area / total_pixels * 100
-    
-
-    return purple_mask, image_marked, purple_ratio
-
-'''
-# 读取图像并转为RGB格式
-image = cv2.imread("brio-local.jpg")
-image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-
-# 转换为LAB颜色空间（更适合边缘检测）
-image_lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
-l_channel, a_channel, b_channel = cv2.split(image_lab)
+"""
+紫边（横向色差/镜头色散在高反差边缘处产生的紫色伪色）检测
 
-# 使用高斯模糊降噪
-image_blur = cv2.GaussianBlur(image_rgb, (5, 5), 0)
-
-# 计算亮度梯度（使用Sobel算子）
-gradient_x = cv2.Sobel(l_channel, cv2.CV_64F, 1, 0, ksize=3)
-gradient_y = cv2.Sobel(l_channel, cv2.CV_64F, 0, 1, ksize=3)
-gradient_magnitude = np.sqrt(gradient_x**2 + gradient_y**2)
-gradient_magnitude = np.uint8(255 * gradient_magnitude / gradient_magnitude.max())
-
-# 二值化边缘掩膜
-_, edge_mask = cv2.threshold(gradient_magnitude, 50, 255, cv2.THRESH_BINARY)
-
-# 分离RGB通道
-r_channel = image_rgb[:, :, 0]
-g_channel = image_rgb[:, :, 1]
-b_channel = image_rgb[:, :, 2]
-
-# 计算紫色异常区域（紫边通常表现为R和B通道高，G通道低）
-purple_mask = np.zeros_like(edge_mask)
-purple_ratio = (r_channel.astype(float) + b_channel.astype(float)) / (g_channel.astype(float) + 1e-6)  # 防止除零
-purple_mask[(edge_mask > 0) & (purple_ratio > 2.0) & (b_channel > 150)] = 255  # 阈值可调
-
-# 标注紫边区域
-contours, _ = cv2.findContours(purple_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-image_marked = image_rgb.copy()
-cv2.drawContours(image_marked, contours, -1, (255, 0, 0), 2)  # 用蓝色轮廓标记紫边
-
-# 计算紫边面积占比
-total_pixels = image.shape[0] * image.shape[1]
-purple_area = np.sum(purple_mask) / 255
-purple_ratio = purple_area / total_pixels * 100
-
-# 输出结果
-print(f"紫边区域占比: {purple_ratio:.2f}%")
-
-'''
-
-def main(filename):
-    image1 = cv2.imread(filename[0])
-
-    mask1 = ImageLAB(image1)
-    image_rgb1 = cv2.cvtColor(image1, cv2.COLOR_BGR2RGB)
-    purple_mask1, image_marked1, purple_ratio1 = PurpleDetection(image_rgb1, mask1)
-
-
-    image2 = cv2.imread(filename[1])
-
-    mask2 = ImageLAB(image2)
-    image_rgb2 = cv2.cvtColor(image2, cv2.COLOR_BGR2RGB)
-    purple_mask2, image_marked2, purple_ratio2 = PurpleDetection(image_rgb2, mask2)
+紫边只出现在高反差边缘附近：先由L通道梯度得到边缘掩膜并膨胀为边缘邻域，
+再在邻域内按LAB色度（饱和度与色相角）判定紫色像素。
+"""
+import os
 
+import cv2
+import numpy as np
 
+import camera_script.image_cache as image_cache
+import camera_script.render as render
+import camera_script.tiling as tiling
+
+# 边缘阈值：梯度幅值归一化到0~255（相对整幅最大梯度）后的阈值
+EDGE_THRESHOLD = 50
+# 边缘膨胀半径（像素）：紫边位于边缘两侧数个像素内
+DILATE_RADIUS = 3
+# 紫色判定：LAB色度（a/b平面距离）下限，及色相角范围（度，a轴正向逆时针）
+CHROMA_MIN = 20
+HUE_RANGE = (285, 335)
+
+
+def _gradient(l_channel):
+    """L通道Sobel梯度幅值（float32）"""
+    l_channel = l_channel.astype(np.float32)
+    gx = cv2.Sobel(l_channel, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(l_channel, cv2.CV_32F, 0, 1, ksize=3)
+    return cv2.magnitude(gx, gy)
+
+
+def max_gradient(lab, tile_size=None, memory_budget=tiling.DEFAULT_MEMORY_BUDGET, workers=None):
+    """整幅图像的最大L梯度（分块计算，Sobel需1像素重叠）"""
+    def tile_max(tile, t):
+        return float(_gradient(tile[..., 0])[t.core].max())
+
+    return max(tiling.reduce_tiles(tile_max, lab, 1, tile_size, memory_budget, workers, bytes_per_pixel=16))
+
+
+def _hue_bounds(hue_range):
+    """色相范围的起止单位向量；范围小于180度时，两次叉积同号即判定在范围内"""
+    h0, h1 = np.radians(hue_range)
+    return (np.cos(h0), np.sin(h0)), (np.cos(h1), np.sin(h1))
+
+
+def fringe_mask(lab, gradient_threshold, dilate_radius=DILATE_RADIUS, chroma_min=CHROMA_MIN,
+                hue_range=HUE_RANGE):
+    """
+    单块紫边掩膜（向量化）
+    :param lab: LAB图像 (H, W, 3)；uint8时a/b以128为零点（cv2.COLOR_BGR2LAB），浮点时a/b为有符号值
+    :param gradient_threshold: L梯度幅值的绝对阈值
+    :return: (紫边掩膜, 边缘邻域掩膜, 色度) ，掩膜为bool，色度为float32
+    """
+    offset = 128 if lab.dtype == np.uint8 else 0
+    edges = (_gradient(lab[..., 0]) > gradient_threshold).astype(np.uint8)
+    if dilate_radius > 0:
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * dilate_radius + 1,) * 2)
+        edges = cv2.dilate(edges, kernel)
+    band = edges.astype(bool)
+
+    a = lab[..., 1].astype(np.float32) - offset
+    b = lab[..., 2].astype(np.float32) - offset
+    chroma = cv2.magnitude(a, b)
+    (c0, s0), (c1, s1) = _hue_bounds(hue_range)
+    # 色相角在 [h0, h1] 内：u0 x v >= 0 且 v x u1 >= 0
+    purple = (c0 * b - s0 * a >= 0) & (a * s1 - b * c1 >= 0) & (chroma >= chroma_min)
+    return band & purple, band, chroma
+
+
+def detect_purple_fringe(lab, edge_threshold=EDGE_THRESHOLD, dilate_radius=DILATE_RADIUS,
+                         chroma_min=CHROMA_MIN, hue_range=HUE_RANGE, tile_size=None,
+                         memory_budget=tiling.DEFAULT_MEMORY_BUDGET, workers=None):
+    """
+    紫边检测：按内存预算分块（带重叠）并行计算，结果与整幅计算一致；无文件读写与绘图
+    :param lab: LAB图像 (H, W, 3)，可为内存映射
+    :param edge_threshold: 边缘阈值（相对整幅最大梯度归一化到0~255）
+    :param dilate_radius: 边缘膨胀半径
+    :param chroma_min: 紫色判定的色度下限
+    :param hue_range: 紫色判定的色相角范围（度）
+    :param tile_size: 分块边长，None时按内存预算确定
+    :return: 紫边掩膜（uint8，紫边为255）及面积、严重程度指标
+    """
+    if lab.ndim != 3 or lab.shape[2] != 3:
+        raise ValueError(f"需要LAB三通道图像，实际形状为 {lab.shape}")
+    # 阈值相对整幅最大梯度，分块前先求出，各分块共用同一绝对阈值
+    peak = max_gradient(lab, tile_size, memory_budget, workers)
+    gradient_threshold = edge_threshold / 255.0 * peak
+    mask = np.zeros(lab.shape[:2], dtype=np.uint8)
+
+    def tile_stats(tile, t):
+        fringe, band, chroma = fringe_mask(tile, gradient_threshold, dilate_radius, chroma_min, hue_range)
+        fringe, band, chroma = fringe[t.core], band[t.core], chroma[t.core]
+        mask[t.dst] = fringe * np.uint8(255)
+        values = chroma[fringe]
+        return fringe.sum(), band.sum(), values.sum(dtype=np.float64), values.max(initial=0.0)
+
+    # Sobel需1像素重叠，膨胀需dilate_radius像素
+    halo = 1 + dilate_radius
+    stats = np.array(tiling.reduce_tiles(tile_stats, lab, halo, tile_size, memory_budget, workers,
+                                         bytes_per_pixel=40), dtype=np.float64).reshape(-1, 4)
+    area, band_area, chroma_sum = stats[:, :3].sum(axis=0)
+    total = lab.shape[0] * lab.shape[1]
+    return {
+        'mask': mask,
+        'fringe_area': int(area),
+        'fringe_ratio': float(area / total * 100),
+        'edge_area': int(band_area),
+        'edge_fringe_ratio': float(area / band_area * 100) if band_area else 0.0,
+        'severity_mean': float(chroma_sum / area) if area else 0.0,
+        'severity_max': float(stats[:, 3].max()),
+    }
+
+
+def analyze_purple_fringe(image_path, label=None, plot=False, **kwargs):
+    """
+    图像紫边分析
+    :param image_path: 图像路径（或BGR图像数组）
+    :param label: 图表中的名称
+    :param plot: 是否显示可视化图表
+    :param kwargs: 传给 detect_purple_fringe 的阈值/分块参数
+    :return: detect_purple_fringe 的结果，附加原图 'image' 与 'label'
+    """
+    image = image_path if isinstance(image_path, np.ndarray) else image_cache.imread(image_path)
+    if image is None:
+        raise FileNotFoundError(f"图像未找到: {image_path}")
+    result = detect_purple_fringe(cv2.cvtColor(image, cv2.COLOR_BGR2LAB), **kwargs)
+    result['image'] = image
+    if label is None:
+        label = '' if isinstance(image_path, np.ndarray) else os.path.basename(image_path)
+    result['label'] = label
+    if plot:
+        render.show('purple', [result])
+    return result
+
+
+def main(filename, labels=('Bot', 'Brio')):
+    results = [analyze_purple_fringe(path, label) for path, label in zip(filename, labels)]
 
     # 输出结果
-    print(f"Bot紫边区域占比: {purple_ratio1:.2f}%")
-    print(f"Brio紫边区域占比: {purple_ratio2:.2f}%")
-
-    # 显示结果
-    plt.figure(figsize=(15, 9))
-    plt.subplot(2, 3, 1)
-    plt.imshow(image_rgb1)
-    plt.title("Bot Original Image")
-    plt.axis('off')
-    plt.text(300, 1250, "Bot紫边区域占比：%.2f" % (purple_ratio1) + "%", fontproperties = 'Microsoft YaHei', color = 'darkred', fontsize = 14)
-    
-
-    plt.subplot(2, 3, 2)
-    plt.imshow(purple_mask1, cmap='gray')
-    plt.title("Bot Purple Fringe Mask")
-    plt.axis('off')
-
-    plt.subplot(2, 3, 3)
-    plt.imshow(image_marked1)
-    plt.title("Bot Marked Purple Fringes")
-    plt.axis('off')
-    
-
-    plt.subplot(2, 3, 4)
-    plt.imshow(image_rgb2)
-    plt.title("Brio Original Image")
-    plt.axis('off')
-    plt.text(300, 1250, "竞品紫边区域占比：%.2f " % (purple_ratio2) + "%", fontproperties = 'Microsoft YaHei', color = 'darkred', fontsize = 14)
-
-    plt.subplot(2, 3, 5)
-    plt.imshow(purple_mask2, cmap='gray')
-    plt.title("Brio Purple Fringe Mask")
-    plt.axis('off')
-
-    plt.subplot(2, 3, 6)
-    plt.imshow(image_marked2)
-    plt.title("Brio Marked Purple Fringes")
-    plt.axis('off')
-    
-
-    plt.suptitle("Bot与竞品的紫边表现对比", fontproperties = 'Microsoft YaHei', fontsize = 20, y = 0.95)
-    plt.show()
+    for result in results:
+        print(f"{result['label']}紫边区域占比: {result['fringe_ratio']:.2f}%"
+              f"（边缘邻域内 {result['edge_fringe_ratio']:.2f}%，平均色度 {result['severity_mean']:.1f}）")
+    render.show('purple', results)
+
 
 if __name__ == "__main__":
     filename = ["D:\\work\\image\\subject\\Subjective-HDR-20250516T065214Z-1-001\\Subjective-HDR\\0-local\\bot_local_hdr.jpg", "D:\\work\\image\\subject\\Subjective-HDR-20250516T065214Z-1-001\\Subjective-HDR\\0-local\\Loji_local_hdr.jpg"]
-    main(filename)
\ No newline at end of file
+    main(filename)
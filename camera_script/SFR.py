@@ -1,19 +1,18 @@
 import cv2
 import math
 import numpy as np
-import matplotlib.pyplot as plt
 from scipy import fftpack
 from scipy import stats
 
+import camera_script.image_cache as image_cache
+import camera_script.render as render
+
 # ================= 核心SFR计算函数 =================
 
-def sfr_calculation(roi, oversampling=4, pixel_size=None):
+def mtf_curve(roi, oversampling=4):
     """
-    执行完整的SFR分析流程
-    :param roi: 包含斜边的ROI区域（灰度图像）
-    :param oversampling: 超采样倍数（通常为4）
-    :param pixel_size: 物理像素尺寸（mm/px），用于转换为cycles/mm
-    :return: MTF曲线数据及关键指标
+    SFR分析的步骤1~6：由斜边ROI得到ESF、LSF与MTF曲线（不计算MTF50等指标）
+    :return: (esf, lsf, freq, mtf)
     """
     # 步骤1：边缘检测与角度计算
     angle_deg = calculate_edge_angle(roi)
@@ -32,6 +31,18 @@ def sfr_calculation(roi, oversampling=4, pixel_size=None):
 
     # 步骤6：MTF计算
     freq, mtf = calculate_mtf(sfr)
+    return esf, lsf, freq, mtf
+
+
+def sfr_calculation(roi, oversampling=4, pixel_size=None):
+    """
+    执行完整的SFR分析流程
+    :param roi: 包含斜边的ROI区域（灰度图像）
+    :param oversampling: 超采样倍数（通常为4）
+    :param pixel_size: 物理像素尺寸（mm/px），用于转换为cycles/mm
+    :return: MTF曲线数据及关键指标
+    """
+    esf, lsf, freq, mtf = mtf_curve(roi, oversampling)
 
     # 步骤7：MTF50 & MTF50p 指标计算
     mtf50 = find_mtf50(freq, mtf)
@@ -91,47 +102,34 @@ def gamma_correction(image):
     return cv2.LUT(image, gamma_table)
 
 def generate_super_res_esf(aligned, oversampling):
+    """
+    超采样ESF：逐行取相邻像素差绝对值最大处为边缘位置，线性拟合边缘直线，
+    再把检测宽度内的全部像素按到边缘的距离一次性分箱平均（np.bincount）
+    """
+    roi = aligned.astype(np.int64)
+    rows, cols = roi.shape
 
-    roi = aligned.astype(np.uint32)
-    edge_idx_per_line = []
-
-    for line in roi:
-        max_diff=0
-        last_px = line[0]
-        max_idx = idx = 0
-        for px in line:
-            diff = abs(int(last_px) - int(px))
-            if diff > max_diff:
-               max_diff = diff
-               max_idx = idx
-            last_px = px
-            idx += 1
-        edge_idx_per_line.append(max_idx)
+    # 每行边缘位置：|px[i] - px[i-1]| 最大的i（无变化时为0）
+    diff = np.abs(np.diff(roi, axis=1))
+    edge_idx_per_line = np.where(diff.max(axis=1) > 0, np.argmax(diff, axis=1) + 1, 0)
 
-    slope, intercept, r_value, p_value, std_err = stats.linregress(list(range(len(edge_idx_per_line))), edge_idx_per_line)
+    slope, intercept, r_value, p_value, std_err = stats.linregress(np.arange(rows), edge_idx_per_line)
     inspection_width = 1
-    while inspection_width <= len(roi[0]):
+    while inspection_width <= cols:
         inspection_width *= 2
     inspection_width = inspection_width//2
     half_inspection_width = inspection_width/2
-    print(inspection_width, oversampling, (inspection_width*oversampling + 2))
-    esf_sum = [0] * (inspection_width*oversampling + 2)
-    hit_count = [0] * (inspection_width*oversampling + 2)    
-    x = y = 0
-    for line in roi:
-        for px in line:
-           # only calculate the pixels in the inspection width
-           if abs(x-float(y*slope+intercept)) <= half_inspection_width+1/oversampling:
-               idx = int((x-(y*slope+intercept)+half_inspection_width)*oversampling+1)
-               esf_sum[idx] = esf_sum[idx] + px
-               hit_count[idx] += 1
-           x += 1
-        y += 1
-        x = 0
-    hit_count = [ 1 if c == 0 else c for c in hit_count ]
-    esf_data = np.divide(esf_sum, hit_count).tolist()
-    print(len(esf_data))
-    return esf_data
+    n_bins = inspection_width*oversampling + 2
+
+    # 每个像素到拟合边缘的水平距离，仅统计检测宽度内的像素
+    dist = np.arange(cols)[None, :] - (np.arange(rows)[:, None] * slope + intercept)
+    mask = np.abs(dist) <= half_inspection_width + 1/oversampling
+    idx = ((dist[mask] + half_inspection_width) * oversampling + 1).astype(np.int64)
+    keep = idx < n_bins
+    esf_sum = np.bincount(idx[keep], weights=roi[mask][keep], minlength=n_bins)
+    hit_count = np.bincount(idx[keep], minlength=n_bins)
+    hit_count[hit_count == 0] = 1
+    return esf_sum / hit_count
     
 def calculate_lsf(esf, window='hamming'):
     """
@@ -152,28 +150,19 @@ def calculate_lsf(esf, window='hamming'):
     return lsf * window
 
 def calculate_sfr(lsf):
-    raw_sfr = np.abs(fftpack.fft(lsf)).tolist()
-    sfr_base = raw_sfr[0]
-    sfr_data = [ d/sfr_base for d in raw_sfr]
-    #print(sfr_data)
-    return sfr_data
+    raw_sfr = np.abs(fftpack.fft(lsf))
+    return raw_sfr / raw_sfr[0]
 
 def calculate_mtf(sfr):
-    mtf_data = [0] * int(len(sfr)/2)
-    idx = 0
-    for sfr_data in sfr[0:len(mtf_data)]:
-        freq = idx / (len(mtf_data) - 1)
-        if freq == 0:
-            mtf_data[idx] = sfr_data
-        else:
-            mtf_data[idx] = sfr_data * (np.pi * freq/2)/np.sin(np.pi * freq/2)
-            print((np.pi * freq/2), np.sin(np.pi * freq/2), (np.pi * freq/2)/np.sin(np.pi * freq/2))
-        idx += 1
-    #print(mtf_data)
-    #print(sfr)
-    freq = [f/(len(mtf_data)) for f in range(len(mtf_data))]
-    #print(len(freq))
-    mtf = np.asarray(mtf_data)
+    """SFR转MTF：除以离散差分的频率响应 sinc 校正，频率从0到1（单边）"""
+    sfr = np.asarray(sfr)
+    n = int(len(sfr)/2)
+    f = np.arange(n) / (n - 1)
+    correction = np.ones(n)
+    x = np.pi * f[1:] / 2
+    correction[1:] = x / np.sin(x)
+    mtf = sfr[:n] * correction
+    freq = np.arange(n) / n
     return freq, mtf
 
 def compute_mtf(lsf, pixel_size=None):
@@ -202,7 +191,6 @@ def find_mtf50(freq, mtf):
     精确计算MTF50值（包含插值）
     """
     # 寻找交叉点
-    print(type(mtf))
     cross_idx = np.where(mtf < 0.5)[0][0]
     x = [freq[cross_idx-1], freq[cross_idx]]
     y = [mtf[cross_idx-1], mtf[cross_idx]]
@@ -236,6 +224,10 @@ def get_standard_mtf_data(mtf_data, freq_at_50_mtf, oversampling_rate = 4):
         idx_equal = freq_equal * (len(mtf_data)-1)
         mtf_equal = mtf_data[int(idx_equal)] + (mtf_data[int(idx_equal)+1]-mtf_data[int(idx_equal)])*(idx_equal-idx_equal//1)
         last_sharpening_radius = 0
+        n = len(mtf_data)
+        # frequency is from 0 to 1
+        freq = np.arange(n) / (n-1)
+        mtf_array = np.asarray(mtf_data, dtype=np.float64)
         while last_sharpening_radius != sharpening_radius:
             last_sharpening_radius = sharpening_radius
             # calculate sharpness coefficient
@@ -243,73 +235,26 @@ def get_standard_mtf_data(mtf_data, freq_at_50_mtf, oversampling_rate = 4):
             #     When MTF(sharp) = 1, ksharp = (1 - MTF(system)) / (cos(2*PI*f*R/dscan) - MTF(system))
             k_sharp = (1-mtf_equal)/(np.cos(2*np.pi*freq_equal*sharpening_radius)-mtf_equal)
             # standardized sharpening
+            with np.errstate(divide='ignore', invalid='ignore'):
+                standard_mtf_data = mtf_array/((1-k_sharp*np.cos(2*np.pi*freq*sharpening_radius))/(1-k_sharp))
+            # get MTF50
             standard_freq_at_50_mtf = 0
-            idx = 0
-            standard_mtf_data = [0] * len(mtf_data)
-            for mtf in mtf_data:
-                # frequency is from 0 to 1
-                freq = idx / (len(mtf_data)-1)
-                standard_mtf_data[idx] = mtf/((1-k_sharp*np.cos(2*np.pi*freq*sharpening_radius))/(1-k_sharp))
-                # get MTF50
-                if standard_freq_at_50_mtf == 0 and standard_mtf_data[idx] < 0.5:
-                    standard_freq_at_50_mtf = (idx-1+(0.5-standard_mtf_data[idx])/(standard_mtf_data[idx-1]-standard_mtf_data[idx]))/(len(standard_mtf_data)-1)
-                    # If the difference of the original frequency at MTF50 and the frequency at MTF50(corr) is larger than 0.04,
-                    # it should increase the radius by one and recalculate the ksharp.
-                    if (abs(standard_freq_at_50_mtf-freq_at_50_mtf) > 0.04):
-                        sharpening_radius += 1
-                        break
-                idx += 1
+            below = np.flatnonzero(standard_mtf_data < 0.5)
+            if below.size:
+                idx = below[0]
+                prev = standard_mtf_data[idx-1] if idx > 0 else 0
+                standard_freq_at_50_mtf = (idx-1+(0.5-standard_mtf_data[idx])/(prev-standard_mtf_data[idx]))/(n-1)
+                # If the difference of the original frequency at MTF50 and the frequency at MTF50(corr) is larger than 0.04,
+                # it should increase the radius by one and recalculate the ksharp.
+                if (abs(standard_freq_at_50_mtf-freq_at_50_mtf) > 0.04):
+                    sharpening_radius += 1
         return standard_mtf_data, standard_freq_at_50_mtf, mtf_equal, k_sharp, sharpening_radius
 
 # ================= 可视化与主流程 =================
 
 def plot_sfr_results(results):
-    
-    #可视化输出
-    
-    plt.figure(figsize=(10, 8))
-    
-    # ESF子图
-    plt.subplot(2, 2, 1)
-    plt.plot(results['esf'], 'b-', linewidth=1)
-    plt.title('Edge Spread Function (4x Oversampled)')
-    plt.xlabel('Position (0.25 pixel steps)')
-    plt.grid(True, linestyle='--', alpha=0.7)
-    
-    # LSF子图
-    plt.subplot(2, 2, 2)
-    plt.plot(results['lsf'], 'r-', linewidth=1)
-    plt.title('Line Spread Function')
-    plt.xlabel('Position')
-    plt.grid(True, linestyle='--', alpha=0.7)
-    
-    # MTF曲线
-    plt.subplot(2, 1, 2)
-    #plt.semilogx(results['freq'], 20*np.log10(results['mtf']), 'g-', linewidth=2)
-    plt.plot(results['freq'], results['standard_mtf_data'], 'g-', linewidth=2)
-    #plt.axhline(-3, color='k', linestyle='--', label='MTF50')
-    plt.axvline(results['mtf50'], ymin = 0, ymax = 0.5, color='b', linestyle=':', 
-               label=f'MTF50 = {results["mtf50"]:.2f} Cy/Pxl')
-    plt.title('SFR/MTF Curve')
-    plt.xlabel('Spatial Frequency (Cy/Pxl)')
-    plt.ylabel('Modulation (dB)')
-    font1 = {'color': 'darkred', 'weight': 'normal', 'size': 12, }
-    
-    font2 = {'color': 'red','weight': 'light', 'size': 10 }
-
-
-    plt.text(0, 0.3, "MTF50 = %.2f Cy/Pxl" % (results["mtf50"]), font1)
-    plt.text(0, 0.2, "MTF50p = %.2f Cy/Pxl" % (results["mtf50_p"]), font1)
-    if results["mtf_equal"] - 1 > 0:
-        sharpenss = "Oversharpenss = %.1f" % (results["mtf_equal"] * 100 - 100) + "%"
-    else:
-        sharpenss = "Undersharpenss = %.1f" % (100 - results["mtf_equal"] * 100) + "%"
-    plt.text(0, 0.1, sharpenss, font2)
-    plt.legend()
-    plt.grid(True, which='both', linestyle='--', alpha=0.7)
-    
-    plt.tight_layout()
-    plt.show()
+    """显示SFR结果图表（ESF、LSF、MTF曲线）"""
+    render.show('sfr', results)
 
 def output(results):
     print(f"MTF50: {results['mtf50']:.2f} cycles/mm")
@@ -320,7 +265,7 @@ def output(results):
 
 def main(image_path):
     # 图像加载与预处理
-    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    img = image_cache.imread(image_path, cv2.IMREAD_GRAYSCALE)
     #img = gamma_correction(img)
     #img = cv2.GaussianBlur(img, (3,3), 0)
     
@@ -0,0 +1,213 @@
+import os
+import cv2
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+import camera_script.image_cache as image_cache
+import camera_script.SFR as SFR
+
+# 斜边与水平/竖直方向的夹角范围（度），ISO 12233 斜边通常为5°左右
+MIN_SLANT_DEG = 2.0
+MAX_SLANT_DEG = 15.0
+
+
+def detect_slanted_edges(gray, min_edge_len=60, roi_width=None, min_area=400):
+    """
+    在ISO 12233类图卡中自动检测斜边ROI
+    对暗色块（方块、斜条等）二值化取轮廓，多边形拟合后保留略偏离水平/竖直方向的长边，
+    以边的中点为中心截取ROI；接近水平的边标记为'horizontal'，计算时转置为竖直边
+    :param gray: 灰度图像
+    :param min_edge_len: 最短边长（像素）
+    :param roi_width: 垂直于边方向的ROI宽度，默认从边长的一半开始逐步收窄
+    :return: ROI列表，每项为 {'x', 'y', 'w', 'h', 'orientation', 'angle', 'center'}
+    """
+    blur = cv2.GaussianBlur(gray, (5, 5), 0)
+    _, binary = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(binary, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    height, width = gray.shape[:2]
+
+    rois = []
+    for contour in contours:
+        if cv2.contourArea(contour) < min_area:
+            continue
+        poly = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True).reshape(-1, 2)
+        if len(poly) < 4 or len(poly) > 8:
+            continue
+        for p0, p1 in zip(poly, np.roll(poly, -1, axis=0)):
+            dx, dy = (p1 - p0).astype(np.float64)
+            length = np.hypot(dx, dy)
+            if length < min_edge_len:
+                continue
+            angle = np.degrees(np.arctan2(abs(dy), abs(dx)))  # 0:水平 90:竖直
+            vertical = angle > 45
+            slant = 90 - angle if vertical else angle
+            if not MIN_SLANT_DEG <= slant <= MAX_SLANT_DEG:
+                continue
+            cx, cy = (p0 + p1) / 2.0
+            along = int(length * 0.6)
+            # 细条纹等情况下ROI可能同时包含两条边，逐步收窄直到只剩单一边缘
+            widths = [roi_width] if roi_width else [max(int(length * f), 20) for f in (0.5, 0.35, 0.2)]
+            for across in dict.fromkeys(widths):
+                w, h = (across, along) if vertical else (along, across)
+                x = int(round(cx - w / 2))
+                y = int(round(cy - h / 2))
+                if x < 0 or y < 0 or x + w > width or y + h > height:
+                    continue
+                crop = gray[y:y + h, x:x + w]
+                if is_clean_edge(crop if vertical else crop.T):
+                    rois.append({
+                        'x': x, 'y': y, 'w': w, 'h': h,
+                        'orientation': 'vertical' if vertical else 'horizontal',
+                        'angle': float(slant),
+                        'center': (float(cx), float(cy)),
+                    })
+                    break
+    return _dedupe(rois)
+
+
+def is_clean_edge(crop, min_contrast=40, max_residual=1.5, min_inlier=0.8):
+    """
+    校验ROI内是否为单一、笔直且对比度足够的竖直边缘（排除文字、线对等干扰）
+    """
+    roi = crop.astype(np.float64)
+    profile = roi.mean(axis=0)
+    if profile.max() - profile.min() < min_contrast:
+        return False
+    diff = np.abs(np.diff(roi, axis=1))
+    pos = np.argmax(diff, axis=1).astype(np.float64)
+    rows = np.arange(len(pos))
+    slope, intercept = np.polyfit(rows, pos, 1)
+    residual = np.abs(pos - (slope * rows + intercept))
+    return np.mean(residual <= 2) >= min_inlier and np.median(residual) <= max_residual
+
+
+def _dedupe(rois, min_dist=10):
+    """去除中心过近的重复ROI（同一条边可能出现在内外两条轮廓中）"""
+    kept = []
+    for roi in rois:
+        if all(np.hypot(roi['center'][0] - k['center'][0], roi['center'][1] - k['center'][1]) >= min_dist
+               for k in kept):
+            kept.append(roi)
+    return kept
+
+
+def _low_frequency_peak(freq, mtf, nyquist=0.5):
+    """
+    MTF50P所用峰值的位置：0频率起的第一个局部极大值（不超过奈奎斯特频率）
+    奈奎斯特以上的高频噪声可能远高于低频段，不能取全局最大值
+    """
+    band = mtf[freq <= nyquist]
+    falling = np.nonzero(band[1:] < band[:-1])[0]
+    return int(falling[0]) if len(falling) else int(np.argmax(band))
+
+
+def _sfr_worker(roi_img):
+    """进程池任务：单个ROI的SFR计算，仅返回标量指标"""
+    try:
+        _, _, freq, mtf = SFR.mtf_curve(roi_img)
+        freq, mtf = np.asarray(freq), np.asarray(mtf)
+        # MTF始终不低于0.5时 find_mtf_value 返回最高频率而非真实的MTF50，该边记为无效
+        if not np.any(mtf < 0.5):
+            raise ValueError("MTF未低于0.5")
+        mtf50 = SFR.find_mtf_value(freq, mtf, 0.5)
+        # MTF50P：MTF自低频峰值下降到峰值一半处的频率
+        peak = _low_frequency_peak(freq, mtf)
+        normalized = mtf[peak:] / mtf[peak]
+        if not np.any(normalized < 0.5):
+            raise ValueError("MTF未低于峰值的一半")
+        mtf50p = SFR.find_mtf_value(freq[peak:], normalized, 0.5)
+        return {'mtf50': float(mtf50), 'mtf50p': float(mtf50p), 'error': None}
+    except Exception as e:
+        return {'mtf50': np.nan, 'mtf50p': np.nan, 'error': str(e)}
+
+
+def analyze_chart(image_path, rois=None, max_workers=None, **detect_kwargs):
+    """
+    整张斜边图卡的SFR分析：自动检测全部斜边ROI，在进程池中并行计算MTF50/MTF50P
+    :param image_path: 图卡图像路径（或灰度数组）
+    :param rois: 预先给定的ROI列表，None时自动检测
+    :return: {'image_size', 'edges': [...], 'field_map': {...}}
+    """
+    gray = image_path if isinstance(image_path, np.ndarray) else image_cache.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise FileNotFoundError(f"图像未找到: {image_path}")
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+    if rois is None:
+        rois = detect_slanted_edges(gray, **detect_kwargs)
+
+    crops = []
+    for roi in rois:
+        crop = gray[roi['y']:roi['y'] + roi['h'], roi['x']:roi['x'] + roi['w']]
+        # SFR按行寻找边缘，水平边转置为竖直边
+        crops.append(np.ascontiguousarray(crop.T) if roi['orientation'] == 'horizontal' else crop)
+
+    workers = max_workers or os.cpu_count() or 1
+    if workers > 1 and len(crops) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            metrics = list(executor.map(_sfr_worker, crops))
+    else:
+        metrics = [_sfr_worker(c) for c in crops]
+
+    height, width = gray.shape
+    half_diag = np.hypot(width / 2, height / 2)
+    edges = []
+    for roi, m in zip(rois, metrics):
+        cx, cy = roi['center']
+        edges.append(dict(roi, **m, field=float(np.hypot(cx - width / 2, cy - height / 2) / half_diag)))
+
+    return {
+        'image_size': (width, height),
+        'edges': edges,
+        'field_map': field_map(edges, (width, height)),
+    }
+
+
+def field_map(edges, image_size, grid=(3, 3)):
+    """
+    将各斜边结果按传感器区域汇总（默认3x3：中心、四边、四角），
+    返回各格MTF50/MTF50P均值矩阵及有效边数
+    """
+    width, height = image_size
+    rows, cols = grid
+    sums = {'mtf50': np.zeros(grid), 'mtf50p': np.zeros(grid)}
+    counts = np.zeros(grid, dtype=int)
+    for e in edges:
+        if e.get('error') or not np.isfinite(e['mtf50']):
+            continue
+        cx, cy = e['center']
+        r = min(int(cy / height * rows), rows - 1)
+        c = min(int(cx / width * cols), cols - 1)
+        sums['mtf50'][r, c] += e['mtf50']
+        sums['mtf50p'][r, c] += e['mtf50p']
+        counts[r, c] += 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'grid': grid,
+            'mtf50': sums['mtf50'] / counts,
+            'mtf50p': sums['mtf50p'] / counts,
+            'count': counts,
+        }
+
+
+def output(results):
+    print("===== 全图SFR分析结果 =====")
+    for e in results['edges']:
+        status = f"MTF50={e['mtf50']:.3f}, MTF50P={e['mtf50p']:.3f}" if not e['error'] else f"失败: {e['error']}"
+        print(f"({e['center'][0]:.0f}, {e['center'][1]:.0f}) {e['orientation']:<10} "
+              f"视场{e['field']:.2f}  {status}")
+    fm = results['field_map']
+    print("MTF50 区域分布:")
+    print(np.round(fm['mtf50'], 3))
+    print("MTF50P 区域分布:")
+    print(np.round(fm['mtf50p'], 3))
+
+
+def main(image_path):
+    results = analyze_chart(image_path)
+    output(results)
+    return results
+
+
+if __name__ == "__main__":
+    main("12233.png")
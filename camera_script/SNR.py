@@ -1,7 +1,8 @@
 import cv2
 import math
 import numpy as np
-import matplotlib.pyplot as plt
+from camera_script.chart_layout import auto_roi, color_patch_slices, stack_patches
+import camera_script.image_cache as image_cache
 
 def separate_24color(roi, x, y, w, h):
     #zeropoint_x = x - 0.5 * w
@@ -22,38 +23,94 @@ def separate_24color(roi, x, y, w, h):
     return PiecesList
 
 def SNR_calculation(pieces):
+    """
+    色块SNR（保持原有定义）：以色块中心像素为参考，
+    信号能量为中心像素三通道平方和，噪声能量为各像素第0通道与中心差值平方和的3倍
+    """
     snr = 0
     for Color_piece in pieces:
-        i, j, k  = Color_piece.shape
+        i, j, _ = Color_piece.shape
         x = i // 2
         y = j // 2
-        base_point = int(Color_piece[x, y, 0])**2 + int(Color_piece[x, y, 1])**2 + int(Color_piece[x, y, 2])**2
-        tmp_cala = 0
-        tmp_calb = 0
-        for m in range(i):
-            for n in range(j):
-                delta_point = 0
-                for k in range(3):
-                    delta_point += (int(Color_piece[m, n, 0]) - int(Color_piece[x, y, 0])) ** 2
-                tmp_cala += base_point
-                tmp_calb += delta_point
+        center = Color_piece[x, y].astype(np.int64)
+        tmp_cala = int(np.sum(center ** 2)) * i * j
+        tmp_calb = 3 * int(np.sum((Color_piece[:, :, 0].astype(np.int64) - center[0]) ** 2))
         if(tmp_calb != 0):
             snr += (10 * math.log10(tmp_cala/tmp_calb)) ** 2
     
     snr = math.sqrt((snr / len(pieces)))
 
     return snr
-        
 
-def main(image_path):
-    image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+def _to_db(signal, noise):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(noise > 0, 20 * np.log10(signal / noise), np.inf)
 
-    # 手动选择ROI
-    cv2.namedWindow("Select Edge ROI", cv2.WINDOW_NORMAL)
-    roi = cv2.selectROI("Select Edge ROI", image)
-    x, y, w, h = map(int, roi)
-    #roi_image = image[y:y+h, x:x+w] 
-    roi_image = image[y:y+h, x:x+w]     
+def patch_statistics(frames, w=None, h=None, slices=None):
+    """
+    24色块统计（向量化）：对 (帧, 色块, 高, 宽, 通道) 张量一次性归约
+    :param frames: 单帧ROI (H, W, C) 或多帧ROI (F, H, W, C)
+    :param w, h: ROI宽高（默认取帧尺寸）
+    :param slices: 色块切片，默认按ROI尺寸由色卡布局计算
+    :return: 各项均为 (24, C) 数组：
+        mean           色块均值
+        spatial_std    帧平均后色块内的空间标准差（固定模式噪声）
+        temporal_std   逐像素跨帧标准差的均方根（随机噪声，单帧时为0）
+        total_std      逐帧色块标准差的平均值
+        snr_*_db       对应的SNR（dB）
+    """
+    frames = np.asarray(frames)
+    if frames.ndim == 3:
+        frames = frames[None]
+    if slices is None:
+        if w is None or h is None:
+            h, w = frames.shape[1:3]
+        slices = color_patch_slices(w, h)
+    tensor = stack_patches(frames, slices).astype(np.float64)  # (F, 24, ph, pw, C)
+
+    mean_img = tensor.mean(axis=0)
+    mean = mean_img.mean(axis=(1, 2))
+    spatial_std = mean_img.std(axis=(1, 2))
+    temporal_std = np.sqrt(tensor.var(axis=0).mean(axis=(1, 2)))
+    total_std = tensor.std(axis=(2, 3)).mean(axis=0)
+
+    return {
+        'n_frames': tensor.shape[0],
+        'patch_shape': tensor.shape[2:4],
+        'mean': mean,
+        'spatial_std': spatial_std,
+        'temporal_std': temporal_std,
+        'total_std': total_std,
+        'snr_spatial_db': _to_db(mean, spatial_std),
+        'snr_temporal_db': _to_db(mean, temporal_std),
+        'snr_total_db': _to_db(mean, total_std),
+    }
+
+def analyze_frames(image_paths, roi):
+    """多帧24色卡SNR：同一ROI (x, y, w, h) 应用于所有帧，一次计算空间与时域SNR"""
+    x, y, w, h = roi
+    frames = []
+    for path in image_paths:
+        image = image_cache.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise FileNotFoundError(f"图像未找到: {path}")
+        frames.append(image[y:y+h, x:x+w])
+    return patch_statistics(np.stack(frames), w, h)
+
+def main(image_path, auto=False, fixture_id=None):
+    image = image_cache.imread(image_path, cv2.IMREAD_COLOR)
+
+    # 自动检测色卡（透视校正后的规范化ROI），失败时手动选择ROI
+    roi_image = auto_roi(image, 'color', fixture_id) if auto else None
+    if roi_image is not None:
+        x, y = 0, 0
+        h, w = roi_image.shape[:2]
+    else:
+        cv2.namedWindow("Select Edge ROI", cv2.WINDOW_NORMAL)
+        roi = cv2.selectROI("Select Edge ROI", image)
+        x, y, w, h = map(int, roi)
+        #roi_image = image[y:y+h, x:x+w] 
+        roi_image = image[y:y+h, x:x+w]     
 
     cv2.imwrite("roi_1.png", roi_image)
 
@@ -63,6 +120,9 @@ def main(image_path):
     snr = SNR_calculation(List)
     print(snr)
 
+    stats = patch_statistics(roi_image, w, h)
+    print(f"色块平均SNR (B/G/R): {np.round(np.mean(stats['snr_total_db'], axis=0), 2)} dB")
+
 
 
 if __name__ == "__main__":
@@ -2,11 +2,15 @@ import cv2
 import numpy as np
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 import wx
 import matplotlib
 from matplotlib import pyplot as plt
 from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as FigureCanvas
 
+import camera_script.chart_layout as chart_layout
+import camera_script.image_cache as image_cache
+
 # 设置中文字体
 matplotlib.rcParams['font.sans-serif'] = ['SimHei']  # 设置中文显示
 matplotlib.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
@@ -26,60 +30,143 @@ class ImageNoiseAnalyzer:
         :param image_path: 图像路径
         :return: 噪声分析结果字典
         """
-        # 读取图像
-        img = cv2.imread(image_path)
-        if img is None:
-            raise ValueError(f"无法读取图像: {image_path}")
-            
-        # 转换为灰度图用于基础分析
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
         # 检查是否设置了ROI
         if self.roi is None:
             raise ValueError("未设置ROI区域，请先选择24色卡区域")
-            
-        x, y, w, h = self.roi
-        dark_patch = gray[y:y+h, x:x+w]
-        
+
+        image_size, color_roi, gray_roi, saturated = self._load(image_path)
+        stats = self._frame_statistics(color_roi[None], gray_roi[None], np.array([saturated]))
+
         # 计算噪声指标
         self.results = {
-            'image_size': img.shape,
+            'image_size': image_size,
             'roi': self.roi,
-            'random_noise_mean': float(np.mean(dark_patch)),
-            'random_noise_std': float(np.std(dark_patch)),
-            'dynamic_range': self._calc_dynamic_range(gray),
-            'color_noise': self._analyze_color_noise(img),
+            **self._frame_result(stats, 0),
             'timestamp': time.strftime("%Y-%m-%d %H:%M:%S")
         }
-        
+
         return self.results
-    
-    def _calc_dynamic_range(self, gray_img):
+
+    def analyze_noise_set(self, image_paths, max_workers=4):
         """
-        计算动态范围
+        同一ROI应用于一组图像（同一场景的多次采集）：线程池并行解码，
+        各帧ROI堆叠为 (帧, 高, 宽[, 通道]) 张量后一次归约出逐帧统计，并计算跨帧的时域统计
+        :param image_paths: 图像路径列表
+        :param max_workers: 解码线程数
+        :return: 汇总结果字典：各项为逐帧平均值，'per_image' 为逐帧结果，'temporal' 为时域统计（至少2帧）
+        """
+        if self.roi is None:
+            raise ValueError("未设置ROI区域，请先选择24色卡区域")
+        image_paths = list(image_paths)
+        if not image_paths:
+            raise ValueError("未提供任何图像")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            frames = list(executor.map(self._load, image_paths))
+        shapes = {frame[2].shape for frame in frames}
+        if len(shapes) > 1:
+            raise ValueError(f"ROI超出部分图像范围，各图像ROI尺寸不一致: {sorted(shapes)}")
+
+        color_rois = np.stack([frame[1] for frame in frames])
+        gray_rois = np.stack([frame[2] for frame in frames])
+        stats = self._frame_statistics(color_rois, gray_rois, np.array([frame[3] for frame in frames]))
+        per_image = [dict(image=path, image_size=frame[0], **self._frame_result(stats, i))
+                     for i, (path, frame) in enumerate(zip(image_paths, frames))]
+
+        self.results = {
+            'image_size': frames[0][0],
+            'roi': self.roi,
+            'frame_count': len(frames),
+            'random_noise_mean': float(stats['random_noise_mean'].mean()),
+            'random_noise_std': float(stats['random_noise_std'].mean()),
+            'dynamic_range': float(stats['dynamic_range'].mean()),
+            'color_noise': {ch: {key: float(values.mean()) for key, values in vals.items()}
+                            for ch, vals in stats['color_noise'].items()},
+            'per_image': per_image,
+            'timestamp': time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        if len(frames) > 1:
+            self.results['temporal'] = self._temporal_statistics(color_rois, gray_rois)
+        return self.results
+
+    def _load(self, image_path):
+        """读取一帧（可在解码线程中执行）：图像尺寸、ROI彩色/灰度裁剪及整幅灰度的99.9%分位亮度"""
+        img = image_cache.imread(image_path)
+        if img is None:
+            raise ValueError(f"无法读取图像: {image_path}")
+
+        # 转换为灰度图用于基础分析
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        x, y, w, h = self.roi
+        return img.shape, img[y:y+h, x:x+w], gray[y:y+h, x:x+w], np.percentile(gray, 99.9)
+
+    def _frame_statistics(self, color_rois, gray_rois, saturated):
+        """
+        逐帧统计（对堆叠张量一次归约）
+        :param color_rois: (F, h, w, 3) 彩色ROI
+        :param gray_rois: (F, h, w) 灰度ROI
+        :param saturated: (F,) 各帧整幅灰度的99.9%分位亮度
+        :return: 各项均为长度F的数组
+        """
+        dark_std = gray_rois.std(axis=(1, 2))
+        return {
+            'random_noise_mean': gray_rois.mean(axis=(1, 2)),
+            'random_noise_std': dark_std,
+            'dynamic_range': self._calc_dynamic_range(saturated, dark_std),
+            'color_noise': self._analyze_color_noise(color_rois),
+        }
+
+    @staticmethod
+    def _frame_result(stats, index):
+        """第index帧的结果字典（与单幅分析的格式一致）"""
+        return {
+            'random_noise_mean': float(stats['random_noise_mean'][index]),
+            'random_noise_std': float(stats['random_noise_std'][index]),
+            'dynamic_range': float(stats['dynamic_range'][index]),
+            'color_noise': {ch: {key: float(values[index]) for key, values in vals.items()}
+                            for ch, vals in stats['color_noise'].items()},
+        }
+
+    def _calc_dynamic_range(self, saturated, dark_std):
+        """
+        计算动态范围：饱和亮度（99.9%分位）与暗区噪声标准差之比
         """
-        dark_std = self.results.get('random_noise_std', 1)
-        saturated = np.percentile(gray_img, 99.9)
         return 20 * np.log10(saturated / (dark_std + 1e-6))
-    
-    def _analyze_color_noise(self, color_img):
+
+    def _analyze_color_noise(self, color_rois):
         """
-        分析各颜色通道噪声特性
+        分析各颜色通道噪声特性，color_rois 为 (F, h, w, 3)，各项为长度F的数组
         """
-        x, y, w, h = self.roi
-        channels = cv2.split(color_img)
+        means = color_rois.mean(axis=(1, 2))
+        stds = color_rois.std(axis=(1, 2))
         color_results = {}
-        
+
         for i, ch in enumerate(['B', 'G', 'R']):
-            patch = channels[i][y:y+h, x:x+w]
             color_results[ch] = {
-                'mean': float(np.mean(patch)),
-                'std': float(np.std(patch)),
-                'snr': 20 * np.log10(np.mean(patch)/(np.std(patch)+1e-6))
+                'mean': means[:, i],
+                'std': stds[:, i],
+                'snr': 20 * np.log10(means[:, i] / (stds[:, i] + 1e-6))
             }
-            
+
         return color_results
-    
+
+    def _temporal_statistics(self, color_rois, gray_rois):
+        """
+        跨帧时域统计：逐像素跨帧标准差的均方根为随机噪声，帧平均图的空间标准差为固定模式噪声
+        """
+        temporal = {}
+        planes = [('gray', gray_rois)] + [(ch, color_rois[..., i]) for i, ch in enumerate(['B', 'G', 'R'])]
+        for name, stack in planes:
+            mean_frame = stack.mean(axis=0)
+            noise = float(np.sqrt(stack.var(axis=0).mean()))
+            temporal[name] = {
+                'mean': float(mean_frame.mean()),
+                'noise': noise,
+                'fpn': float(mean_frame.std()),
+                'snr': float(20 * np.log10(mean_frame.mean() / (noise + 1e-6))),
+            }
+        return temporal
+
     def generate_report(self):
         """
         生成测试报告文本
@@ -105,7 +192,22 @@ ROI区域: {self.results['roi']}
   均值: {vals['mean']:.2f}
   标准差: {vals['std']:.2f}
   信噪比: {vals['snr']:.2f} dB"""
-        
+
+        if 'per_image' in self.results:
+            report = report.replace("=== 图像噪声测试报告 ===",
+                                    f"=== 图像噪声测试报告（{self.results['frame_count']}幅，各项为逐帧平均）===", 1)
+            report += "\n\n--- 逐帧结果 ---"
+            for item in self.results['per_image']:
+                snr = ', '.join(f"{ch} {vals['snr']:.2f}" for ch, vals in item['color_noise'].items())
+                report += (f"\n{os.path.basename(item['image'])}: 标准差 {item['random_noise_std']:.2f}, "
+                           f"动态范围 {item['dynamic_range']:.2f} dB, 信噪比 {snr} dB")
+
+        if 'temporal' in self.results:
+            report += "\n\n--- 时域统计（跨帧） ---"
+            for name, vals in self.results['temporal'].items():
+                report += (f"\n{name}: 随机噪声 {vals['noise']:.2f}, 固定模式噪声 {vals['fpn']:.2f}, "
+                           f"时域信噪比 {vals['snr']:.2f} dB")
+
         return report
 
 
@@ -121,7 +223,7 @@ class ROISelectorDialog(wx.Dialog):
         self.current_pos = None
         
         # 加载图像
-        self.img = cv2.imread(image_path)
+        self.img = image_cache.imread(image_path)
         if self.img is None:
             wx.MessageBox("无法加载图像", "错误", wx.OK|wx.ICON_ERROR)
             self.Destroy()
@@ -155,6 +257,10 @@ class ROISelectorDialog(wx.Dialog):
         self.canvas.Bind(wx.EVT_LEFT_UP, self.on_mouse_up)
         self.canvas.Bind(wx.EVT_MOTION, self.on_mouse_move)
         
+        # 自动检测按钮
+        btn_auto = wx.Button(panel, label="自动检测色卡")
+        btn_auto.Bind(wx.EVT_BUTTON, self.on_auto_detect)
+
         # 确认按钮
         btn_sizer = wx.StdDialogButtonSizer()
         btn_ok = wx.Button(panel, wx.ID_OK, label="确定")
@@ -166,6 +272,7 @@ class ROISelectorDialog(wx.Dialog):
         btn_sizer.Realize()
         
         vbox.Add(self.canvas, proportion=1, flag=wx.EXPAND|wx.ALL, border=5)
+        vbox.Add(btn_auto, proportion=0, flag=wx.ALIGN_CENTER|wx.BOTTOM, border=5)
         vbox.Add(btn_sizer, proportion=0, flag=wx.ALIGN_CENTER|wx.BOTTOM, border=10)
         
         panel.SetSizer(vbox)
@@ -195,6 +302,19 @@ class ROISelectorDialog(wx.Dialog):
             self.offset_x = (self.bbox.width - self.width * self.scale) / 2
             self.offset_y = 0
             
+    def on_auto_detect(self, event):
+        """自动检测24色卡，以色卡外接矩形作为ROI"""
+        try:
+            layout = chart_layout.locate_chart(cv2.cvtColor(self.img, cv2.COLOR_RGB2BGR), 'color')
+        except ValueError as e:
+            wx.MessageBox(f"自动检测失败，请手动框选: {e}", "提示", wx.OK|wx.ICON_INFORMATION)
+            return
+        x, y, w, h = layout.roi
+        x, y = max(x, 0), max(y, 0)
+        self.start_pos = (x, y)
+        self.current_pos = (min(x + w, self.width - 1), min(y + h, self.height - 1))
+        self.draw_roi()
+
     def on_mouse_down(self, event):
         x, y = event.GetPosition()
         img_x, img_y = self._convert_coords(x, y)
@@ -258,6 +378,7 @@ class NoiseTestApp(wx.Frame):
     def __init__(self):
         super().__init__(None, title="图像噪声测试工具", size=(1000, 800))
         self.image_path = None
+        self.image_paths = []
         self.analyzer = ImageNoiseAnalyzer()
         self.init_ui()
         
@@ -321,11 +442,16 @@ class NoiseTestApp(wx.Frame):
         
     def on_open_image(self, event):
         wildcard = "图像文件 (*.jpg;*.png;*.bmp)|*.jpg;*.jpeg;*.png;*.bmp"
-        dlg = wx.FileDialog(self, "选择测试图像", wildcard=wildcard, style=wx.FD_OPEN)
+        dlg = wx.FileDialog(self, "选择测试图像（可多选同一场景的多次采集）", wildcard=wildcard,
+                            style=wx.FD_OPEN | wx.FD_MULTIPLE)
         
         if dlg.ShowModal() == wx.ID_OK:
-            self.image_path = dlg.GetPath()
-            self.lbl_file.SetLabel(os.path.basename(self.image_path))
+            self.image_paths = dlg.GetPaths()
+            self.image_path = self.image_paths[0]
+            if len(self.image_paths) > 1:
+                self.lbl_file.SetLabel(f"{os.path.basename(self.image_path)} 等 {len(self.image_paths)} 幅图像")
+            else:
+                self.lbl_file.SetLabel(os.path.basename(self.image_path))
             self.display_image()
             
         dlg.Destroy()
@@ -333,7 +459,7 @@ class NoiseTestApp(wx.Frame):
     def display_image(self):
         """显示当前图像"""
         if self.image_path:
-            img = cv2.imread(self.image_path)
+            img = image_cache.imread(self.image_path)
             img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
             
             self.ax.clear()
@@ -374,7 +500,11 @@ class NoiseTestApp(wx.Frame):
             return
             
         try:
-            self.analyzer.analyze_noise(self.image_path)
+            if len(self.image_paths) > 1:
+                # 多幅图像共用同一ROI，并行解码后汇总为一份报告
+                self.analyzer.analyze_noise_set(self.image_paths)
+            else:
+                self.analyzer.analyze_noise(self.image_path)
             report = self.analyzer.generate_report()
             self.txt_result.SetValue(report)
             self.SetStatusText("分析完成")
@@ -395,7 +525,7 @@ class NoiseTestApp(wx.Frame):
         
         # 噪声分布图
         ax1 = fig.add_subplot(121)
-        img = cv2.imread(self.image_path)
+        img = image_cache.imread(self.image_path)
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         x, y, w, h = self.analyzer.roi
         patch = gray[y:y+h, x:x+w]
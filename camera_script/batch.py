@@ -0,0 +1,402 @@
+"""
+相机指标批量运行（无界面，不依赖wx/pyplot）
+
+用法:
+    python -m camera_script.batch <图像目录> -m sfr snr contrast -j 8 -o results.csv
+    python -m camera_script.batch <图像目录> -m snr saturation hdr --roi auto --fixture rig01
+
+图像在线程池中解码，单图指标在进程池中并行计算；noise/color_noise
+为多帧指标，将目录内全部图像作为同一组帧计算一次。
+结果按 (图像内容哈希, 指标, ROI参数, 代码版本) 缓存（--cache 指定数据库，--no-cache 关闭），
+重复运行时只计算新增/变化的图像。
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import camera_script.CheckNoise as CheckNoise
+import camera_script.ChromaticAberration as ChromaticAberration
+import camera_script.ColorNoise as ColorNoise
+import camera_script.ColorSaturation as ColorSaturation
+import camera_script.Contrast as Contrast
+import camera_script.PurpleDetection as PurpleDetection
+import camera_script.SFRChart as SFRChart
+import camera_script.SNR as SNR
+import camera_script.chart_layout as chart_layout
+import camera_script.hdr as hdr
+import camera_script.result_cache as result_cache
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+class AutoROI:
+    """自动检测图卡ROI的标记（可在进程间传递）；非图卡类指标使用整幅图像"""
+
+    def __init__(self, fixture_id=None, cache_path=chart_layout.LAYOUT_CACHE_PATH):
+        self.fixture_id = fixture_id
+        self.cache_path = cache_path
+
+
+def _crop(image, roi):
+    if roi is None or isinstance(roi, AutoROI):
+        return image
+    x, y, w, h = roi
+    return image[y:y + h, x:x + w]
+
+
+def _chart_roi(image, roi, kind):
+    """
+    色卡/灰阶卡类指标的ROI：roi为 AutoROI 时自动检测图卡并透视校正
+    （同一治具ID复用缓存的单应矩阵，校验失败时重新检测），否则按矩形裁剪
+    """
+    if isinstance(roi, AutoROI):
+        layout = chart_layout.locate_chart(image, kind, fixture_id=roi.fixture_id,
+                                           cache=chart_layout.LayoutCache(roi.cache_path))
+        return layout.rectify(image)
+    return _crop(image, roi)
+
+
+# ================= 单图指标：image为BGR图像，roi为(x, y, w, h)或None =================
+
+def metric_sfr(image, roi):
+    gray = cv2.cvtColor(_crop(image, roi), cv2.COLOR_BGR2GRAY)
+    result = SFRChart.analyze_chart(gray, max_workers=1)
+    valid = [e for e in result['edges'] if not e['error']]
+    fm = result['field_map']
+    center = (fm['grid'][0] // 2, fm['grid'][1] // 2)
+    return {
+        'edges': len(valid),
+        'mtf50_mean': np.mean([e['mtf50'] for e in valid]) if valid else np.nan,
+        'mtf50p_mean': np.mean([e['mtf50p'] for e in valid]) if valid else np.nan,
+        'mtf50_center': fm['mtf50'][center],
+    }
+
+
+def metric_snr(image, roi):
+    roi_image = _chart_roi(image, roi, 'color')
+    h, w = roi_image.shape[:2]
+    stats = SNR.patch_statistics(roi_image, w, h)
+    return {
+        'snr': SNR.SNR_calculation(SNR.separate_24color(roi_image, 0, 0, w, h)),
+        'patch_snr_db': np.mean(stats['snr_total_db']),
+    }
+
+
+def metric_hdr(image, roi):
+    gray = cv2.cvtColor(_chart_roi(image, roi, 'gray'), cv2.COLOR_BGR2GRAY)
+    result = hdr.analyze_gray_ramp(gray)
+    return {k: result[k] for k in ('dynamic_range', 'k1', 'k2', 'k3')}
+
+
+def metric_saturation(image, roi):
+    stats, _ = ColorSaturation.analyze_roi(_chart_roi(image, roi, 'color'))
+    mean_diff, std = ColorSaturation.saturation_error(stats)
+    return {'mean_diff': mean_diff, 'std': std}
+
+
+def metric_contrast(image, roi):
+    result = Contrast.analyze_contrast(_crop(image, roi), plot=False)
+    return {k: v for k, v in result.items() if np.isscalar(v) and not isinstance(v, str)}
+
+
+def metric_ca(image, roi):
+    stats, _, profile = ChromaticAberration.lateral_ca_offsets(_crop(image, roi))
+    # 最外侧有效视场段的径向色差
+    valid = np.nonzero(profile['count'])[0]
+    outer = valid[-1] if len(valid) else None
+    stats['red_outer'] = profile['red'][outer] if outer is not None else np.nan
+    stats['blue_outer'] = profile['blue'][outer] if outer is not None else np.nan
+    return stats
+
+
+def metric_purple(image, roi):
+    result = PurpleDetection.detect_purple_fringe(cv2.cvtColor(_crop(image, roi), cv2.COLOR_BGR2LAB), workers=1)
+    return {k: result[k] for k in ('fringe_area', 'fringe_ratio', 'edge_fringe_ratio', 'severity_mean',
+                                   'severity_max')}
+
+
+# ================= 多帧指标：paths为同一场景的多帧图像 =================
+
+def metric_noise(paths, roi):
+    result = CheckNoise.analyze_image_noise(paths, n_frame=len(paths), plot=False)
+    return {k: result[k] for k in ('random_noise_mean', 'random_noise_std')}
+
+
+def metric_color_noise(paths, roi):
+    result = ColorNoise.analyze_chromatic_noise(paths, n_frames=len(paths), plot=False)
+    row = {}
+    for ch, stats in result['noise_stats'].items():
+        row[f'{ch}_noise_mean'] = stats['noise_mean']
+        row[f'{ch}_snr_db'] = stats['SNR']
+    return row
+
+
+IMAGE_METRICS = {
+    'sfr': metric_sfr,
+    'snr': metric_snr,
+    'hdr': metric_hdr,
+    'saturation': metric_saturation,
+    'contrast': metric_contrast,
+    'ca': metric_ca,
+    'purple': metric_purple,
+}
+
+SEQUENCE_METRICS = {
+    'noise': metric_noise,
+    'color_noise': metric_color_noise,
+}
+
+
+def list_images(folder, recursive=False):
+    """目录内的图像文件（按路径排序）"""
+    if recursive:
+        paths = [os.path.join(root, name) for root, _, names in os.walk(folder) for name in names]
+    else:
+        paths = [os.path.join(folder, name) for name in os.listdir(folder)]
+    return sorted(p for p in paths if p.lower().endswith(IMAGE_EXTS) and os.path.isfile(p))
+
+
+def _scalar(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _run_metrics(table, names, target, roi):
+    """在子进程中依次运行指标，单个指标失败只记录错误；屏蔽各分析函数的调试输出"""
+    row = {}
+    for name in names:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = table[name](target, roi)
+            for key, value in result.items():
+                row[f'{name}.{key}'] = _scalar(value)
+        except Exception as e:
+            row[f'{name}.error'] = f'{type(e).__name__}: {e}'
+    return row
+
+
+def _roi_params(roi):
+    """ROI作为结果缓存参数的表示"""
+    if isinstance(roi, AutoROI):
+        return {'roi': 'auto', 'fixture': roi.fixture_id}
+    return {'roi': None if roi is None else list(roi)}
+
+
+def _metric_values(row, name):
+    """结果行中某一指标的字段（去掉 '<指标>.' 前缀）"""
+    prefix = f'{name}.'
+    return {key[len(prefix):]: value for key, value in row.items() if key.startswith(prefix)}
+
+
+def _load(path, names, cache, params):
+    """
+    读取图像文件：有结果缓存时按内容哈希查询各指标，只有存在未缓存的指标时才解码
+    :return: (内容哈希, {指标: 缓存结果}, 解码后的图像或None)
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest, cached = None, {}
+    if cache is not None:
+        digest = result_cache.content_hash(data)
+        for name in names:
+            value = cache.get(digest, name, params)
+            if value is not None:
+                cached[name] = value
+    if len(cached) == len(names):
+        return digest, cached, None
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"无法解码图像: {path}")
+    return digest, cached, image
+
+
+def _merge(names, computed, cached, cache, digest, params):
+    """按指标顺序合并缓存结果与本次计算结果，计算成功的结果写入缓存"""
+    row = {}
+    for name in names:
+        if name in cached:
+            values = cached[name]
+        else:
+            values = _metric_values(computed, name)
+            if cache is not None and 'error' not in values:
+                cache.put(digest, name, params, values)
+        row.update((f'{name}.{key}', value) for key, value in values.items())
+    return row
+
+
+def run_batch(paths, metrics, roi=None, workers=None, decode_workers=4, cache=None):
+    """
+    批量计算相机指标
+    :param paths: 图像路径列表
+    :param metrics: 指标名列表（IMAGE_METRICS / SEQUENCE_METRICS 中的键）
+    :param roi: 所有图像共用的ROI (x, y, w, h)，None表示整幅图像，AutoROI表示自动检测图卡
+    :param workers: 计算进程数，默认CPU核数
+    :param decode_workers: 解码线程数
+    :param cache: result_cache.ResultCache，内容与参数均未变化的图像直接使用缓存结果
+    :return: 结果行列表，每行为 {'image': 路径, '<指标>.<字段>': 值}
+    """
+    unknown = [m for m in metrics if m not in IMAGE_METRICS and m not in SEQUENCE_METRICS]
+    if unknown:
+        raise ValueError(f"未知指标: {', '.join(unknown)}")
+    image_metrics = [m for m in metrics if m in IMAGE_METRICS]
+    sequence_metrics = [m for m in metrics if m in SEQUENCE_METRICS]
+    params = _roi_params(roi)
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # 多帧指标各自作为一个任务提交，与单图指标并行；缓存键为各帧内容哈希的组合
+        sequence_digest = None
+        if cache is not None and sequence_metrics:
+            sequence_digest = result_cache.content_hash([result_cache.file_hash(p) for p in paths])
+        sequence_futures = []
+        for name in sequence_metrics:
+            cached = cache.get(sequence_digest, name, params) if cache is not None else None
+            if cached is not None:
+                sequence_futures.append((name, None, {name: cached}))
+            else:
+                sequence_futures.append((name, pool.submit(_run_metrics, SEQUENCE_METRICS, [name],
+                                                           list(paths), roi), {}))
+
+        if image_metrics:
+            prefetch = 2 * (workers or os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=decode_workers) as decoder:
+                pending = deque()
+                path_iter = iter(paths)
+
+                def submit_next():
+                    for path in path_iter:
+                        pending.append((path, decoder.submit(_load, path, image_metrics, cache, params)))
+                        return
+
+                for _ in range(prefetch):
+                    submit_next()
+                futures = []
+                while pending:
+                    path, loaded = pending.popleft()
+                    submit_next()
+                    try:
+                        digest, cached, image = loaded.result()
+                    except Exception as e:
+                        futures.append((path, None, None, None, f'{type(e).__name__}: {e}'))
+                        continue
+                    future = None
+                    if image is not None:
+                        missing = [m for m in image_metrics if m not in cached]
+                        future = pool.submit(_run_metrics, IMAGE_METRICS, missing, image, roi)
+                    futures.append((path, future, digest, cached, None))
+                    # 已提交任务过多时先等待最早的任务，限制待传输图像占用的内存
+                    while sum(1 for _, f, *_ in futures if f is not None and not f.done()) >= prefetch:
+                        next(f for _, f, *_ in futures if f is not None and not f.done()).result()
+
+            for path, future, digest, cached, error in futures:
+                row = {'image': path}
+                if error:
+                    row['error'] = error
+                else:
+                    computed = future.result() if future is not None else {}
+                    row.update(_merge(image_metrics, computed, cached, cache, digest, params))
+                rows.append(row)
+
+        for name, future, cached in sequence_futures:
+            row = {'image': f'<{len(paths)} frames>'}
+            computed = future.result() if future is not None else {}
+            row.update(_merge([name], computed, cached, cache, sequence_digest, params))
+            rows.append(row)
+    return rows
+
+
+def _columns(rows):
+    columns = []
+    for row in rows:
+        for key in row:
+            if key not in columns:
+                columns.append(key)
+    return columns
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return f'{value:.4g}'
+    return '' if value is None else str(value)
+
+
+def format_table(rows):
+    """结果表格（文本，按列对齐）"""
+    columns = _columns(rows)
+    cells = [columns] + [[_format_value(row.get(c)) for c in columns] for row in rows]
+    widths = [max(len(line[i]) for line in cells) for i in range(len(columns))]
+    return '\n'.join('  '.join(v.ljust(w) for v, w in zip(line, widths)).rstrip() for line in cells)
+
+
+def write_results(rows, path):
+    """按扩展名保存结果：.json 为JSON列表，其余为CSV"""
+    if path.lower().endswith('.json'):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        return
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=_columns(rows))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _parse_roi(text):
+    if text == 'auto':
+        return 'auto'
+    values = [int(v) for v in text.split(',')]
+    if len(values) != 4:
+        raise argparse.ArgumentTypeError("ROI格式应为 x,y,w,h")
+    return tuple(values)
+
+
+def main(argv=None):
+    """命令行入口"""
+    all_metrics = list(IMAGE_METRICS) + list(SEQUENCE_METRICS)
+    parser = argparse.ArgumentParser(description='相机指标批量运行')
+    parser.add_argument('folder', help='图像目录')
+    parser.add_argument('-m', '--metrics', nargs='+', default=list(IMAGE_METRICS), choices=all_metrics,
+                        help='要计算的指标（默认全部单图指标）')
+    parser.add_argument('--roi', type=_parse_roi,
+                        help='所有图像共用的ROI: x,y,w,h（默认整幅图像）；auto 表示自动检测色卡/灰阶卡')
+    parser.add_argument('--fixture', help='治具/相机ID，配合 --roi auto 复用缓存的图卡位置')
+    parser.add_argument('-j', '--workers', type=int, help='计算进程数（默认CPU核数）')
+    parser.add_argument('--decode-workers', type=int, default=4, help='解码线程数')
+    parser.add_argument('-r', '--recursive', action='store_true', help='递归搜索子目录')
+    parser.add_argument('-o', '--output', help='结果文件（.csv 或 .json）')
+    parser.add_argument('--cache', default=result_cache.DEFAULT_CACHE_PATH,
+                        help='结果缓存数据库（内容、参数与代码均未变化的图像不重新计算）')
+    parser.add_argument('--no-cache', action='store_true', help='不使用结果缓存')
+    args = parser.parse_args(argv)
+
+    paths = list_images(args.folder, args.recursive)
+    if not paths:
+        print(f"目录中未找到图像: {args.folder}", file=sys.stderr)
+        return 1
+
+    roi = AutoROI(args.fixture) if args.roi == 'auto' else args.roi
+    cache = None if args.no_cache else result_cache.ResultCache(args.cache)
+    try:
+        rows = run_batch(paths, args.metrics, roi=roi, workers=args.workers,
+                         decode_workers=args.decode_workers, cache=cache)
+    finally:
+        if cache is not None:
+            cache.close()
+    print(format_table(rows))
+    if args.output:
+        write_results(rows, args.output)
+        print(f"结果已保存: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
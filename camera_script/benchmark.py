@@ -0,0 +1,371 @@
+"""
+camera_script 分析函数的性能基准（合成图卡，不依赖样张与界面）
+
+用法:
+    python -m camera_script.benchmark                          # 默认 1920x1080，全部用例
+    python -m camera_script.benchmark -s 4000x3000 -c sfr snr noise -r 5
+    python -m camera_script.benchmark --save-baseline          # 保存当前结果为基线
+    python -m camera_script.benchmark --baseline               # 与基线比较，退步超过容差时返回1
+
+各用例按指定分辨率生成合成输入（斜边、24色卡、灰阶卡、噪声帧序列等，固定随机种子），
+计时取多次运行的中位数，吞吐量为每秒处理的百万像素（多帧按帧数累计）。
+峰值内存由 tracemalloc 统计（Python/NumPy分配，含OpenCV返回的数组，不含OpenCV内部临时缓冲）。
+同一分析的不同实现以变体并列计时：'.legacy' 为保留的原有列表式接口，
+'.serial' / '.untiled' / '.tiled' 为串行、整幅与分块计算路径。
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+import camera_script.CheckNoise as CheckNoise
+import camera_script.ChromaticAberration as ChromaticAberration
+import camera_script.ColorNoise as ColorNoise
+import camera_script.ColorSaturation as ColorSaturation
+import camera_script.Contrast as Contrast
+import camera_script.PurpleDetection as PurpleDetection
+import camera_script.SFR as SFR
+import camera_script.SFRChart as SFRChart
+import camera_script.SNR as SNR
+import camera_script.chart_layout as chart_layout
+import camera_script.hdr as hdr
+import camera_script.nps as nps
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+DEFAULT_SIZE = (1920, 1080)
+DEFAULT_FRAMES = 8
+# 耗时或峰值内存超过基线的比例上限
+DEFAULT_TOLERANCE = 0.25
+SEED = 12233
+
+# 24色卡各色块的近似sRGB值（BGR顺序），行优先
+COLOR_CHART_BGR = [
+    (68, 82, 115), (130, 150, 194), (157, 122, 98), (67, 108, 87), (177, 128, 133), (170, 189, 103),
+    (44, 126, 214), (166, 91, 80), (99, 90, 193), (108, 60, 94), (64, 188, 157), (46, 163, 224),
+    (150, 61, 56), (73, 148, 70), (60, 54, 175), (31, 199, 231), (149, 86, 187), (161, 133, 8),
+    (242, 243, 243), (200, 200, 200), (160, 160, 160), (121, 122, 122), (85, 85, 85), (52, 52, 52),
+]
+
+
+# ================= 合成输入 =================
+
+def _add_noise(image, sigma, rng):
+    noisy = image.astype(np.float32) + rng.normal(0, sigma, image.shape).astype(np.float32)
+    return np.clip(noisy, 0, 255).astype(np.uint8)
+
+
+def slanted_edge(w, h, angle=5.0, blur=1.0, noise=2.0, rng=None):
+    """过图像中心、偏离竖直方向angle度的斜边（左暗右亮），高斯模糊模拟镜头MTF"""
+    rng = rng or np.random.default_rng(SEED)
+    theta = np.radians(angle)
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    distance = (xx - w / 2) * np.cos(theta) - (yy - h / 2) * np.sin(theta)
+    image = 40 + 170 / (1 + np.exp(-distance / (0.6 * blur)))
+    return _add_noise(image, noise, rng)
+
+
+def sfr_chart(w, h, cell=None, angle=5.0, blur=1.0, noise=2.0, rng=None):
+    """浅色背景上按网格排列、旋转angle度的暗色方块（ISO 12233类斜边图卡）"""
+    rng = rng or np.random.default_rng(SEED)
+    cell = cell or max(120, min(w, h) // 6)
+    image = np.full((h, w), 210, dtype=np.uint8)
+    side = cell * 0.55
+    for cy in np.arange(cell / 2, h - cell / 2 + 1, cell):
+        for cx in np.arange(cell / 2, w - cell / 2 + 1, cell):
+            box = cv2.boxPoints(((float(cx), float(cy)), (side, side), angle))
+            cv2.fillPoly(image, [np.round(box).astype(np.int32)], 40)
+    image = cv2.GaussianBlur(image, (0, 0), blur)
+    return _add_noise(image, noise, rng)
+
+
+def color_chart(w, h, noise=3.0, rng=None):
+    """填满图像的6x4色卡（色块之间留暗色间隔），即色卡ROI"""
+    rng = rng or np.random.default_rng(SEED)
+    image = np.full((h, w, 3), 30, dtype=np.uint8)
+    cw, ch = w / 6, h / 4
+    for k, bgr in enumerate(COLOR_CHART_BGR):
+        row, col = divmod(k, 6)
+        image[int((row + 0.08) * ch):int((row + 0.92) * ch), int((col + 0.08) * cw):int((col + 0.92) * cw)] = bgr
+    return _add_noise(image, noise, rng)
+
+
+def color_chart_scene(w, h, noise=3.0, rng=None):
+    """场景中轻微透视变换的色卡（方形色块，用于色卡自动检测）"""
+    rng = rng or np.random.default_rng(SEED)
+    pitch = min(w // 12, h // 8)
+    cw, ch = 6 * pitch, 4 * pitch
+    chart = color_chart(cw, ch, noise=0)
+    x0, y0 = (w - cw) / 2, (h - ch) / 2
+    skew = 0.03 * pitch
+    src = np.float32([[0, 0], [cw, 0], [cw, ch], [0, ch]])
+    dst = np.float32([[x0, y0 + skew], [x0 + cw, y0], [x0 + cw - skew, y0 + ch], [x0 + skew, y0 + ch + skew]])
+    scene = cv2.warpPerspective(chart, cv2.getPerspectiveTransform(src, dst), (w, h),
+                                borderMode=cv2.BORDER_CONSTANT, borderValue=(90, 90, 90))
+    return _add_noise(scene, noise, rng)
+
+
+def gray_ramp(w, h, num=20, noise=2.0, rng=None):
+    """自左向右由亮到暗的num阶灰阶卡（各阶亮度按对数间隔），即灰阶卡ROI"""
+    rng = rng or np.random.default_rng(SEED)
+    levels = np.geomspace(245, 8, num)
+    columns = levels[np.minimum((np.arange(w) * num) // w, num - 1)]
+    image = np.broadcast_to(columns, (h, w))
+    return _add_noise(image, noise, rng)
+
+
+def noise_stack(frames, w, h, color=False, noise=3.0, rng=None):
+    """同一平场的多帧图像：固定图案噪声 + 逐帧独立的随机噪声"""
+    rng = rng or np.random.default_rng(SEED)
+    shape = (h, w, 3) if color else (h, w)
+    base = 128 + rng.normal(0, 1.5, shape).astype(np.float32)
+    return np.stack([_add_noise(base, noise, rng) for _ in range(frames)])
+
+
+def exposure_stack(w, h, exposures=(1, 4, 16), num=20, rng=None):
+    """不同曝光的灰阶卡：线性响应乘以曝光倍数后在255处饱和"""
+    rng = rng or np.random.default_rng(SEED)
+    scene = np.geomspace(1, 1 / 1000, num)[np.minimum((np.arange(w) * num) // w, num - 1)]
+    stack = []
+    for t in exposures:
+        signal = np.broadcast_to(np.minimum(255, 8 + 240 * scene * t), (h, w)).astype(np.float32)
+        stack.append(_add_noise(signal, 1.0, rng))
+    return np.stack(stack)
+
+
+def lateral_ca_image(w, h, scale_red=1.002, scale_blue=0.998, rng=None):
+    """带径向色差的棋盘格：红/蓝通道相对绿通道绕中心缩放"""
+    rng = rng or np.random.default_rng(SEED)
+    square = max(16, min(w, h) // 24)
+    yy, xx = np.mgrid[0:h, 0:w]
+    board = np.where(((yy // square) + (xx // square)) % 2, 220, 30).astype(np.uint8)
+    board = cv2.GaussianBlur(board, (0, 0), 1.0)
+    center = (w / 2, h / 2)
+    channels = []
+    for scale in (scale_blue, 1.0, scale_red):
+        matrix = cv2.getRotationMatrix2D(center, 0, scale)
+        channels.append(cv2.warpAffine(board, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT))
+    return _add_noise(cv2.merge(channels), 2.0, rng)
+
+
+# ================= 用例 =================
+
+# setup(w, h, frames) -> (输入, 百万像素数)；run(输入) 执行被测函数
+Case = namedtuple('Case', ['setup', 'run'])
+
+
+def _mp(w, h, frames=1):
+    return w * h * frames / 1e6
+
+
+def _sfr_roi(w, h, frames):
+    # 单条斜边ROI的尺寸与分辨率无关，固定取典型大小
+    return slanted_edge(128, 192), _mp(128, 192)
+
+
+def _legacy_snr(roi):
+    h, w = roi.shape[:2]
+    return SNR.SNR_calculation(SNR.separate_24color(roi, 0, 0, w, h))
+
+
+def _legacy_gray_ramp(gray):
+    h, w = gray.shape[:2]
+    hdr_range, gray_list = hdr.HDR_calculation(hdr.separate_gray(gray, 0, 0, w, h, 20))
+    return hdr_range, hdr.GrayList_Detection(list(gray_list))
+
+
+CASES = {
+    'sfr': Case(_sfr_roi, lambda roi: SFR.sfr_calculation(roi, pixel_size=0.01)),
+    'sfr_chart': Case(lambda w, h, f: (sfr_chart(w, h), _mp(w, h)),
+                      lambda gray: SFRChart.analyze_chart(gray)),
+    'sfr_chart.serial': Case(lambda w, h, f: (sfr_chart(w, h), _mp(w, h)),
+                             lambda gray: SFRChart.analyze_chart(gray, max_workers=1)),
+    'snr': Case(lambda w, h, f: (color_chart(w, h), _mp(w, h)),
+                lambda roi: SNR.patch_statistics(roi)),
+    'snr.legacy': Case(lambda w, h, f: (color_chart(w, h), _mp(w, h)), _legacy_snr),
+    'saturation': Case(lambda w, h, f: (color_chart(w, h), _mp(w, h)), ColorSaturation.analyze_roi),
+    'color_chart_detect': Case(lambda w, h, f: (color_chart_scene(w, h), _mp(w, h)),
+                               chart_layout.detect_color_chart),
+    'gray_ramp': Case(lambda w, h, f: (gray_ramp(w, h), _mp(w, h)), hdr.analyze_gray_ramp),
+    'gray_ramp.legacy': Case(lambda w, h, f: (gray_ramp(w, h), _mp(w, h)), _legacy_gray_ramp),
+    'gray_ramp_detect': Case(lambda w, h, f: (cv2.copyMakeBorder(gray_ramp(w * 3 // 4, h // 3), h // 3, h - h // 3 * 2,
+                                                                 w // 8, w - w * 3 // 4 - w // 8,
+                                                                 cv2.BORDER_CONSTANT, value=128), _mp(w, h)),
+                             chart_layout.detect_gray_ramp),
+    'oecf': Case(lambda w, h, f: (exposure_stack(w, h // 4), _mp(w, h // 4, 3)),
+                 lambda rois: hdr.analyze_exposure_stack(rois, [1, 4, 16])),
+    'noise': Case(lambda w, h, f: (noise_stack(f, w, h), _mp(w, h, f)),
+                  lambda frames: CheckNoise.analyze_image_noise(frames, n_frame=len(frames), plot=False)),
+    'noise.tiled': Case(lambda w, h, f: (list(noise_stack(f, w, h)), _mp(w, h, f)),
+                        lambda frames: CheckNoise.analyze_image_noise(frames, memory_budget=64 * 2 ** 20,
+                                                                      plot=False)),
+    'color_noise': Case(lambda w, h, f: (noise_stack(f, w, h, color=True), _mp(512, 512, f)),
+                        lambda frames: ColorNoise.analyze_chromatic_noise(frames, n_frames=len(frames), plot=False)),
+    'nps': Case(lambda w, h, f: (noise_stack(f, 512, 512).astype(np.float32), _mp(512, 512, f)),
+                nps.noise_power_spectrum),
+    'contrast': Case(lambda w, h, f: (cv2.cvtColor(lateral_ca_image(w, h), cv2.COLOR_BGR2GRAY), _mp(w, h)),
+                     lambda gray: Contrast.local_contrast_map(gray, 32, scale=1 / 255)),
+    'contrast.untiled': Case(lambda w, h, f: (cv2.cvtColor(lateral_ca_image(w, h), cv2.COLOR_BGR2GRAY), _mp(w, h)),
+                             lambda gray: Contrast.local_contrast_map(gray, 32, scale=1 / 255,
+                                                                      tile_size=max(gray.shape), workers=1)),
+    'ca': Case(lambda w, h, f: (lateral_ca_image(w, h), _mp(w, h)),
+               lambda image: ChromaticAberration.lateral_ca_offsets(image)),
+    'purple': Case(lambda w, h, f: (cv2.cvtColor(lateral_ca_image(w, h), cv2.COLOR_BGR2LAB), _mp(w, h)),
+                   PurpleDetection.detect_purple_fringe),
+    'purple.untiled': Case(lambda w, h, f: (cv2.cvtColor(lateral_ca_image(w, h), cv2.COLOR_BGR2LAB), _mp(w, h)),
+                           lambda lab: PurpleDetection.detect_purple_fringe(lab, tile_size=max(lab.shape[:2]),
+                                                                            workers=1)),
+}
+
+
+# ================= 计时与比较 =================
+
+def measure(case, size=DEFAULT_SIZE, frames=DEFAULT_FRAMES, repeat=3):
+    """
+    运行单个用例
+    :return: {'megapixels', 'seconds'（中位数）, 'best', 'mp_per_s', 'peak_mb'}
+    """
+    data, megapixels = case.setup(size[0], size[1], frames)
+    times = []
+    # 屏蔽分析函数的调试输出；首次运行包含缓存/进程池的预热
+    with contextlib.redirect_stdout(io.StringIO()):
+        case.run(data)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            case.run(data)
+            times.append(time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            case.run(data)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    seconds = float(np.median(times))
+    return {
+        'megapixels': megapixels,
+        'seconds': seconds,
+        'best': min(times),
+        'mp_per_s': megapixels / seconds if seconds > 0 else np.inf,
+        'peak_mb': peak / 2 ** 20,
+    }
+
+
+def run_benchmarks(names=None, size=DEFAULT_SIZE, frames=DEFAULT_FRAMES, repeat=3):
+    """
+    运行基准用例（用例失败只记录错误）
+    :param names: 用例名列表，None为全部
+    :return: {用例名: 测量结果或 {'error': ...}}
+    """
+    results = {}
+    for name in names or CASES:
+        try:
+            results[name] = measure(CASES[name], size, frames, repeat)
+        except Exception as e:
+            results[name] = {'error': f'{type(e).__name__}: {e}'}
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    与基线比较
+    :return: {用例名: {'time_ratio', 'memory_ratio', 'regressed'}}，基线中没有的用例不比较
+    """
+    report = {}
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or 'error' in result or 'error' in base:
+            continue
+        time_ratio = result['seconds'] / base['seconds']
+        memory_ratio = result['peak_mb'] / base['peak_mb'] if base['peak_mb'] > 0 else 1.0
+        report[name] = {
+            'time_ratio': time_ratio,
+            'memory_ratio': memory_ratio,
+            'regressed': time_ratio > 1 + tolerance or memory_ratio > 1 + tolerance,
+        }
+    return report
+
+
+def load_baseline(path=DEFAULT_BASELINE_PATH):
+    """读取基线：{'size', 'frames', 'results'}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(results, size, frames, path=DEFAULT_BASELINE_PATH):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'size': list(size), 'frames': frames, 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+def format_report(results, comparison=None):
+    """结果表格（文本）"""
+    comparison = comparison or {}
+    lines = [f"{'case':<20}{'MP':>8}{'ms':>10}{'MP/s':>10}{'peak MB':>10}{'vs base':>16}"]
+    for name, result in results.items():
+        if 'error' in result:
+            lines.append(f"{name:<20}{result['error']}")
+            continue
+        line = (f"{name:<20}{result['megapixels']:>8.2f}{result['seconds'] * 1000:>10.1f}"
+                f"{result['mp_per_s']:>10.1f}{result['peak_mb']:>10.1f}")
+        if name in comparison:
+            c = comparison[name]
+            line += f"{c['time_ratio']:>8.2f}x{c['memory_ratio']:>6.2f}x"
+            if c['regressed']:
+                line += '  REGRESSED'
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def _parse_size(text):
+    try:
+        w, h = (int(v) for v in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError("分辨率格式应为 宽x高，如 1920x1080") from None
+    return w, h
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='camera_script 性能基准')
+    parser.add_argument('-c', '--cases', nargs='+', choices=list(CASES), help='要运行的用例（默认全部）')
+    parser.add_argument('-s', '--size', type=_parse_size, default=DEFAULT_SIZE, help='合成图像分辨率，宽x高')
+    parser.add_argument('-f', '--frames', type=int, default=DEFAULT_FRAMES, help='多帧用例的帧数')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='每个用例的计时次数')
+    parser.add_argument('--baseline', nargs='?', const=DEFAULT_BASELINE_PATH, help='与基线文件比较')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE_PATH, help='保存结果为基线')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='耗时/峰值内存超过基线的容许比例')
+    parser.add_argument('-o', '--output', help='结果保存为JSON')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.cases, args.size, args.frames, args.repeat)
+    comparison = None
+    if args.baseline:
+        baseline = load_baseline(args.baseline)
+        if tuple(baseline['size']) != tuple(args.size) or baseline['frames'] != args.frames:
+            print(f"基线的分辨率/帧数 ({baseline['size']}, {baseline['frames']}) 与本次运行不同，比较结果仅供参考",
+                  file=sys.stderr)
+        comparison = compare(results, baseline['results'], args.tolerance)
+    print(f"分辨率 {args.size[0]}x{args.size[1]}，多帧用例 {args.frames} 帧，每个用例计时 {args.repeat} 次")
+    print(format_report(results, comparison))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'size': list(args.size), 'frames': args.frames, 'results': results,
+                       'comparison': comparison}, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        save_baseline(results, args.size, args.frames, args.save_baseline)
+        print(f"基线已保存: {args.save_baseline}")
+    if comparison and any(c['regressed'] for c in comparison.values()):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,444 @@
+import contextlib
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import cv2
+import numpy as np
+
+# 24色卡色块中心位置（以ROI宽/高为单位的分数坐标），6列 x 4行
+COLOR_CHART_COLS = [1, 3, 5, 7, 9, 11]
+COLOR_CHART_ROWS = [-1, -3, -5, -7]
+
+
+def color_patch_slices(w, h):
+    """
+    24色卡各色块在ROI中的切片（行切片, 列切片），按行优先顺序排列，
+    与 SNR.separate_24color / ColorSaturation.RGB2HSV 的取块位置一致
+    """
+    delta = 1 / 24
+    slices = []
+    for j in COLOR_CHART_ROWS:
+        for i in COLOR_CHART_COLS:
+            point_x = w * (i / 12)
+            point_y = -h * (j / 8)
+            slices.append((slice(int(point_y - delta * h), int(point_y + delta * h)),
+                           slice(int(point_x - delta * w), int(point_x + delta * w))))
+    return slices
+
+
+def gray_patch_slices(w, h, num):
+    """
+    灰阶卡各台阶在ROI中的切片（行切片, 列切片），自左向右排列，
+    与 hdr.separate_gray 的取块位置一致（行切片换算为非负索引）
+    """
+    deltax = 1 / (num * 3)
+    deltay = 1 / 3
+    point_y = -h * (1 / 2)
+    rows = slice(*slice(int(point_y - deltay * h), int(point_y + deltay * h)).indices(h)[:2])
+    slices = []
+    for i in [i*2+1 for i in range(num)]:
+        point_x = w * (i / (num * 2))
+        slices.append((rows, slice(int(point_x - deltax * w), int(point_x + deltax * w))))
+    return slices
+
+
+def common_patch_shape(slices):
+    """所有色块共同的（最小）尺寸，取整误差会导致各块相差1像素"""
+    ph = min(s[0].stop - s[0].start for s in slices)
+    pw = min(s[1].stop - s[1].start for s in slices)
+    return ph, pw
+
+
+def stack_patches(image, slices, shape=None, color=True):
+    """
+    将所有色块裁剪为相同尺寸并堆叠
+    :param image: (..., H, W, C) 彩色图像（color=True）或 (..., H, W) 灰度图像，可带前置帧维度
+    :param shape: 色块尺寸 (ph, pw)，默认取所有色块的最小尺寸
+    :return: (..., N, ph, pw[, C]) 色块张量
+    """
+    ph, pw = shape if shape is not None else common_patch_shape(slices)
+    if color:
+        lead, tail = image.shape[:-3], image.shape[-1:]
+    else:
+        lead, tail = image.shape[:-2], ()
+    out = np.empty(lead + (len(slices), ph, pw) + tail, dtype=image.dtype)
+    for k, (rs, cs) in enumerate(slices):
+        rows = slice(rs.start, rs.start + ph)
+        cols = slice(cs.start, cs.start + pw)
+        if color:
+            out[..., k, :, :, :] = image[..., rows, cols, :]
+        else:
+            out[..., k, :, :] = image[..., rows, cols]
+    return out
+
+
+# ================= 色卡/灰阶卡自动检测 =================
+
+# 缓存的布局文件（按治具/相机ID保存单应矩阵）
+LAYOUT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chart_layouts.json')
+
+
+class ChartLayout:
+    """
+    图卡布局：规范化图卡平面 -> 图像的单应矩阵
+    规范化平面中，24色卡为 6x4 个边长 pitch 的方格；灰阶卡为 num 个宽 pitch 的台阶（最亮在左）
+    """
+
+    def __init__(self, kind, homography, size):
+        self.kind = kind
+        self.homography = np.asarray(homography, dtype=np.float64)
+        self.size = (int(size[0]), int(size[1]))
+
+    def rectify(self, image):
+        """将图卡区域校正为规范化ROI图像（可直接用于 color_patch_slices / hdr.separate_gray）"""
+        return cv2.warpPerspective(image, self.homography, self.size,
+                                   flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP)
+
+    def corners(self):
+        """图卡四角在图像中的坐标（左上、右上、右下、左下）"""
+        w, h = self.size
+        pts = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+        return cv2.perspectiveTransform(pts, self.homography).reshape(-1, 2)
+
+    @property
+    def roi(self):
+        """图卡在图像中的外接矩形 (x, y, w, h)"""
+        x, y, w, h = cv2.boundingRect(np.round(self.corners()).astype(np.int32))
+        return x, y, w, h
+
+    def to_dict(self):
+        return {'kind': self.kind, 'homography': self.homography.tolist(), 'size': list(self.size)}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['kind'], d['homography'], d['size'])
+
+
+def _flip_homography(homography, size, flip_y):
+    """规范化平面翻转（水平翻转，flip_y时同时垂直翻转即旋转180°）"""
+    w, h = size
+    flip = np.array([[-1, 0, w], [0, -1 if flip_y else 1, h if flip_y else 0], [0, 0, 1]], dtype=np.float64)
+    return homography @ flip
+
+
+def _find_patch_quads(gray):
+    """查找近似正方形的色块轮廓中心及边长，去除内外轮廓重复"""
+    height, width = gray.shape
+    edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 20, 60)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    quads = []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if not height * width * 0.0003 < area < height * width * 0.05:
+            continue
+        poly = cv2.approxPolyDP(contour, 0.05 * cv2.arcLength(contour, True), True)
+        if len(poly) != 4 or not cv2.isContourConvex(poly):
+            continue
+        (cx, cy), (w, h), _ = cv2.minAreaRect(poly)
+        if 0.75 < w / h < 1.33:
+            quads.append((cx, cy, (w + h) / 2))
+    if not quads:
+        return np.empty((0, 2)), 0.0
+    quads = np.array(quads)
+    # 同一色块的内外两条轮廓中心重合
+    kept = []
+    for q in quads[np.argsort(-quads[:, 2])]:
+        if all(np.hypot(q[0] - k[0], q[1] - k[1]) > q[2] / 3 for k in kept):
+            kept.append(q)
+    kept = np.array(kept)
+    # 只保留尺寸与中位数接近的色块
+    size = np.median(kept[:, 2])
+    kept = kept[np.abs(kept[:, 2] - size) < 0.3 * size]
+    return kept[:, :2], float(np.median(kept[:, 2]))
+
+
+def detect_color_chart(image):
+    """
+    自动检测24色卡（轮廓 + 单应）
+    查找正方形色块，按色块间距拟合6x4网格并估计单应矩阵；以灰阶行饱和度最低确定方向
+    :param image: BGR图像
+    :return: ChartLayout，未找到时抛出 ValueError
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    centers, _ = _find_patch_quads(gray)
+    if len(centers) < 8:
+        raise ValueError(f"未检测到24色卡（仅找到{len(centers)}个色块）")
+
+    # 网格方向与间距：取最近邻向量的主方向（模90°）与长度
+    diff = centers[:, None, :] - centers[None, :, :]
+    dist = np.hypot(diff[..., 0], diff[..., 1])
+    np.fill_diagonal(dist, np.inf)
+    nn = dist.argmin(axis=1)
+    vec = centers[nn] - centers
+    pitch = float(np.median(dist[np.arange(len(centers)), nn]))
+    theta = np.median(np.mod(np.arctan2(vec[:, 1], vec[:, 0]) + np.pi / 4, np.pi / 2) - np.pi / 4)
+    rot = np.array([[np.cos(theta), np.sin(theta)], [-np.sin(theta), np.cos(theta)]])
+    local = centers @ rot.T
+    col = np.round((local[:, 0] - local[:, 0].min()) / pitch).astype(int)
+    row = np.round((local[:, 1] - local[:, 1].min()) / pitch).astype(int)
+    if (col.max() + 1, row.max() + 1) == (4, 6):
+        # 竖放色卡：旋转90°到横向
+        col, row = row, 3 - col
+    if (col.max() + 1, row.max() + 1) != (6, 4):
+        raise ValueError(f"色块排列不是6x4网格（{col.max() + 1}x{row.max() + 1}）")
+
+    p = int(round(pitch))
+    size = (6 * p, 4 * p)
+    src = np.column_stack([(col + 0.5) * p, (row + 0.5) * p]).astype(np.float32)
+    homography, _ = cv2.findHomography(src, centers.astype(np.float32), cv2.RANSAC, 0.1 * pitch)
+    if homography is None:
+        raise ValueError("24色卡单应矩阵估计失败")
+
+    layout = ChartLayout('color', homography, size)
+    means = _color_patch_means(layout.rectify(image))
+    saturation = _saturation(means)
+    if saturation[0].mean() < saturation[3].mean():
+        # 灰阶行应在最下方，否则色卡旋转了180°
+        layout.homography = _flip_homography(layout.homography, size, flip_y=True)
+    return layout
+
+
+def _color_patch_means(roi):
+    """规范化色卡ROI中各色块中心区域的均值，(4, 6, C)"""
+    h, w = roi.shape[:2]
+    patches = stack_patches(roi.astype(np.float32), color_patch_slices(w, h))
+    return patches.mean(axis=(1, 2)).reshape(4, 6, -1)
+
+
+def _saturation(means):
+    return means.max(axis=-1) - means.min(axis=-1)
+
+
+def validate_color_chart(roi, max_patch_std=20.0):
+    """校验规范化色卡ROI：色块内部均匀、灰阶行亮度递减且饱和度低于彩色行"""
+    h, w = roi.shape[:2]
+    patches = stack_patches(roi.astype(np.float32), color_patch_slices(w, h))
+    if np.median(patches.std(axis=(1, 2))) > max_patch_std:
+        return False
+    means = patches.mean(axis=(1, 2)).reshape(4, 6, -1)
+    luminance = means.mean(axis=-1)
+    saturation = _saturation(means)
+    return bool(np.all(np.diff(luminance[3, :5]) < 0) and saturation[3].mean() < saturation[:3].mean())
+
+
+def _vertical_boundaries(gray, threshold=6):
+    """灰阶台阶之间的竖直边界：细长的水平梯度连通域，返回 (x中心, y0, y1)"""
+    height = gray.shape[0]
+    blur = cv2.GaussianBlur(gray, (3, 3), 0)
+    gx = np.abs(cv2.Sobel(blur, cv2.CV_32F, 1, 0, ksize=3))
+    gy = np.abs(cv2.Sobel(blur, cv2.CV_32F, 0, 1, ksize=3))
+    mask = ((gx > threshold) & (gx > 2 * gy)).astype(np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (1, 7)))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+    stats = stats[1:]
+    keep = (stats[:, 3] > height * 0.05) & (stats[:, 3] > 4 * stats[:, 2])
+    stats = stats[keep]
+    return np.column_stack([stats[:, 0] + stats[:, 2] / 2, stats[:, 1], stats[:, 1] + stats[:, 3]])
+
+
+def _boundary_groups(bounds):
+    """按高度/纵向位置相近分组，组内边界按x排序"""
+    groups = []
+    for b in bounds[np.argsort(bounds[:, 0])]:
+        for g in groups:
+            ref = np.median(np.array(g), axis=0)
+            h = ref[2] - ref[1]
+            if abs(b[1] - ref[1]) < 0.15 * h and abs(b[2] - ref[2]) < 0.15 * h:
+                g.append(b)
+                break
+        else:
+            groups.append([b])
+    return [np.array(g) for g in groups if len(g) >= 4]
+
+
+def _monotonic_score(values):
+    """单调程度：1 - 逆向变化量 / 总变化量（1表示单调；暗端噪声造成的小幅反转影响很小）"""
+    d = np.diff(values)
+    total = np.abs(d).sum()
+    if total == 0:
+        return 0.0
+    return 1 - min(d[d > 0].sum(), -d[d < 0].sum()) / total
+
+
+def detect_gray_ramp(image, num=20):
+    """
+    自动检测横向灰阶卡（num阶）
+    台阶边界为等间距、等高的竖直边缘，由边界拟合出灰阶条四角并估计单应矩阵；
+    边界缺失（暗端对比度低）时按间距外推，以台阶亮度单调性选择灰阶条的起止位置
+    :param image: BGR或灰度图像
+    :return: ChartLayout（最亮台阶在左），未找到时抛出 ValueError
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    width = gray.shape[1]
+    best = None
+    for group in _boundary_groups(_vertical_boundaries(gray)):
+        x = group[:, 0]
+        d = np.diff(x)
+        d = d[d > 0]
+        if len(d) == 0:
+            continue
+        step = float(np.median(d[d <= 1.3 * d.min()]))
+        # 选取与最多边界间距一致的锚点
+        phase = [(np.abs((x - x0) / step - np.round((x - x0) / step)) < 0.2) for x0 in x]
+        members = phase[int(np.argmax([p.sum() for p in phase]))]
+        if members.sum() < 4:
+            continue
+        gx = group[members]
+        k = np.round((gx[:, 0] - gx[0, 0]) / step)
+        span = int(k.max())
+        if span > num:
+            continue
+        step, origin = np.polyfit(k, gx[:, 0], 1)
+        top = np.polyfit(gx[:, 0], gx[:, 1], 1)
+        bottom = np.polyfit(gx[:, 0], gx[:, 2], 1)
+        p = int(round(step))
+        size = (num * p, int(round(np.median(gx[:, 2] - gx[:, 1]))))
+        for shift in range(num - span + 1):
+            left = origin - shift * step
+            right = left + num * step
+            if left < 0 or right > width:
+                continue
+            corners = np.float32([[left, np.polyval(top, left)], [right, np.polyval(top, right)],
+                                  [right, np.polyval(bottom, right)], [left, np.polyval(bottom, left)]])
+            canonical = np.float32([[0, 0], [size[0], 0], [size[0], size[1]], [0, size[1]]])
+            layout = ChartLayout('gray', cv2.getPerspectiveTransform(canonical, corners), size)
+            levels = gray_step_means(layout.rectify(gray), num)
+            score = (_monotonic_score(levels), span, levels.max() - levels.min())
+            if best is None or score > best[0]:
+                best = (score, layout, levels)
+    if best is None:
+        raise ValueError("未检测到灰阶卡")
+    _, layout, levels = best
+    if levels[0] < levels[-1]:
+        layout.homography = _flip_homography(layout.homography, layout.size, flip_y=False)
+    if not validate_gray_ramp(layout.rectify(gray), num):
+        raise ValueError("未检测到灰阶卡（台阶亮度不单调或范围过小）")
+    return layout
+
+
+def gray_step_means(roi, num):
+    """规范化灰阶ROI中各台阶中心区域（与 hdr.separate_gray 取块一致）的均值"""
+    h, w = roi.shape[:2]
+    if roi.ndim == 3:
+        roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+    return np.array([roi[rs, cs].mean() for rs, cs in gray_patch_slices(w, h, num)])
+
+
+def validate_gray_ramp(roi, num=20, min_score=0.9, min_range=64):
+    """校验规范化灰阶ROI：台阶亮度自左向右单调递减，且首末阶亮度差足够大（排除渐变背景）"""
+    levels = gray_step_means(roi, num)
+    return levels[0] - levels[-1] >= min_range and _monotonic_score(levels) >= min_score
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """跨进程的排他文件锁（锁文件为 path + '.lock'），阻塞直到获得锁"""
+    with open(f"{path}.lock", 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class LayoutCache:
+    """
+    按治具/相机ID缓存图卡布局（JSON文件）
+    同一治具上的后续拍摄直接复用单应矩阵，校验失败时才重新检测
+    """
+
+    def __init__(self, path=LAYOUT_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._layouts = None
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load(self):
+        if self._layouts is None:
+            self._layouts = self._read()
+        return self._layouts
+
+    def get(self, fixture_id, kind):
+        with self._lock:
+            entry = self._load().get(str(fixture_id), {}).get(kind)
+        return ChartLayout.from_dict(entry) if entry else None
+
+    def put(self, fixture_id, layout):
+        # 线程锁保护进程内状态，文件锁保证多进程（批量运行的进程池）读取-修改-替换不丢失其他进程的更新
+        with self._lock, _file_lock(self.path):
+            layouts = self._read()
+            layouts.setdefault(str(fixture_id), {})[layout.kind] = layout.to_dict()
+            # 先写临时文件再替换，读取方不会看到写了一半的文件
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(layouts, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+            self._layouts = layouts
+
+
+_default_cache = None
+
+
+def default_layout_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = LayoutCache()
+    return _default_cache
+
+
+def locate_chart(image, kind='color', fixture_id=None, cache=None, num=20):
+    """
+    获取图卡布局：有治具ID时优先复用缓存的单应矩阵，校验失败或无缓存时重新检测并更新缓存
+    :param image: BGR图像
+    :param kind: 'color'（24色卡）或 'gray'（灰阶卡）
+    :param fixture_id: 治具/相机ID，None表示不使用缓存
+    :param num: 灰阶阶数
+    :return: ChartLayout
+    """
+    if kind not in ('color', 'gray'):
+        raise ValueError(f"未知图卡类型: {kind}")
+    cache = cache or default_layout_cache()
+    if fixture_id is not None:
+        layout = cache.get(fixture_id, kind)
+        if layout is not None:
+            roi = layout.rectify(image)
+            valid = validate_color_chart(roi) if kind == 'color' else validate_gray_ramp(roi, num)
+            if valid:
+                return layout
+    layout = detect_color_chart(image) if kind == 'color' else detect_gray_ramp(image, num)
+    if fixture_id is not None:
+        cache.put(fixture_id, layout)
+    return layout
+
+
+def auto_roi(image, kind='color', fixture_id=None, num=20):
+    """
+    自动检测图卡并返回校正后的规范化ROI图像，检测失败时返回None（由调用方回退到手动框选）
+    """
+    try:
+        return locate_chart(image, kind, fixture_id=fixture_id, num=num).rectify(image)
+    except ValueError as e:
+        print(f"自动检测失败，改为手动框选: {e}")
+        return None
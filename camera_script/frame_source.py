@@ -0,0 +1,170 @@
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import camera_script.raw_reader as raw_reader
+import camera_script.tiling as tiling
+
+VIDEO_EXTS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v', '.h264', '.h265', '.webm')
+# 后台解码线程与消费者之间的队列长度（帧数），限制已解码未处理帧的内存
+DEFAULT_QUEUE_SIZE = 8
+
+
+class VideoFrameSource:
+    """
+    视频帧源：后台线程用 cv2.VideoCapture 解码，帧放入有界队列，按顺序逐帧迭代
+    消费者处理较慢时解码线程在队列满处等待；提前结束迭代（break/close）时解码线程随之退出
+    """
+
+    def __init__(self, path, max_frames=None, start=0, step=1, gray=False, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        :param path: 视频文件路径（或摄像头编号）
+        :param max_frames: 最多读取的帧数，None表示读到结尾
+        :param start: 起始帧号
+        :param step: 取帧间隔（每step帧取1帧）
+        :param gray: 是否转换为灰度
+        """
+        self.path = path
+        self.max_frames = max_frames
+        self.start = start
+        self.step = step
+        self.gray = gray
+        self.queue_size = queue_size
+        cap = self._open()
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.path)
+        if not cap.isOpened():
+            raise FileNotFoundError(f"无法打开视频: {self.path}")
+        return cap
+
+    def __len__(self):
+        """可读取的帧数（部分容器格式的总帧数不准确，仅供参考）"""
+        available = max(0, (self.frame_count - self.start + self.step - 1) // self.step)
+        return available if self.max_frames is None else min(available, self.max_frames)
+
+    def _decode(self, frames, stop):
+        """解码线程：按间隔读取帧放入队列，结束时放入 None；异常转交给消费者抛出"""
+        def put(item):
+            while not stop.is_set():
+                try:
+                    frames.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        cap = None
+        try:
+            cap = self._open()
+            if self.start:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, self.start)
+            count = 0
+            index = 0
+            while self.max_frames is None or count < self.max_frames:
+                # 跳过的帧只grab不解码
+                if index % self.step:
+                    if not cap.grab():
+                        break
+                    index += 1
+                    continue
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                index += 1
+                if self.gray:
+                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                if not put(frame):
+                    return
+                count += 1
+            put(None)
+        except Exception as e:
+            put(e)
+        finally:
+            if cap is not None:
+                cap.release()
+
+    def __iter__(self):
+        frames = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        worker = threading.Thread(target=self._decode, args=(frames, stop), daemon=True)
+        worker.start()
+        try:
+            while True:
+                item = frames.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            worker.join()
+
+
+class ImageFrameSource:
+    """图像序列帧源：线程池解码，按输入顺序逐帧迭代，最多预读 2*max_workers 帧"""
+
+    def __init__(self, paths, max_frames=None, gray=False, max_workers=4):
+        self.paths = list(paths)[:max_frames]
+        self.gray = gray
+        self.max_workers = max_workers
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _load(self, path):
+        # .npy 帧以内存映射方式打开，其他格式整幅解码
+        frame = tiling.open_image(path, cv2.IMREAD_GRAYSCALE if self.gray else cv2.IMREAD_COLOR)
+        if self.gray and frame.ndim == 3:
+            frame = cv2.cvtColor(np.asarray(frame), cv2.COLOR_BGR2GRAY)
+        return frame
+
+    def __iter__(self):
+        paths = iter(self.paths)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque(executor.submit(self._load, p) for _, p in zip(range(2 * self.max_workers), paths))
+            while pending:
+                frame = pending.popleft().result()
+                for p in paths:
+                    pending.append(executor.submit(self._load, p))
+                    break
+                yield frame
+
+
+def is_video(path):
+    return isinstance(path, (str, os.PathLike)) and str(path).lower().endswith(VIDEO_EXTS)
+
+
+def open_frames(source, max_frames=None, gray=False, max_workers=4):
+    """
+    统一的帧源入口
+    :param source: 视频路径、图像路径列表、帧数组 (F, H, W[, C])、RawReader，或已创建的帧源/帧迭代器
+    :param max_frames: 最多读取的帧数
+    :param gray: 是否输出灰度帧
+    :return: 可迭代的帧源
+    """
+    if isinstance(source, (VideoFrameSource, ImageFrameSource)) or hasattr(source, '__next__'):
+        return source
+    if isinstance(source, raw_reader.RawReader):
+        # RAW帧：灰度分析直接使用Bayer原始值，彩色分析先去马赛克
+        return source.frames(max_frames, color=not gray)
+    if is_video(source):
+        return VideoFrameSource(source, max_frames=max_frames, gray=gray)
+    if isinstance(source, (str, os.PathLike)):
+        return ImageFrameSource([source], max_frames, gray, max_workers)
+    if isinstance(source, np.ndarray):
+        frames = source[:max_frames]
+        if gray and frames.ndim == 4:
+            return [cv2.cvtColor(f, cv2.COLOR_BGR2GRAY) for f in frames]
+        return frames
+    return ImageFrameSource(source, max_frames, gray, max_workers)
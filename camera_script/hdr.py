@@ -1,22 +1,19 @@
 import cv2
 import math
 import numpy as np
-import matplotlib.pyplot as plt
 
+import camera_script.image_cache as image_cache
+import camera_script.render as render
+from camera_script.chart_layout import auto_roi, gray_patch_slices, locate_chart
 
+# 灰阶卡各台阶的标称光学密度（Kodak Q-13/Q-14：0.05起每阶递增0.10），用于由台阶换算相对曝光量
+DEFAULT_STEP_DENSITIES = 0.05 + 0.10 * np.arange(20)
+# 可分辨灰阶的最小归一化灰度差
+STEP_THRESHOLD = 8
 
-def separate_gray(roi, x, y, w, h, num):
-    deltax = 1 / (num * 3)
-    deltay = 1 / 3
-    PiecesList = []
-    w_list = [i*2+1 for i in range(num)]
-    for i in w_list:
-        point_x = w * (i / (num * 2))
-        point_y = -h * (1 / 2)
-        color_piece = roi[int(point_y-deltay*h):int(point_y+deltay*h), int(point_x-deltax*w):int(point_x+deltax*w)]
-        PiecesList.append(color_piece)
 
-    return PiecesList
+def separate_gray(roi, x, y, w, h, num):
+    return [roi[rs, cs] for rs, cs in gray_patch_slices(w, h, num)]
 
 
 def HDR_calculation(pieces):
@@ -70,25 +67,169 @@ def GrayList_Detection(graylist):
 
         
 
-def main(image_path, num = 20):
-    image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+def ramp_statistics(rois, num=20):
+    """
+    灰阶ROI（或同尺寸的多曝光ROI堆叠）各台阶的均值与标准差
+    各台阶共用同一行范围：先对该行带按列求和，再由列方向累加和一次求出所有帧、所有台阶的区域和，
+    取块位置与 separate_gray 一致
+    :param rois: (H, W) 或 (N, H, W) 灰度ROI
+    :return: (均值, 标准差)，形状为 (num,) 或 (N, num)
+    """
+    stack = np.asarray(rois)
+    single = stack.ndim == 2
+    if single:
+        stack = stack[None]
+    n, h, w = stack.shape
+    slices = gray_patch_slices(w, h, num)
+    rows = slices[0][0]
+    c0 = np.array([cs.start for _, cs in slices])
+    c1 = np.array([cs.stop for _, cs in slices])
+
+    band = stack[:, rows, :]
+    column_sum = band.sum(axis=1, dtype=np.float64)
+    column_sq = np.empty_like(column_sum)
+    # 逐帧求平方和，避免整组数据的浮点副本；8/16位整型用uint32精确计算
+    square_type = np.uint32 if band.dtype.kind in 'ub' and band.dtype.itemsize <= 2 else np.float64
+    for i, frame in enumerate(band):
+        square = frame.astype(square_type)
+        square *= square
+        column_sq[i] = square.sum(axis=0, dtype=np.float64)
+
+    def box_sum(columns):
+        cumulative = np.zeros((n, w + 1))
+        np.cumsum(columns, axis=1, out=cumulative[:, 1:])
+        return cumulative[:, c1] - cumulative[:, c0]
+
+    area = (rows.stop - rows.start) * (c1 - c0)
+    means = box_sum(column_sum) / area
+    stds = np.sqrt(np.maximum(box_sum(column_sq) / area - means * means, 0))
+    return (means[0], stds[0]) if single else (means, stds)
+
+
+def _leading(mask):
+    """沿最后一维从头开始连续为True的个数"""
+    return np.where(mask.all(axis=-1), mask.shape[-1], np.argmin(mask, axis=-1))
+
+
+def gray_step_metrics(means, threshold=STEP_THRESHOLD):
+    """
+    由自亮到暗的台阶均值计算动态范围与可分辨阶数（与 HDR_calculation / GrayList_Detection 一致），
+    沿最后一维向量化，可一次处理整组曝光
+    :param means: (..., num) 台阶均值
+    :return: {'dynamic_range', 'gray_levels'(归一化到0-255), 'k1', 'k2', 'k3'}
+    """
+    means = np.asarray(means, dtype=np.float64)
+    hdr = means[..., 0] - means[..., -1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        levels = (means - means[..., -1:]) * (255 / hdr)[..., None]
+    diff = np.diff(levels, axis=-1)
+    distinct = np.abs(diff) >= threshold
+    return {
+        'dynamic_range': hdr,
+        'gray_levels': levels,
+        # k1：从头连续可分辨的阶数；k2：灰度差保持不增的阶数；k3：可分辨的总阶数
+        'k1': 1 + _leading(distinct),
+        'k2': 1 + _leading(diff[..., 1:] <= diff[..., :-1]),
+        'k3': 1 + distinct.sum(axis=-1),
+    }
+
+
+def analyze_gray_ramp(roi_gray, num=20):
+    """
+    灰阶卡ROI的动态范围分析（不涉及界面交互）
+    :return: {'dynamic_range', 'gray_levels'(归一化到0-255的各阶灰度), 'k1', 'k2', 'k3'}
+    """
+    means, _ = ramp_statistics(roi_gray, num)
+    metrics = gray_step_metrics(means)
+    return {
+        'dynamic_range': float(metrics['dynamic_range']),
+        'gray_levels': metrics['gray_levels'],
+        'k1': int(metrics['k1']),
+        'k2': int(metrics['k2']),
+        'k3': int(metrics['k3']),
+    }
+
+
+def analyze_exposure_stack(rois, exposure_times, num=20, densities=DEFAULT_STEP_DENSITIES,
+                           black_level=0.0, clip_level=None, min_snr=1.0):
+    """
+    多曝光（包围曝光）灰阶卡的动态范围分析，一次调用处理整组曝光
+    各台阶的相对曝光量 log10(H) = log10(曝光时间) - 台阶密度，所有曝光的台阶样本合并为OECF，
+    在对数坐标下拟合 log10(信号) = gamma * log10(H) + b；
+    动态范围为未饱和的最大曝光量与 SNR >= min_snr 的最小曝光量之比
+    :param rois: 同尺寸灰度ROI的列表或 (N, H, W) 数组（同一治具下校正后的灰阶ROI）
+    :param exposure_times: 各ROI的曝光时间（或任意相对曝光量）
+    :param densities: 各台阶的光学密度
+    :param black_level: 黑电平，SNR按扣除黑电平后的信号计算
+    :param clip_level: 饱和判定阈值，默认为数据类型最大值的98%
+    :param min_snr: 最暗可用台阶的SNR下限（线性，ISO 15739取1）
+    :return: 各曝光的台阶统计/灰阶指标、合并的OECF及整体动态范围
+    """
+    stack = np.asarray(rois)
+    if stack.ndim != 3:
+        raise ValueError("rois 应为同尺寸灰度ROI的堆叠 (N, H, W)")
+    exposure_times = np.asarray(exposure_times, dtype=np.float64)
+    if exposure_times.shape != (stack.shape[0],):
+        raise ValueError(f"曝光时间个数 {exposure_times.size} 与ROI个数 {stack.shape[0]} 不一致")
+    densities = np.asarray(densities, dtype=np.float64)[:num]
+    if clip_level is None:
+        full_scale = np.iinfo(stack.dtype).max if np.issubdtype(stack.dtype, np.integer) else stack.max()
+        clip_level = 0.98 * full_scale
+
+    means, stds = ramp_statistics(stack, num)
+    signal = means - black_level
+    with np.errstate(invalid='ignore', divide='ignore'):
+        snr = signal / stds
+        snr_db = 20 * np.log10(snr)
+    log_exposure = np.log10(exposure_times)[:, None] - densities[None, :]
+
+    # OECF：合并所有曝光中未饱和、信号为正的台阶样本；拟合只用SNR达标的样本（排除噪声底）
+    valid = (means < clip_level) & (signal > 0)
+    usable = valid & (snr >= min_snr)
+    if usable.sum() < 2:
+        raise ValueError(f"SNR不低于{min_snr}的未饱和台阶不足，无法拟合OECF")
+    order = np.argsort(log_exposure[valid])
+    oecf_x = log_exposure[valid][order]
+    oecf_y = means[valid][order]
+    coeffs = np.polyfit(log_exposure[usable], np.log10(signal[usable]), 1)
+
+    log_range = oecf_x[-1] - log_exposure[usable].min()
+
+    per_exposure = gray_step_metrics(means)
+    return {
+        'exposure_times': exposure_times,
+        'step_means': means,
+        'step_stds': stds,
+        'snr_db': snr_db,
+        'log_exposure': log_exposure,
+        'valid': valid,
+        'per_exposure': per_exposure,
+        'oecf': {'log_exposure': oecf_x, 'level': oecf_y, 'coeffs': coeffs, 'gamma': coeffs[0],
+                 'black_level': black_level},
+        'dynamic_range_stops': log_range / np.log10(2),
+        'dynamic_range_db': 20 * log_range,
+    }
+
+
+def main(image_path, num = 20, auto=False, fixture_id=None):
+    image = image_cache.imread(image_path, cv2.IMREAD_COLOR)
 
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
-    # 手动选择ROI
-    cv2.namedWindow("Select Edge ROI", cv2.WINDOW_NORMAL)
-    roi = cv2.selectROI("Select Edge ROI", gray)
-    x, y, w, h = map(int, roi)
-    #roi_image = image[y:y+h, x:x+w] 
-    roi_gray = gray[y:y+h, x:x+w]     
+    # 自动检测灰阶卡（最亮阶在左），失败时手动选择ROI
+    roi_gray = auto_roi(gray, 'gray', fixture_id, num) if auto else None
+    if roi_gray is None:
+        cv2.namedWindow("Select Edge ROI", cv2.WINDOW_NORMAL)
+        roi = cv2.selectROI("Select Edge ROI", gray)
+        x, y, w, h = map(int, roi)
+        #roi_image = image[y:y+h, x:x+w] 
+        roi_gray = gray[y:y+h, x:x+w]     
 
     cv2.imwrite("roi_1.png", roi_gray)
 
-    List = separate_gray(roi_gray, x, y, w, h, num)
-
-    Gray_List = []
-    hdr,  Gray_List = HDR_calculation(List)
-    k1, k2, k3 = GrayList_Detection(Gray_List)
+    result = analyze_gray_ramp(roi_gray, num)
+    hdr = result['dynamic_range']
+    k1, k3 = result['k1'], result['k3']
 
     #OUTPUT
     print("===== 动态范围分析结果 =====")
@@ -96,15 +237,44 @@ def main(image_path, num = 20):
     print(f"顺序灰度阶数（从头计算灰度差大于8）: {k1}")
     print(f"总灰度阶数（灰度差大于6）: {k3}")
 
-    #plot
-    plt.plot(Gray_List, 'g-', linewidth=2)
-    plt.title('Gray States Function')
-    plt.xlabel('Stats')
-    plt.ylabel('Grayscale')
-    plt.grid(True, linestyle='--', alpha=0.7)
+    render.show('gray_ramp', result)
+
+def main_stack(image_paths, exposure_times, num=20, fixture_id=None):
+    """
+    包围曝光灰阶卡分析：各曝光共用同一灰阶卡位置（自动检测，失败时在首张图像上手动框选），
+    校正为同尺寸ROI后一次计算
+    """
+    grays = []
+    for path in image_paths:
+        image = image_cache.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise FileNotFoundError(f"图像未找到: {path}")
+        grays.append(image)
+
+    # 曝光不同时亮度差异很大，优先在检测成功的图像上定位后应用到整组
+    layout = None
+    for gray in grays:
+        try:
+            layout = locate_chart(gray, 'gray', fixture_id=fixture_id, num=num)
+            break
+        except ValueError:
+            continue
+    if layout is not None:
+        rois = [layout.rectify(gray) for gray in grays]
+    else:
+        cv2.namedWindow("Select Edge ROI", cv2.WINDOW_NORMAL)
+        x, y, w, h = map(int, cv2.selectROI("Select Edge ROI", grays[0]))
+        rois = [gray[y:y+h, x:x+w] for gray in grays]
+
+    result = analyze_exposure_stack(rois, exposure_times, num)
+    print("===== 包围曝光动态范围分析结果 =====")
+    print(f"动态范围: {result['dynamic_range_stops']:.2f} stops ({result['dynamic_range_db']:.1f} dB)")
+    for t, k3 in zip(result['exposure_times'], result['per_exposure']['k3']):
+        print(f"曝光 {t:.4g}: 可分辨灰阶数 {k3}")
+
+    render.show('oecf', result)
+    return result
 
-    plt.tight_layout()
-    plt.show()
 
 if __name__ == "__main__":
     main("gray.png", 20)
\ No newline at end of file
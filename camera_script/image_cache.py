@@ -0,0 +1,161 @@
+"""
+解码图像与预览金字塔的进程内LRU缓存
+
+同一采集图像在查看器预览与各项分析中只解码一次：
+- imread(path, flags)       与 cv2.imread 相同的调用方式，返回缓存的只读数组（失败返回None）
+- get(path, flags)          缓存条目 CachedImage，含原图与按需生成的预览金字塔
+缓存键为 (绝对路径, 修改时间, 文件大小, 解码标志)，文件被覆盖后自动重新解码。
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+
+# 缓存的解码图像与金字塔总字节数上限
+DEFAULT_MAX_BYTES = 512 * 2 ** 20
+# 预览金字塔逐级缩小一半，最小一级的长边不小于该值
+MIN_PREVIEW = 256
+
+
+def _readonly(array):
+    array.flags.writeable = False
+    return array
+
+
+class CachedImage:
+    """一幅解码图像及其预览金字塔（各级均为只读数组，需修改时先 copy()）"""
+
+    def __init__(self, path, image):
+        self.path = path
+        self.image = _readonly(image)
+        self._pyramid = None
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    @property
+    def nbytes(self):
+        # 金字塔各级面积依次为1/4，总和不超过原图的1/3
+        return self.image.nbytes * 4 // 3
+
+    @property
+    def pyramid(self):
+        """预览金字塔 [原图, 1/2, 1/4, ...]，首次访问时生成"""
+        with self._lock:
+            if self._pyramid is None:
+                levels = [self.image]
+                while max(levels[-1].shape[:2]) // 2 >= MIN_PREVIEW:
+                    h, w = levels[-1].shape[:2]
+                    levels.append(_readonly(cv2.resize(levels[-1], (w // 2, h // 2),
+                                                       interpolation=cv2.INTER_AREA)))
+                self._pyramid = levels
+            return self._pyramid
+
+    def preview(self, max_width, max_height):
+        """
+        按比例缩放到不超过 max_width x max_height 的预览图（不放大）
+        从不小于目标尺寸的最小一级金字塔缩放，避免每次从原图重采样
+        """
+        h, w = self.image.shape[:2]
+        scale = min(max_width / w, max_height / h, 1.0)
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        source = self.image
+        for level in self.pyramid:
+            if level.shape[1] >= size[0] and level.shape[0] >= size[1]:
+                source = level
+        if source.shape[1::-1] == size:
+            return source
+        return _readonly(cv2.resize(source, size, interpolation=cv2.INTER_AREA))
+
+
+class ImageCache:
+    """按 (路径, 修改时间) 缓存解码图像的LRU缓存，线程安全，总占用不超过 max_bytes"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    @staticmethod
+    def _key(path, flags):
+        path = os.path.abspath(os.fspath(path))
+        stat = os.stat(path)
+        return path, stat.st_mtime_ns, stat.st_size, flags
+
+    def get(self, path, flags=cv2.IMREAD_COLOR):
+        """
+        缓存条目，未命中时解码并加入缓存
+        :return: CachedImage；文件不存在或无法解码时返回None
+        """
+        try:
+            key = self._key(path, flags)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # 解码不持有锁，不同图像可并行解码；同一图像并发未命中时以先存入者为准
+        image = cv2.imread(key[0], flags)
+        if image is None:
+            return None
+        entry = CachedImage(key[0], image)
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                return existing
+            # 超过缓存上限的单幅图像不缓存
+            if entry.nbytes <= self.max_bytes:
+                self._entries[key] = entry
+                self._bytes += entry.nbytes
+                self._evict()
+        return entry
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.nbytes
+
+    def imread(self, path, flags=cv2.IMREAD_COLOR):
+        """与 cv2.imread 相同，返回只读数组，无法读取时返回None"""
+        entry = self.get(path, flags)
+        return None if entry is None else entry.image
+
+    def invalidate(self, path=None):
+        """移除某一路径的所有条目（path为None时清空缓存）"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            path = os.path.abspath(os.fspath(path))
+            for key in [k for k in self._entries if k[0] == path]:
+                self._bytes -= self._entries.pop(key).nbytes
+
+
+default_cache = ImageCache()
+
+
+def get(path, flags=cv2.IMREAD_COLOR):
+    return default_cache.get(path, flags)
+
+
+def imread(path, flags=cv2.IMREAD_COLOR):
+    return default_cache.imread(path, flags)
@@ -0,0 +1,149 @@
+import numpy as np
+from functools import lru_cache
+from scipy.fft import rfft2, fftshift
+
+# 批量FFT时每次处理的帧数，限制复数频谱的临时内存
+DEFAULT_CHUNK = 16
+
+
+@lru_cache(maxsize=16)
+def radial_bins(shape):
+    """
+    实数FFT半平面 (H, W//2+1) 上各频点的径向bin索引及权重（按ROI尺寸缓存）
+    半径以真实直流分量为原点，bin k 覆盖 k <= r < k+1（单位：频率索引）；
+    除第0列及偶数宽度的奈奎斯特列外，其余列在完整频谱中出现两次，权重为2
+    :param shape: ROI尺寸 (H, W)
+    :return: (bin索引, 权重, 各bin权重和)，均为只读一维数组
+    """
+    height, width = shape
+    # 整数频率索引（fftfreq(n) * n 存在浮点误差，会使整数半径落入前一个bin）
+    ky = np.arange(height)
+    ky = np.where(ky < (height + 1) // 2, ky, ky - height).astype(np.float64)
+    kx = np.arange(width // 2 + 1, dtype=np.float64)
+    r = np.hypot(ky[:, None], kx[None, :])
+    index = np.floor(r).astype(np.intp).ravel()
+
+    weights = np.full((height, width // 2 + 1), 2.0)
+    weights[:, 0] = 1.0
+    if width % 2 == 0:
+        weights[:, -1] = 1.0
+    weights = weights.ravel()
+    counts = np.bincount(index, weights)
+
+    for arr in (index, weights, counts):
+        arr.setflags(write=False)
+    return index, weights, counts
+
+
+def power_spectrum(stack, detrend=True, chunk=DEFAULT_CHUNK):
+    """
+    多帧ROI的平均功率谱（实数FFT半平面），按chunk帧批量计算
+    :param stack: (..., F, H, W) 帧堆叠，前置维度（如通道）各自独立平均
+    :param detrend: 是否逐帧去均值
+    :return: (..., H, W//2+1) 功率谱 |F|^2 / (H*W)
+    """
+    stack = np.asarray(stack)
+    if stack.ndim == 2:
+        stack = stack[None]
+    n_frames, height, width = stack.shape[-3:]
+    total = None
+    for start in range(0, n_frames, chunk):
+        power = _power_sum(stack[..., start:start + chunk, :, :], detrend)
+        total = power if total is None else total + power
+    return total / (n_frames * height * width)
+
+
+def _power_sum(block, detrend):
+    """(..., F, H, W) 帧块的 |F|^2 之和（沿帧维度）"""
+    block = block.astype(np.float64)
+    if detrend:
+        block -= block.mean(axis=(-2, -1), keepdims=True)
+    spectrum = rfft2(block, workers=-1)
+    return (spectrum.real ** 2 + spectrum.imag ** 2).sum(axis=-3)
+
+
+def radial_average(half_power, shape):
+    """
+    半平面功率谱的径向平均
+    :param half_power: (..., H, W//2+1) 功率谱
+    :param shape: ROI尺寸 (H, W)
+    :return: (径向频率bins, (..., nbins) 一维NPS)
+    """
+    index, weights, counts = radial_bins(tuple(shape))
+    flat = half_power.reshape(-1, index.size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        nps_1d = np.stack([np.bincount(index, weights * row, minlength=counts.size) for row in flat]) / counts
+    return np.arange(counts.size), nps_1d.reshape(half_power.shape[:-2] + (counts.size,))
+
+
+def full_spectrum(half_power, shape):
+    """由实数FFT半平面按共轭对称恢复完整功率谱，并将直流移到中心（用于显示）"""
+    height, width = shape
+    half_width = width // 2 + 1
+    full = np.empty(half_power.shape[:-2] + (height, width), dtype=half_power.dtype)
+    full[..., :half_width] = half_power
+    rows = (-np.arange(height)) % height
+    cols = width - np.arange(half_width, width)
+    full[..., half_width:] = half_power[..., rows, :][..., cols]
+    return fftshift(full, axes=(-2, -1))
+
+
+def noise_power_spectrum(stack, detrend=True, chunk=DEFAULT_CHUNK):
+    """
+    多帧噪声功率谱
+    :param stack: (..., F, H, W) 或单帧 (H, W)
+    :return: {'nps_2d': 移中后的二维NPS, 'r_bins': 径向bins, 'nps_1d': 一维径向NPS}
+    """
+    stack = np.asarray(stack)
+    shape = stack.shape[-2:]
+    half = power_spectrum(stack, detrend=detrend, chunk=chunk)
+    r_bins, nps_1d = radial_average(half, shape)
+    return {'nps_2d': full_spectrum(half, shape), 'r_bins': r_bins, 'nps_1d': nps_1d}
+
+
+class PowerSpectrumAccumulator:
+    """
+    逐帧累积的平均功率谱（用于视频等流式帧源），结果与 power_spectrum 一致
+    帧先缓存到 chunk 帧再批量做实数FFT，内存只与 chunk 有关
+    """
+
+    def __init__(self, detrend=True, chunk=DEFAULT_CHUNK):
+        self.detrend = detrend
+        self.chunk = chunk
+        self.count = 0
+        self.shape = None
+        self._buffer = []
+        self._total = None
+
+    def update(self, frame):
+        """:param frame: (..., H, W) 单帧（前置维度如通道各自累积）"""
+        frame = np.asarray(frame)
+        if self.shape is None:
+            self.shape = frame.shape[-2:]
+        elif frame.shape[-2:] != self.shape:
+            raise ValueError(f"帧尺寸不一致: {frame.shape[-2:]} != {self.shape}")
+        self._buffer.append(frame)
+        self.count += 1
+        if len(self._buffer) >= self.chunk:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            power = _power_sum(np.stack(self._buffer, axis=-3), self.detrend)
+            self._total = power if self._total is None else self._total + power
+            self._buffer = []
+
+    def result(self):
+        """:return: (..., H, W//2+1) 平均功率谱"""
+        self._flush()
+        if self._total is None:
+            raise ValueError("未累积任何帧")
+        height, width = self.shape
+        return self._total / (self.count * height * width)
+
+    def noise_power_spectrum(self):
+        """:return: 与 noise_power_spectrum 相同格式的结果"""
+        half = self.result()
+        shape = self.shape
+        r_bins, nps_1d = radial_average(half, shape)
+        return {'nps_2d': full_spectrum(half, shape), 'r_bins': r_bins, 'nps_1d': nps_1d}
@@ -0,0 +1,207 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import cv2
+import numpy as np
+
+# 打包格式每组像素占用的字节数：(像素数, 字节数)
+PACKINGS = {
+    'raw8': (1, 1),
+    'raw16': (1, 2),    # 16位小端，低位对齐（10/12/14位有效）
+    'mipi10': (4, 5),   # MIPI RAW10：4个像素的高8位 + 1字节低2位
+    'mipi12': (2, 3),   # MIPI RAW12：2个像素的高8位 + 1字节低4位
+}
+
+# CFA排列 -> 2x2周期内各位置的通道名（左上、右上、左下、右下）
+CFA_LAYOUTS = {
+    'RGGB': ('R', 'Gr', 'Gb', 'B'),
+    'BGGR': ('B', 'Gb', 'Gr', 'R'),
+    'GRBG': ('Gr', 'R', 'B', 'Gb'),
+    'GBRG': ('Gb', 'B', 'R', 'Gr'),
+}
+
+# OpenCV的Bayer命名以第二行第二、三列为准，与通常的CFA命名不同
+_DEMOSAIC_CODES = {
+    'RGGB': cv2.COLOR_BayerBG2BGR,
+    'BGGR': cv2.COLOR_BayerRG2BGR,
+    'GRBG': cv2.COLOR_BayerGB2BGR,
+    'GBRG': cv2.COLOR_BayerGR2BGR,
+}
+
+
+@dataclass
+class RawFormat:
+    """RAW数据格式"""
+    width: int
+    height: int
+    packing: str = 'raw16'
+    bits: int = 10                      # 有效位数
+    cfa: str = 'RGGB'
+    header: int = 0                     # 文件头字节数
+    stride: Optional[int] = None        # 每行字节数（含行尾填充），None为紧凑排列
+    frame_padding: int = 0              # 同一文件内相邻帧之间的填充字节数
+
+    def __post_init__(self):
+        if self.packing not in PACKINGS:
+            raise ValueError(f"不支持的打包格式: {self.packing}（可选 {', '.join(PACKINGS)}）")
+        if self.cfa not in CFA_LAYOUTS:
+            raise ValueError(f"不支持的CFA排列: {self.cfa}")
+        pixels, nbytes = PACKINGS[self.packing]
+        if self.width % pixels:
+            raise ValueError(f"{self.packing} 格式的宽度必须是{pixels}的倍数")
+        if self.stride is None:
+            self.stride = self.row_bytes
+        elif self.stride < self.row_bytes:
+            raise ValueError(f"行跨度 {self.stride} 小于一行数据的字节数 {self.row_bytes}")
+
+    @property
+    def row_bytes(self):
+        pixels, nbytes = PACKINGS[self.packing]
+        return self.width // pixels * nbytes
+
+    @property
+    def frame_bytes(self):
+        return self.height * self.stride + self.frame_padding
+
+    @property
+    def white_level(self):
+        return (1 << self.bits) - 1
+
+
+def unpack_mipi10(data, width):
+    """
+    MIPI RAW10 解包（向量化）
+    :param data: (..., ≥width*5/4) uint8，每行的打包字节
+    :return: (..., width) uint16
+    """
+    groups = np.asarray(data)[..., :width // 4 * 5].reshape(data.shape[:-1] + (width // 4, 5))
+    msb = groups[..., :4].astype(np.uint16) << 2
+    shifts = np.array([0, 2, 4, 6], dtype=np.uint8)
+    lsb = (groups[..., 4:5] >> shifts) & 0x3
+    return (msb | lsb).reshape(data.shape[:-1] + (width,))
+
+
+def unpack_mipi12(data, width):
+    """
+    MIPI RAW12 解包（向量化）
+    :param data: (..., ≥width*3/2) uint8，每行的打包字节
+    :return: (..., width) uint16
+    """
+    groups = np.asarray(data)[..., :width // 2 * 3].reshape(data.shape[:-1] + (width // 2, 3))
+    out = np.empty(data.shape[:-1] + (width // 2, 2), dtype=np.uint16)
+    out[..., 0] = (groups[..., 0].astype(np.uint16) << 4) | (groups[..., 2] & 0xF)
+    out[..., 1] = (groups[..., 1].astype(np.uint16) << 4) | (groups[..., 2] >> 4)
+    return out.reshape(data.shape[:-1] + (width,))
+
+
+def cfa_channels(frame, cfa='RGGB'):
+    """
+    按CFA排列拆分的四个通道平面，均为原帧的步幅视图（不复制）
+    :return: {'R', 'Gr', 'Gb', 'B'} -> (H/2, W/2)
+    """
+    names = CFA_LAYOUTS[cfa]
+    return {
+        names[0]: frame[0::2, 0::2],
+        names[1]: frame[0::2, 1::2],
+        names[2]: frame[1::2, 0::2],
+        names[3]: frame[1::2, 1::2],
+    }
+
+
+def demosaic(frame, cfa='RGGB'):
+    """双线性去马赛克，输出与输入同位深的BGR图像"""
+    return cv2.cvtColor(np.ascontiguousarray(frame), _DEMOSAIC_CODES[cfa])
+
+
+class RawReader:
+    """
+    RAW/Bayer帧读取：文件以 np.memmap 映射，只有访问到的帧才从磁盘读入
+    单个文件可包含多帧（按 frame_bytes 依次排列），也可传入每帧一个文件的路径列表
+    raw8/raw16 帧为映射的视图（不复制）；MIPI打包格式逐帧向量化解包为 uint16
+    """
+
+    def __init__(self, source, fmt):
+        """
+        :param source: RAW文件路径，或路径列表（按顺序拼接为帧序列）
+        :param fmt: RawFormat
+        """
+        self.fmt = fmt
+        self.paths = [source] if isinstance(source, (str, os.PathLike)) else list(source)
+        self._index = []
+        for file_index, path in enumerate(self.paths):
+            count = (os.path.getsize(path) - fmt.header + fmt.frame_padding) // fmt.frame_bytes
+            if count <= 0:
+                raise ValueError(f"文件长度不足一帧: {path}")
+            self._index.extend((file_index, i) for i in range(count))
+        self._maps = {}
+
+    def __len__(self):
+        return len(self._index)
+
+    def _map(self, file_index):
+        # 按需映射，只保留最近访问的文件，避免大量帧文件同时占用文件句柄
+        if file_index not in self._maps:
+            self._maps.clear()
+            self._maps[file_index] = np.memmap(self.paths[file_index], dtype=np.uint8, mode='r')
+        return self._maps[file_index]
+
+    def packed(self, index):
+        """第index帧的原始字节 (H, stride)，为内存映射视图"""
+        file_index, i = self._index[index]
+        fmt = self.fmt
+        start = fmt.header + i * fmt.frame_bytes
+        return self._map(file_index)[start:start + fmt.height * fmt.stride].reshape(fmt.height, fmt.stride)
+
+    def frame(self, index):
+        """第index帧的像素值 (H, W)：raw8为uint8，其余为uint16"""
+        fmt = self.fmt
+        rows = self.packed(index)
+        if fmt.packing == 'raw8':
+            return rows[:, :fmt.width]
+        if fmt.packing == 'raw16':
+            return rows[:, :fmt.row_bytes].view('<u2')
+        if fmt.packing == 'mipi10':
+            return unpack_mipi10(rows, fmt.width)
+        return unpack_mipi12(rows, fmt.width)
+
+    def __getitem__(self, index):
+        return self.frame(index)
+
+    def __iter__(self):
+        return self.frames()
+
+    def frames(self, max_frames=None, channel=None, color=False):
+        """
+        逐帧迭代
+        :param channel: CFA通道名（'R'/'Gr'/'Gb'/'B'），只输出该通道平面（视图）
+        :param color: 输出去马赛克后的BGR图像（用于色度噪声分析）
+        """
+        for index in range(len(self) if max_frames is None else min(max_frames, len(self))):
+            frame = self.frame(index)
+            if channel is not None:
+                yield cfa_channels(frame, self.fmt.cfa)[channel]
+            elif color:
+                yield demosaic(frame, self.fmt.cfa)
+            else:
+                yield frame
+
+    def channel_stack(self, channel, max_frames=None):
+        """
+        所有帧某一CFA通道的堆叠 (F, H/2, W/2)
+        raw8/raw16 单文件多帧时为映射的步幅视图，不复制数据
+        """
+        fmt = self.fmt
+        n = len(self) if max_frames is None else min(max_frames, len(self))
+        if fmt.packing in ('raw8', 'raw16') and len(self.paths) == 1:
+            itemsize = 1 if fmt.packing == 'raw8' else 2
+            data = self._map(0)[fmt.header:]
+            if itemsize == 2:
+                data = data[:len(data) // 2 * 2].view('<u2')
+            frames = np.lib.stride_tricks.as_strided(
+                data, shape=(n, fmt.height, fmt.width),
+                strides=(fmt.frame_bytes, fmt.stride, itemsize), writeable=False)
+            names = CFA_LAYOUTS[fmt.cfa]
+            pos = names.index(channel)
+            return frames[:, pos // 2::2, pos % 2::2]
+        return np.stack(list(self.frames(n, channel=channel)))
@@ -0,0 +1,371 @@
+"""
+camera_script 分析结果的可视化
+
+各分析函数只返回结果字典，图表按需在此生成：
+- show(kind, result)         交互显示（pyplot窗口）
+- render_png(kind, result)   Agg后端离屏渲染为PNG，按结果哈希缓存
+- render_async(kind, result) 在后台线程中渲染，返回Future
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# PNG缓存条目上限
+CACHE_SIZE = 64
+
+
+def draw_sfr(fig, results):
+    """SFR：ESF、LSF 与 MTF 曲线（results 为 SFR.sfr_calculation 的返回值）"""
+    ax = fig.add_subplot(2, 2, 1)
+    ax.plot(results['esf'], 'b-', linewidth=1)
+    ax.set_title('Edge Spread Function (4x Oversampled)')
+    ax.set_xlabel('Position (0.25 pixel steps)')
+    ax.grid(True, linestyle='--', alpha=0.7)
+
+    ax = fig.add_subplot(2, 2, 2)
+    ax.plot(results['lsf'], 'r-', linewidth=1)
+    ax.set_title('Line Spread Function')
+    ax.set_xlabel('Position')
+    ax.grid(True, linestyle='--', alpha=0.7)
+
+    ax = fig.add_subplot(2, 1, 2)
+    ax.plot(results['freq'], results['standard_mtf_data'], 'g-', linewidth=2)
+    ax.axvline(results['mtf50'], ymin=0, ymax=0.5, color='b', linestyle=':',
+               label=f'MTF50 = {results["mtf50"]:.2f} Cy/Pxl')
+    ax.set_title('SFR/MTF Curve')
+    ax.set_xlabel('Spatial Frequency (Cy/Pxl)')
+    ax.set_ylabel('Modulation (dB)')
+    font1 = {'color': 'darkred', 'weight': 'normal', 'size': 12}
+    font2 = {'color': 'red', 'weight': 'light', 'size': 10}
+    ax.text(0, 0.3, "MTF50 = %.2f Cy/Pxl" % (results["mtf50"]), font1)
+    ax.text(0, 0.2, "MTF50p = %.2f Cy/Pxl" % (results["mtf50_p"]), font1)
+    if results["mtf_equal"] - 1 > 0:
+        sharpenss = "Oversharpenss = %.1f" % (results["mtf_equal"] * 100 - 100) + "%"
+    else:
+        sharpenss = "Undersharpenss = %.1f" % (100 - results["mtf_equal"] * 100) + "%"
+    ax.text(0, 0.1, sharpenss, font2)
+    ax.legend()
+    ax.grid(True, which='both', linestyle='--', alpha=0.7)
+
+
+def draw_noise(fig, results):
+    """时域噪声图与噪声功率谱（results 为 CheckNoise.analyze_image_noise 的返回值）"""
+    ax = fig.add_subplot(2, 2, 1)
+    im = ax.imshow(results['temporal_noise'], cmap='hot')
+    fig.colorbar(im, ax=ax, label='Noise (ADU)')
+    ax.set_title(f"Random Noise Map\nMean: {results['random_noise_mean']:.2f}, "
+                 f"Std: {results['random_noise_std']:.2f}")
+    ax.axis('off')
+
+    ax = fig.add_subplot(2, 2, 2)
+    im = ax.imshow(np.log10(results['nps_2d'] + 1e-6), cmap='jet')
+    fig.colorbar(im, ax=ax, label='Log10(NPS)')
+    ax.set_title("2D Noise Power Spectrum")
+    ax.axis('off')
+
+    ax = fig.add_subplot(2, 2, 3)
+    ax.plot(results['r_bins'], results['nps_1d'])
+    ax.set_yscale('log')
+    ax.set_xlabel("Spatial Frequency (cycles/pixel)")
+    ax.set_ylabel("NPS (ADU²)")
+    ax.set_title("1D Radial NPS")
+    ax.grid(True)
+
+
+def draw_color_noise(fig, results):
+    """色度通道首帧、色度NPS及统计表（results 为 ColorNoise.analyze_chromatic_noise 的返回值）"""
+    cmap = 'RdBu' if results['color_space'] == 'LAB' else 'viridis'
+    for i, (ch_name, frame) in enumerate(results['first_frame'].items()):
+        ax = fig.add_subplot(2, 3, i + 1)
+        im = ax.imshow(frame, cmap=cmap)
+        fig.colorbar(im, ax=ax)
+        ax.set_title(f"{ch_name} Channel (Frame 0)")
+        ax.axis('off')
+
+    ax = fig.add_subplot(2, 3, 3)
+    for ch_name, nps in results['nps'].items():
+        ax.plot(results['r_bins'], nps, label=f'{ch_name} NPS')
+    ax.set_yscale('log')
+    ax.set_xlabel('Spatial Frequency (cycles/pixel)')
+    ax.set_ylabel('Power Spectral Density')
+    ax.set_title('Chromatic Noise Power Spectrum')
+    ax.legend()
+    ax.grid(True)
+
+    ax = fig.add_subplot(2, 3, 6)
+    noise_stats = results['noise_stats']
+    cell_text = [[f"{s['noise_mean']:.2f}", f"{s['noise_std']:.2f}", f"{s['SNR']:.1f} dB"]
+                 for s in noise_stats.values()]
+    ax.table(cellText=cell_text,
+             rowLabels=list(noise_stats.keys()),
+             colLabels=['Noise Mean', 'Noise Std', 'SNR'],
+             loc='center')
+    ax.axis('off')
+
+
+def draw_contrast(fig, results):
+    """原图、直方图、局部对比度图及全局指标（results 为 Contrast.analyze_contrast 的返回值）"""
+    img = results['image']
+    ax = fig.add_subplot(2, 3, 1)
+    ax.imshow(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    ax.set_title("Original Image")
+    ax.axis('off')
+
+    ax = fig.add_subplot(2, 3, 2)
+    ax.imshow(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), cmap='gray')
+    ax.set_title("Grayscale Image")
+    ax.axis('off')
+
+    hist = results['histogram']
+    ax = fig.add_subplot(2, 3, 3)
+    ax.plot(hist, color='black')
+    ax.fill_between(np.arange(256), hist.ravel(), alpha=0.3)
+    ax.set_title(f"Histogram\nKurtosis: {results['histogram_kurtosis']:.2f}, "
+                 f"Skewness: {results['histogram_skewness']:.2f}")
+    ax.set_xlabel("Pixel Value")
+    ax.set_ylabel("Frequency")
+    ax.grid(True)
+
+    ax = fig.add_subplot(2, 3, 4)
+    im = ax.imshow(results['local_contrast_map'], cmap='hot')
+    fig.colorbar(im, ax=ax, label='Local Contrast')
+    ax.set_title(f"Local Contrast Map ({results['method']})\n"
+                 f"Mean: {results['local_contrast_mean']:.3f}, Std: {results['local_contrast_std']:.3f}")
+    ax.axis('off')
+
+    ax = fig.add_subplot(2, 3, 5)
+    cell_text = [
+        [f"{results['dynamic_range']}", "0-255"],
+        [f"{results['michelson_contrast']:.3f}", "(Lmax-Lmin)/(Lmax+Lmin)"],
+        [f"{results['rms_contrast']:.3f}", "标准差"]
+    ]
+    ax.table(cellText=cell_text,
+             rowLabels=["Dynamic Range", "Michelson Contrast", "RMS Contrast"],
+             colLabels=["Value", "Formula"],
+             loc='center')
+    ax.axis('off')
+
+
+def draw_ca(fig, results):
+    """ROI图像、红/蓝通道偏移分布及径向色差曲线（results 为 ChromaticAberration.detect_lateral_ca 的返回值）"""
+    ax = fig.add_subplot(1, 4, 1)
+    ax.imshow(cv2.cvtColor(results['roi_image'], cv2.COLOR_BGR2RGB))
+    ax.set_title("Original Image with Sampled Edges")
+    ax.axis('off')
+
+    ax = fig.add_subplot(1, 4, 2)
+    ax.hist(results['offsets']["red"], bins=20, color='red', alpha=0.7)
+    ax.set_xlabel("Red Channel Offset (pixels)")
+    ax.set_ylabel("Frequency")
+    ax.set_title("Red Channel Offset Distribution")
+
+    ax = fig.add_subplot(1, 4, 3)
+    ax.hist(results['offsets']["blue"], bins=20, color='blue', alpha=0.7)
+    ax.set_xlabel("Blue Channel Offset (pixels)")
+    ax.set_ylabel("Frequency")
+    ax.set_title("Blue Channel Offset Distribution")
+
+    profile = results['profile']
+    ax = fig.add_subplot(1, 4, 4)
+    ax.plot(profile['radius'], profile['red'], 'r.-', label='R - G')
+    ax.plot(profile['radius'], profile['blue'], 'b.-', label='B - G')
+    ax.axhline(0, color='k', linewidth=0.5)
+    ax.set_xlabel("Field Position (normalized radius)")
+    ax.set_ylabel("Radial Shift (pixels)")
+    ax.set_title("Lateral CA Profile")
+    ax.legend()
+    ax.grid(True)
+
+
+def draw_gray_ramp(fig, results):
+    """灰阶曲线（results 为 hdr.analyze_gray_ramp 的返回值）"""
+    ax = fig.add_subplot(1, 1, 1)
+    ax.plot(results['gray_levels'], 'g-', linewidth=2)
+    ax.set_title('Gray States Function')
+    ax.set_xlabel('Stats')
+    ax.set_ylabel('Grayscale')
+    ax.grid(True, linestyle='--', alpha=0.7)
+
+
+def draw_oecf(fig, results):
+    """多曝光OECF与各台阶SNR（results 为 hdr.analyze_exposure_stack 的返回值）"""
+    log_exposure = results['log_exposure']
+    oecf = results['oecf']
+    ax = fig.add_subplot(1, 2, 1)
+    for t, x, y in zip(results['exposure_times'], log_exposure, results['step_means']):
+        ax.plot(x, y, 'o', markersize=3, label=f't = {t:.4g}')
+    fit_x = np.linspace(oecf['log_exposure'][0], oecf['log_exposure'][-1], 200)
+    ax.plot(fit_x, oecf['black_level'] + 10 ** np.polyval(oecf['coeffs'], fit_x), 'k-', linewidth=1.5,
+            label=f"OECF fit (gamma = {oecf['gamma']:.2f})")
+    ax.set_title(f"OECF (DR = {results['dynamic_range_stops']:.1f} stops)")
+    ax.set_xlabel('log10 Relative Exposure')
+    ax.set_ylabel('Level')
+    ax.legend(fontsize=8)
+    ax.grid(True, linestyle='--', alpha=0.7)
+
+    ax = fig.add_subplot(1, 2, 2)
+    for x, snr, valid in zip(log_exposure, results['snr_db'], results['valid']):
+        ax.plot(x[valid], snr[valid], '.-')
+    ax.axhline(0, color='r', linestyle=':', label='SNR = 1')
+    ax.set_title('SNR per Step')
+    ax.set_xlabel('log10 Relative Exposure')
+    ax.set_ylabel('SNR (dB)')
+    ax.legend(fontsize=8)
+    ax.grid(True, linestyle='--', alpha=0.7)
+
+
+def draw_saturation(fig, results):
+    """24色块饱和度拼接图及直方图（results 含 'v_pic'）"""
+    v_pic = results['v_pic']
+    ax = fig.add_subplot(1, 2, 1)
+    im = ax.imshow(v_pic, cmap='hot')
+    fig.colorbar(im, ax=ax)
+    ax.set_title("Saturation Heatmap")
+    ax.axis('off')
+
+    ax = fig.add_subplot(1, 2, 2)
+    ax.hist(v_pic.ravel(), bins=50, range=(0, 255), color='blue', alpha=0.7)
+    ax.set_title("Saturation Histogram")
+    ax.set_xlabel("Saturation Value")
+    ax.set_ylabel("Frequency")
+    ax.grid(True)
+
+
+def draw_purple(fig, results):
+    """原图、紫边掩膜与轮廓标注，每幅图像一行（results 为 PurpleDetection.analyze_purple_fringe 返回值的列表）"""
+    rows = len(results)
+    for i, result in enumerate(results):
+        image_rgb = cv2.cvtColor(result['image'], cv2.COLOR_BGR2RGB)
+        label = result['label']
+        ax = fig.add_subplot(rows, 3, 3 * i + 1)
+        ax.imshow(image_rgb)
+        ax.set_title(f"{label} Original Image")
+        ax.text(0.02, 0.02, f"Fringe area: {result['fringe_ratio']:.2f}%", transform=ax.transAxes,
+                color='darkred', fontsize=12, backgroundcolor='white')
+        ax.axis('off')
+
+        ax = fig.add_subplot(rows, 3, 3 * i + 2)
+        ax.imshow(result['mask'], cmap='gray')
+        ax.set_title(f"{label} Purple Fringe Mask")
+        ax.axis('off')
+
+        contours, _ = cv2.findContours(result['mask'], cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        cv2.drawContours(image_rgb, contours, -1, (255, 0, 0), 2)
+        ax = fig.add_subplot(rows, 3, 3 * i + 3)
+        ax.imshow(image_rgb)
+        ax.set_title(f"{label} Marked Purple Fringes (severity {result['severity_mean']:.1f})")
+        ax.axis('off')
+
+
+# 图表类型 -> (绘制函数, 图像尺寸)
+FIGURES = {
+    'sfr': (draw_sfr, (10, 8)),
+    'noise': (draw_noise, (15, 10)),
+    'color_noise': (draw_color_noise, (18, 12)),
+    'contrast': (draw_contrast, (18, 12)),
+    'ca': (draw_ca, (20, 5)),
+    'gray_ramp': (draw_gray_ramp, (6.4, 4.8)),
+    'oecf': (draw_oecf, (14, 5)),
+    'saturation': (draw_saturation, (10, 4)),
+    'purple': (draw_purple, (15, 9)),
+}
+
+
+def _update_hash(h, obj):
+    if isinstance(obj, dict):
+        h.update(b'{')
+        for key in sorted(obj, key=str):
+            h.update(str(key).encode())
+            _update_hash(h, obj[key])
+        h.update(b'}')
+    elif isinstance(obj, (list, tuple)):
+        h.update(b'[')
+        for item in obj:
+            _update_hash(h, item)
+        h.update(b']')
+    elif isinstance(obj, np.ndarray):
+        h.update(f'{obj.dtype.str}{obj.shape}'.encode())
+        h.update(np.ascontiguousarray(obj).data)
+    else:
+        h.update(repr(obj).encode())
+
+
+def result_hash(result):
+    """结果字典的内容哈希（数组按数据计算），用作图表缓存键"""
+    h = hashlib.blake2b(digest_size=16)
+    _update_hash(h, result)
+    return h.hexdigest()
+
+
+def _figure(kind):
+    try:
+        return FIGURES[kind]
+    except KeyError:
+        raise ValueError(f"未知图表类型: {kind}") from None
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_executor = None
+
+
+def render_png(kind, result, dpi=100):
+    """
+    离屏渲染图表为PNG字节（Agg后端，不经过pyplot，可在任意线程调用）
+    相同类型、内容和dpi的结果直接返回缓存
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    import io
+
+    draw, figsize = _figure(kind)
+    key = (kind, result_hash(result), dpi)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    draw(fig, result)
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=dpi)
+    png = buf.getvalue()
+
+    with _cache_lock:
+        _cache[key] = png
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return png
+
+
+def render_async(kind, result, dpi=100):
+    """在后台渲染线程中生成PNG，返回 concurrent.futures.Future"""
+    global _executor
+    with _cache_lock:
+        if _executor is None:
+            # matplotlib本身非线程安全，单个渲染线程串行处理所有请求
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='render')
+    return _executor.submit(render_png, kind, result, dpi)
+
+
+def save(kind, result, path, dpi=100):
+    """渲染并保存为PNG文件"""
+    with open(path, 'wb') as f:
+        f.write(render_png(kind, result, dpi))
+
+
+def show(kind, result):
+    """交互显示图表（pyplot窗口）"""
+    import matplotlib.pyplot as plt
+
+    draw, figsize = _figure(kind)
+    fig = plt.figure(figsize=figsize)
+    draw(fig, result)
+    fig.tight_layout()
+    plt.show()
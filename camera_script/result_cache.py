@@ -0,0 +1,113 @@
+"""
+指标结果的持久化缓存（SQLite）
+
+缓存键为 (图像内容哈希, 指标名, 参数, 代码版本)：
+- 图像内容哈希按文件字节计算，文件改名/移动不影响命中，内容变化（重新采集）即失效
+- 参数为可JSON序列化的对象（ROI、阈值等），按规范化JSON比较
+- 代码版本默认取 camera_script 全部源码的哈希，算法修改后旧结果自动失效
+只缓存标量结果字典（批量运行的结果行），数组类结果不入缓存。
+"""
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'result_cache.sqlite')
+
+_code_version = None
+
+
+def content_hash(data):
+    """图像文件内容的哈希（bytes，或多帧时为各帧哈希的列表）"""
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(data, (list, tuple)):
+        for item in data:
+            h.update(item.encode())
+    else:
+        h.update(data)
+    return h.hexdigest()
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return content_hash(f.read())
+
+
+def code_version():
+    """camera_script 源码的哈希（进程内只计算一次）"""
+    global _code_version
+    if _code_version is None:
+        h = hashlib.blake2b(digest_size=8)
+        for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+            h.update(os.path.basename(path).encode())
+            with open(path, 'rb') as f:
+                h.update(f.read())
+        _code_version = h.hexdigest()
+    return _code_version
+
+
+def _params_key(params):
+    return json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class ResultCache:
+    """SQLite结果缓存，可在多个线程中共用（内部加锁）"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, version=None):
+        """
+        :param path: 数据库文件路径（':memory:' 为仅进程内缓存）
+        :param version: 代码版本，None时使用 code_version()
+        """
+        self.path = path
+        self.version = code_version() if version is None else version
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                ' content_hash TEXT, metric TEXT, params TEXT, version TEXT, value TEXT, created REAL,'
+                ' PRIMARY KEY (content_hash, metric, params, version))')
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest, metric, params=None):
+        """缓存的结果字典，未命中返回None"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT value FROM results WHERE content_hash=? AND metric=? AND params=? AND version=?',
+                (digest, metric, _params_key(params), self.version)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, digest, metric, params, value):
+        """保存结果字典（值需可JSON序列化，NaN按JSON扩展写入）"""
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                (digest, metric, _params_key(params), self.version,
+                 json.dumps(value, ensure_ascii=False), time.time()))
+
+    def prune(self):
+        """删除其他代码版本的结果，返回删除的条数"""
+        with self._lock, self._db:
+            return self._db.execute('DELETE FROM results WHERE version != ?', (self.version,)).rowcount
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM results')
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
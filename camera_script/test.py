@@ -1,114 +1,17 @@
 import cv2
-import numpy as np
 import os
-import time
 import wx
 import matplotlib
 from matplotlib import pyplot as plt
 from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as FigureCanvas
 
+# 噪声分析逻辑与 TotalNoise 共用（含多图像批量分析 analyze_noise_set）
+from camera_script.TotalNoise import ImageNoiseAnalyzer
+
 # 设置中文字体
 matplotlib.rcParams['font.sans-serif'] = ['SimHei']  # 设置中文显示
 matplotlib.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
 
-class ImageNoiseAnalyzer:
-    def __init__(self):
-        self.results = {}
-        self.roi = None  # 存储ROI坐标(x,y,w,h)
-        
-    def set_roi(self, roi):
-        """手动设置ROI区域"""
-        self.roi = roi
-        
-    def analyze_noise(self, image_path):
-        """
-        分析图像噪声特性
-        :param image_path: 图像路径
-        :return: 噪声分析结果字典
-        """
-        # 读取图像
-        img = cv2.imread(image_path)
-        if img is None:
-            raise ValueError(f"无法读取图像: {image_path}")
-            
-        # 转换为灰度图用于基础分析
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # 检查是否设置了ROI
-        if self.roi is None:
-            raise ValueError("未设置ROI区域，请先选择24色卡区域")
-            
-        x, y, w, h = self.roi
-        dark_patch = gray[y:y+h, x:x+w]
-        
-        # 计算噪声指标
-        self.results = {
-            'image_size': img.shape,
-            'roi': self.roi,
-            'random_noise_mean': float(np.mean(dark_patch)),
-            'random_noise_std': float(np.std(dark_patch)),
-            'dynamic_range': self._calc_dynamic_range(gray),
-            'color_noise': self._analyze_color_noise(img),
-            'timestamp': time.strftime("%Y-%m-%d %H:%M:%S")
-        }
-        
-        return self.results
-    
-    def _calc_dynamic_range(self, gray_img):
-        """
-        计算动态范围
-        """
-        dark_std = self.results.get('random_noise_std', 1)
-        saturated = np.percentile(gray_img, 99.9)
-        return 20 * np.log10(saturated / (dark_std + 1e-6))
-    
-    def _analyze_color_noise(self, color_img):
-        """
-        分析各颜色通道噪声特性
-        """
-        x, y, w, h = self.roi
-        channels = cv2.split(color_img)
-        color_results = {}
-        
-        for i, ch in enumerate(['B', 'G', 'R']):
-            patch = channels[i][y:y+h, x:x+w]
-            color_results[ch] = {
-                'mean': float(np.mean(patch)),
-                'std': float(np.std(patch)),
-                'snr': 20 * np.log10(np.mean(patch)/(np.std(patch)+1e-6))
-            }
-            
-        return color_results
-    
-    def generate_report(self):
-        """
-        生成测试报告文本
-        """
-        if not self.results:
-            return "未生成测试结果"
-            
-        report = f"""=== 图像噪声测试报告 ===
-测试时间: {self.results['timestamp']}
-图像尺寸: {self.results['image_size']}
-ROI区域: {self.results['roi']}
-
---- 基础噪声 ---
-均值: {self.results['random_noise_mean']:.2f}
-标准差: {self.results['random_noise_std']:.2f}
-动态范围: {self.results['dynamic_range']:.2f} dB
-
---- 色彩噪声 ---"""
-        
-        for ch, vals in self.results['color_noise'].items():
-            report += f"""
-{ch}通道:
-  均值: {vals['mean']:.2f}
-  标准差: {vals['std']:.2f}
-  信噪比: {vals['snr']:.2f} dB"""
-        
-        return report
-
-
 class ROISelectorDialog(wx.Dialog):
     def __init__(self, parent, image_path):
         super().__init__(parent, title="选择24色卡区域", size=(800, 600))
@@ -0,0 +1,142 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# 分块处理的默认内存预算（所有并行分块的工作内存之和）
+DEFAULT_MEMORY_BUDGET = 256 * 2 ** 20
+MIN_TILE = 64
+
+# src: 图像中含halo的分块切片；dst: 输出中对应的核心区域切片；core: 分块结果中核心区域的切片
+Tile = namedtuple('Tile', ['src', 'dst', 'core'])
+
+
+def _halo(halo):
+    """halo可为整数或 (前, 后)，窗口 [y - 前, y + 后] 非对称时（如偶数窗口）使用后者"""
+    if np.isscalar(halo):
+        return int(halo), int(halo)
+    before, after = halo
+    return int(before), int(after)
+
+
+def open_image(source, flags=cv2.IMREAD_GRAYSCALE):
+    """
+    打开图像用于分块处理，保持原始数据类型（不整体转换为浮点）
+    .npy 文件以内存映射方式打开，只在访问分块时读入；其他格式整幅解码
+    :param source: 图像路径或数组
+    """
+    if isinstance(source, np.ndarray):
+        return source
+    if str(source).lower().endswith('.npy'):
+        return np.load(source, mmap_mode='r')
+    image = cv2.imread(source, flags)
+    if image is None:
+        raise FileNotFoundError(f"图像未找到: {source}")
+    return image
+
+
+class FrameStack:
+    """
+    多帧图像的惰性堆叠：按空间切片取分块时才把各帧对应区域堆叠为 (F, h, w)，
+    各帧保持原始数据类型（可为内存映射），用于分块计算逐像素的多帧统计
+    """
+
+    def __init__(self, frames):
+        if not len(frames):
+            raise ValueError("未提供任何图像")
+        self.frames = list(frames)
+        self.shape = self.frames[0].shape[:2]
+        for frame in self.frames[1:]:
+            if frame.shape[:2] != self.shape:
+                raise ValueError(f"帧尺寸不一致: {frame.shape[:2]} != {self.shape}")
+        self.itemsize = self.frames[0].dtype.itemsize
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        return np.stack([frame[index] for frame in self.frames])
+
+
+def tile_size_for_budget(shape, halo=0, bytes_per_pixel=32, memory_budget=DEFAULT_MEMORY_BUDGET, workers=1):
+    """
+    按内存预算确定正方形分块边长：workers 个含halo的分块同时处理时工作内存不超过预算
+    :param bytes_per_pixel: 处理函数每像素的工作内存（输入转换、中间结果等）
+    """
+    before, after = _halo(halo)
+    side = int(np.sqrt(memory_budget / (bytes_per_pixel * max(workers, 1)))) - before - after
+    return max(MIN_TILE, min(side, max(shape[:2])))
+
+
+def iter_tiles(shape, tile_size, halo=0):
+    """
+    按行优先顺序产出覆盖整幅图像的分块；halo在图像边界处截断，
+    因此边界分块由处理函数自身的边界模式处理，与整幅计算一致
+    :param tile_size: 分块边长，或 (行数, 列数)
+    """
+    height, width = shape[:2]
+    tile_h, tile_w = (tile_size, tile_size) if np.isscalar(tile_size) else tile_size
+    before, after = _halo(halo)
+    for y0 in range(0, height, tile_h):
+        y1 = min(height, y0 + tile_h)
+        a, b = max(0, y0 - before), min(height, y1 + after)
+        for x0 in range(0, width, tile_w):
+            x1 = min(width, x0 + tile_w)
+            c, d = max(0, x0 - before), min(width, x1 + after)
+            yield Tile(src=(slice(a, b), slice(c, d)),
+                       dst=(slice(y0, y1), slice(x0, x1)),
+                       core=(slice(y0 - a, y1 - a), slice(x0 - c, x1 - c)))
+
+
+def _plan(image, halo, tile_size, memory_budget, workers, bytes_per_pixel):
+    workers = workers or os.cpu_count() or 1
+    if tile_size is None:
+        tile_size = tile_size_for_budget(image.shape, halo, bytes_per_pixel, memory_budget, workers)
+    tiles = list(iter_tiles(image.shape, tile_size, halo))
+    return tiles, min(workers, len(tiles))
+
+
+def map_tiles(func, image, halo=0, tile_size=None, memory_budget=DEFAULT_MEMORY_BUDGET, workers=None,
+              bytes_per_pixel=32, dtype=np.float32, out=None):
+    """
+    分块计算逐像素图（局部对比度、噪声图等）：每个含halo的分块调用 func，只写回核心区域
+    分块在线程池中并行（OpenCV/NumPy运算释放GIL），不同分块写入输出的不相交区域
+    :param func: func(分块数组) -> 与分块同尺寸的结果
+    :param image: 二维（或 H x W x C）数组，可为内存映射或 FrameStack
+    :param halo: 窗口半径，halo 内的结果与整幅计算完全一致
+    :param tile_size: 分块边长，None时按内存预算确定
+    :param out: 预分配的输出（如 np.lib.format.open_memmap 创建的文件映射），None时新建数组
+    :return: 输出数组
+    """
+    tiles, workers = _plan(image, halo, tile_size, memory_budget, workers, bytes_per_pixel)
+    if out is None:
+        out = np.empty(image.shape[:2], dtype=dtype)
+
+    def run(tile):
+        out[tile.dst] = func(np.asarray(image[tile.src]))[tile.core]
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # list() 使分块中的异常在此抛出
+            list(executor.map(run, tiles))
+    else:
+        for tile in tiles:
+            run(tile)
+    return out
+
+
+def reduce_tiles(func, image, halo=0, tile_size=None, memory_budget=DEFAULT_MEMORY_BUDGET, workers=None,
+                 bytes_per_pixel=32):
+    """
+    分块计算并返回各分块的结果（用于统计量、候选点等无需整幅输出的计算）
+    :param func: func(分块数组, Tile) -> 任意结果；核心区域在分块中的位置为 tile.core，
+                 在图像中的位置为 tile.dst
+    :return: 按分块顺序排列的结果列表
+    """
+    tiles, workers = _plan(image, halo, tile_size, memory_budget, workers, bytes_per_pixel)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda tile: func(np.asarray(image[tile.src]), tile), tiles))
+    return [func(np.asarray(image[tile.src]), tile) for tile in tiles]
@@ -1,10 +1,14 @@
 import os
+import json
 import requests
 import numpy as np
 from scipy.io import wavfile
-import librosa
+from audio_script.audio_loader import load_audio
 import random
 import pandas as pd
+from functools import lru_cache
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 ENV_NOISE_URLS = {
     '人声场景': 'https://cdn.jsdelivr.net/gh/karoldvl/ESC-50@master/audio/1-100032-A-0.wav',
@@ -17,6 +21,8 @@ ENV_NOISE_URLS = {
 ESC50_ROOT = r'D:/work/Repository/ESC-50'  # 可根据实际路径修改
 ESC50_AUDIO_DIR = os.path.join(ESC50_ROOT, 'audio')
 ESC50_META_CSV = os.path.join(ESC50_ROOT, 'meta', 'esc50.csv')
+# 预解码缓存目录：每个采样率一个float32连续数据文件 + 索引文件
+ESC50_CACHE_DIR = os.path.join(ESC50_ROOT, 'cache')
 
 # 环境类型到ESC-50类别的映射
 LOCAL_ENV_CATEGORIES = {
@@ -28,10 +34,94 @@ LOCAL_ENV_CATEGORIES = {
     '窗外车流声': ['engine', 'car_horn'],
 }
 
+@lru_cache(maxsize=1)
+def load_esc50_meta():
+    """读取ESC-50元数据，每个进程只读取一次"""
+    return pd.read_csv(ESC50_META_CSV)
+
 def get_all_esc50_categories():
-    df = pd.read_csv(ESC50_META_CSV)
+    df = load_esc50_meta()
     return sorted(df['category'].unique())
 
+def _esc50_cache_paths(sr, cache_dir):
+    base = os.path.join(cache_dir, f'esc50_{int(sr)}')
+    return base + '.f32', base + '.json'
+
+def build_esc50_cache(sr, cache_dir=ESC50_CACHE_DIR):
+    """
+    一次性预处理：将ESC-50全部样本解码并重采样到sr，顺序写入连续的float32文件，
+    同时记录每个样本的偏移/长度以及每个类别包含的样本索引
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    data_path, index_path = _esc50_cache_paths(sr, cache_dir)
+    df = load_esc50_meta()
+    offsets, lengths, categories = [], [], {}
+    offset = 0
+    print(f"[INFO] Building ESC-50 cache at {sr} Hz ({len(df)} clips) ...")
+    with open(data_path + '.tmp', 'wb') as f:
+        for i, (fname, category) in enumerate(zip(df['filename'], df['category'])):
+            y, _ = load_audio(os.path.join(ESC50_AUDIO_DIR, fname), sr=sr, mono=True)
+            y = np.ascontiguousarray(y, dtype=np.float32)
+            y.tofile(f)
+            offsets.append(offset)
+            lengths.append(len(y))
+            categories.setdefault(category, []).append(i)
+            offset += len(y)
+    index = {
+        'sr': int(sr),
+        'total': offset,
+        'filenames': df['filename'].tolist(),
+        'offsets': offsets,
+        'lengths': lengths,
+        'categories': categories,
+    }
+    os.replace(data_path + '.tmp', data_path)
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    return index
+
+class Esc50Cache:
+    """按采样率预解码的ESC-50样本库（内存映射），噪声拼接只做数组切片"""
+    def __init__(self, sr, cache_dir=ESC50_CACHE_DIR):
+        data_path, index_path = _esc50_cache_paths(sr, cache_dir)
+        if not (os.path.exists(data_path) and os.path.exists(index_path)):
+            build_esc50_cache(sr, cache_dir)
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        self.sr = sr
+        self.filenames = index['filenames']
+        self.offsets = np.asarray(index['offsets'], dtype=np.int64)
+        self.lengths = np.asarray(index['lengths'], dtype=np.int64)
+        self.categories = index['categories']
+        self.data = np.memmap(data_path, dtype=np.float32, mode='r', shape=(index['total'],))
+
+    def clip_indices(self, categories):
+        """多个类别的样本索引，保持元数据中的原始顺序"""
+        idx = []
+        for c in categories:
+            idx.extend(self.categories.get(c, []))
+        return sorted(idx)
+
+    def clip(self, i):
+        return self.data[self.offsets[i]:self.offsets[i] + self.lengths[i]]
+
+    def assemble(self, clip_ids, target_len, choice=random.choice, out=None):
+        """随机选取样本顺序拼接到target_len长度（写入预分配的out）"""
+        if out is None:
+            out = np.empty(target_len, dtype=np.float32)
+        pos = 0
+        while pos < target_len:
+            y = self.clip(choice(clip_ids))
+            n = min(len(y), target_len - pos)
+            out[pos:pos + n] = y[:n]
+            pos += n
+        return out
+
+@lru_cache(maxsize=None)
+def get_esc50_cache(sr):
+    """每个进程、每个采样率只打开一次缓存（不存在时自动构建）"""
+    return Esc50Cache(sr)
+
 def get_env_noise(env_type, duration, sr):
     os.makedirs('noise_generator/env_noises', exist_ok=True)
     url = ENV_NOISE_URLS[env_type]
@@ -43,8 +133,8 @@ def get_env_noise(env_type, duration, sr):
             r.raise_for_status()
             with open(local_path, 'wb') as f:
                 f.write(r.content)
-        print(f"[INFO] Loading {local_path} with librosa...")
-        y, orig_sr = librosa.load(local_path, sr=sr, mono=True)
+        print(f"[INFO] Loading {local_path} ...")
+        y, orig_sr = load_audio(local_path, sr=sr, mono=True)
         print(f"[INFO] Loaded. orig_sr={orig_sr}, target_sr={sr}, len={len(y)}")
         if len(y) < duration * sr:
             # 循环补齐
@@ -57,27 +147,33 @@ def get_env_noise(env_type, duration, sr):
         print(traceback.format_exc())
         raise 
 
-def get_local_env_noise(env_type, duration, sr, random_seed=None):
+def get_local_env_noise(env_type, duration, sr, random_seed=None, use_cache=True):
     """
     从本地ESC-50数据集按类别随机选取/拼接音频，返回目标时长的numpy数组
+    use_cache=True 时从预解码缓存切片拼接（首次使用某采样率时构建缓存）
     """
     if random_seed is not None:
         random.seed(random_seed)
-    # 读取csv
-    df = pd.read_csv(ESC50_META_CSV)
     # 支持多选因子
     categories = LOCAL_ENV_CATEGORIES.get(env_type, [env_type])
+    target_len = int(duration * sr)
+    if use_cache:
+        cache = get_esc50_cache(sr)
+        clip_ids = cache.clip_indices(categories)
+        if not clip_ids:
+            raise ValueError(f"未找到类别 {categories} 的音频样本")
+        return cache.assemble(clip_ids, target_len)
+    df = load_esc50_meta()
     files = df[df['category'].isin(categories)]['filename'].tolist()
     if not files:
         raise ValueError(f"未找到类别 {categories} 的音频样本")
     # 随机选取并拼接补齐
     y_all = []
     total_len = 0
-    target_len = int(duration * sr)
     while total_len < target_len:
         fname = random.choice(files)
         wav_path = os.path.join(ESC50_AUDIO_DIR, fname)
-        y, orig_sr = librosa.load(wav_path, sr=sr, mono=True)
+        y, orig_sr = load_audio(wav_path, sr=sr, mono=True)
         y_all.append(y)
         total_len += len(y)
     y_cat = np.concatenate(y_all)[:target_len]
@@ -99,4 +195,117 @@ def mix_local_env_noises(env_types, weights, duration, sr, mode='add', random_se
             mix = mix[:int(duration * sr)]
     else:
         raise ValueError('mode must be add or concat')
-    return mix 
\ No newline at end of file
+    return mix 
+
+class _CategoryStream:
+    """
+    单个环境类别的噪声流：预先按独立随机数生成器确定样本拼接顺序，
+    之后可以对任意时间段直接从缓存切片累加
+    """
+    def __init__(self, cache, env_type, base, length, weight, rng):
+        categories = LOCAL_ENV_CATEGORIES.get(env_type, [env_type])
+        clip_ids = np.asarray(cache.clip_indices(categories), dtype=np.int64)
+        if len(clip_ids) == 0:
+            raise ValueError(f"未找到类别 {categories} 的音频样本")
+        self.cache = cache
+        self.base = base
+        self.length = length
+        self.weight = weight
+        # 按平均样本长度批量抽取，直到覆盖目标长度
+        mean_len = max(int(np.mean(cache.lengths[clip_ids])), 1)
+        chosen = []
+        total = 0
+        while total < length:
+            batch = clip_ids[rng.integers(len(clip_ids), size=(length - total) // mean_len + 1)]
+            chosen.append(batch)
+            total += int(np.sum(cache.lengths[batch]))
+        self.clips = np.concatenate(chosen) if chosen else clip_ids[:0]
+        ends = base + np.cumsum(cache.lengths[self.clips])
+        self.starts = ends - cache.lengths[self.clips]
+
+    def add_into(self, out, start):
+        """将本流在 [start, start+len(out)) 内的部分加权累加到out"""
+        lo = max(start, self.base)
+        hi = min(start + len(out), self.base + self.length)
+        if lo >= hi:
+            return
+        i = int(np.searchsorted(self.starts, lo, side='right')) - 1
+        pos = lo
+        while pos < hi:
+            clip = self.cache.clip(self.clips[i])
+            a = pos - self.starts[i]
+            n = min(len(clip) - a, hi - pos)
+            seg = out[pos - start:pos - start + n]
+            if self.weight == 1:
+                seg += clip[a:a + n]
+            else:
+                seg += self.weight * clip[a:a + n]
+            pos += n
+            i += 1
+
+
+def _build_category_streams(env_types, weights, duration, sr, mode, seed, executor):
+    assert len(env_types) == len(weights)
+    weights = np.array(weights) / np.sum(weights)
+    target_len = int(duration * sr)
+    cache = get_esc50_cache(sr)
+    if mode == 'add':
+        layout = [(0, target_len, w) for w in weights]
+    elif mode == 'concat':
+        seg_lengths = (weights * duration * sr).astype(int)
+        bases = np.concatenate([[0], np.cumsum(seg_lengths)[:-1]])
+        layout = [(int(b), int(min(l, max(target_len - b, 0))), 1.0) for b, l in zip(bases, seg_lengths)]
+    else:
+        raise ValueError('mode must be add or concat')
+    # 每个类别一个独立的随机数生成器，结果与线程调度无关
+    rngs = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(len(env_types))]
+    futures = [executor.submit(_CategoryStream, cache, t, b, l, w, rng)
+               for t, (b, l, w), rng in zip(env_types, layout, rngs)]
+    return [f.result() for f in futures], target_len
+
+
+def _fill_block(streams, out, start):
+    out.fill(0)
+    # 固定的类别累加顺序保证浮点结果可复现
+    for stream in streams:
+        stream.add_into(out, start)
+    return out
+
+
+def mix_local_env_noises_parallel(env_types, weights, duration, sr, mode='add', seed=None,
+                                  max_workers=None, block_seconds=10.0):
+    """
+    并行版mix_local_env_noises：各类别噪声流在线程池中生成，按时间块并行原地累加到同一个输出缓冲，
+    不再为每个类别分配整段数组。seed用于派生每个类别独立的numpy.random.Generator，结果可复现。
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        streams, target_len = _build_category_streams(env_types, weights, duration, sr, mode, seed, executor)
+        mix = np.empty(target_len, dtype=np.float32)
+        block = max(int(block_seconds * sr), 1)
+        futures = [executor.submit(_fill_block, streams, mix[s:s + block], s)
+                   for s in range(0, target_len, block)]
+        for f in futures:
+            f.result()
+    return mix
+
+
+def iter_local_env_noise_mix(env_types, weights, duration, sr, mode='add', seed=None,
+                             max_workers=None, block_seconds=10.0):
+    """流式混合：按顺序逐块产出混合噪声，线程池中最多预先计算 2*max_workers 个块，内存占用恒定"""
+    workers = max_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        streams, target_len = _build_category_streams(env_types, weights, duration, sr, mode, seed, executor)
+        block = max(int(block_seconds * sr), 1)
+        starts = iter(range(0, target_len, block))
+        pending = deque()
+        prefetch = 2 * workers
+        while True:
+            while len(pending) < prefetch:
+                s = next(starts, None)
+                if s is None:
+                    break
+                buf = np.empty(min(block, target_len - s), dtype=np.float32)
+                pending.append(executor.submit(_fill_block, streams, buf, s))
+            if not pending:
+                break
+            yield pending.popleft().result()
@@ -1,6 +1,10 @@
 import numpy as np
+import soundfile as sf
 from scipy.signal import butter, lfilter
 
+# 流式生成的默认块大小（采样点）
+DEFAULT_BLOCK_SIZE = 65536
+
 class NoiseGeneratorBase:
     def __init__(self, duration, sr, amplitude=1.0):
         self.duration = duration
@@ -11,22 +15,55 @@ class NoiseGeneratorBase:
     def generate(self):
         raise NotImplementedError
 
+    def reset(self):
+        """重置流式生成的内部状态"""
+        pass
+
+    def generate_block(self, n):
+        """流式生成下一段n个采样点，块间保持状态连续"""
+        raise NotImplementedError
+
 class WhiteNoiseGenerator(NoiseGeneratorBase):
     def generate(self):
         return self.amplitude * np.random.normal(0, 1, self.samples)
 
+    def generate_block(self, n):
+        return self.amplitude * np.random.normal(0, 1, n)
+
 class PinkNoiseGenerator(NoiseGeneratorBase):
+    # 专业IIR滤波器法生成粉噪声
+    # 参考: https://www.dsprelated.com/showarticle/908.php
+    b = [0.049922035, 0.095993537, 0.050612699, -0.004408786]
+    a = [1, -2.494956002, 2.017265875, -0.522189400]
+    # 流式生成无法得知全局峰值，按输出标准差的固定倍数归一化
+    PEAK_FACTOR = 6.0
+
+    def __init__(self, duration, sr, amplitude=1.0):
+        super().__init__(duration, sr, amplitude)
+        self.reset()
+
     def generate(self):
-        # 专业IIR滤波器法生成粉噪声
-        # 参考: https://www.dsprelated.com/showarticle/908.php
-        b = [0.049922035, 0.095993537, 0.050612699, -0.004408786]
-        a = [1, -2.494956002, 2.017265875, -0.522189400]
         white = np.random.randn(self.samples)
-        from scipy.signal import lfilter
-        pink = lfilter(b, a, white)
+        pink = lfilter(self.b, self.a, white)
         pink = pink / np.max(np.abs(pink))  # 归一化
         return self.amplitude * pink
 
+    def reset(self):
+        self._zi = np.zeros(len(self.a) - 1)
+
+    def _stream_scale(self):
+        # 单位白噪声输入时滤波器输出的标准差 = 冲激响应能量的平方根
+        impulse = np.zeros(8192)
+        impulse[0] = 1.0
+        h = lfilter(self.b, self.a, impulse)
+        return 1.0 / (self.PEAK_FACTOR * np.sqrt(np.sum(h ** 2)))
+
+    def generate_block(self, n):
+        if not hasattr(self, '_scale'):
+            self._scale = self._stream_scale()
+        pink, self._zi = lfilter(self.b, self.a, np.random.randn(n), zi=self._zi)
+        return self.amplitude * self._scale * pink
+
 def apply_envelope(signal, sr, env_type='none', **kwargs):
     if env_type == 'none':
         return signal
@@ -56,18 +93,59 @@ def apply_envelope(signal, sr, env_type='none', **kwargs):
     else:
         return signal
 
-def butter_filter(signal, sr, filter_type='none', cutoff=None, order=5, band=None):
-    if filter_type == 'none' or cutoff is None:
-        return signal
+def envelope_block(start, n, total, env_type='none', **kwargs):
+    """
+    计算总长total的包络中[start, start+n)一段，与apply_envelope的整段包络逐点一致。
+    'lfo'包络需要跨块保持相位，由NoiseStream处理。
+    """
+    idx = np.arange(start, start + n, dtype=np.float64)
+    if env_type == 'linear':
+        return idx / max(total - 1, 1)
+    elif env_type == 'adsr':
+        a, d, s, r = kwargs.get('a',0.1), kwargs.get('d',0.1), kwargs.get('s',0.7), kwargs.get('r',0.1)
+        a_len = int(a * total)
+        d_len = int(d * total)
+        s_len = int((1-a-d-r) * total)
+        r_start = a_len + d_len + s_len
+        # 分段线性：起音 0->1，衰减 1->s，保持 s，释音 s->0（最后一点为0）
+        env = np.full(n, s, dtype=np.float64)
+        m = idx < a_len
+        env[m] = idx[m] / a_len
+        m = (idx >= a_len) & (idx < a_len + d_len)
+        env[m] = 1 + (s - 1) * (idx[m] - a_len) / d_len
+        m = idx >= r_start
+        r_len = total - r_start
+        env[m] = s - s * (idx[m] - r_start) / max(r_len - 1, 1) if r_len > 1 else s
+        return env
+    return np.ones(n)
+
+class _Lfo:
+    """跨块保持相位的正弦调制器"""
+    def __init__(self, freq, sr):
+        self.step = 2 * np.pi * freq / sr
+        self.phase = 0.0
+
+    def next(self, n):
+        phase = self.phase + self.step * np.arange(n)
+        self.phase = (self.phase + self.step * n) % (2 * np.pi)
+        return np.sin(phase)
+
+def _butter_coeffs(sr, filter_type='none', cutoff=None, order=5, band=None):
     nyq = 0.5 * sr
+    if filter_type == 'none' or cutoff is None:
+        return None
     if filter_type in ['lowpass', 'highpass']:
-        normal_cutoff = cutoff / nyq
-        b, a = butter(order, normal_cutoff, btype=filter_type.replace('pass',''))
+        return butter(order, cutoff / nyq, btype=filter_type.replace('pass',''))
     elif filter_type in ['bandpass', 'bandstop'] and band is not None:
         low, high = band
-        b, a = butter(order, [low/nyq, high/nyq], btype=filter_type.replace('pass',''))
-    else:
+        return butter(order, [low/nyq, high/nyq], btype=filter_type.replace('pass',''))
+    return None
+
+def butter_filter(signal, sr, filter_type='none', cutoff=None, order=5, band=None):
+    coeffs = _butter_coeffs(sr, filter_type, cutoff, order, band)
+    if coeffs is None:
         return signal
+    b, a = coeffs
     return lfilter(b, a, signal)
 
 def apply_periodic_modulation(signal, sr, freq=2, depth=0.5):
@@ -75,13 +153,68 @@ def apply_periodic_modulation(signal, sr, freq=2, depth=0.5):
     lfo = 1 + depth * np.sin(2 * np.pi * freq * t)
     return signal * lfo
 
-def generate_noise(noise_type, duration, sr, amplitude=1.0, env_type='none', env_kwargs=None, filter_type='none', filter_kwargs=None, periodic_modulation=False, periodic_kwargs=None):
+def _make_generator(noise_type, duration, sr, amplitude):
     if noise_type == 'White Noise':
-        generator = WhiteNoiseGenerator(duration, sr, amplitude)
+        return WhiteNoiseGenerator(duration, sr, amplitude)
     elif noise_type == 'Pink Noise':
-        generator = PinkNoiseGenerator(duration, sr, amplitude)
-    else:
-        raise ValueError(f"Unsupported noise type: {noise_type}")
+        return PinkNoiseGenerator(duration, sr, amplitude)
+    raise ValueError(f"Unsupported noise type: {noise_type}")
+
+class NoiseStream:
+    """
+    流式噪声生成器：按固定块大小迭代输出，与generate_noise的处理链相同
+    （噪声 -> 包络 -> 滤波 -> 周期调制），IIR滤波器状态zi与LFO相位在块间延续，
+    内存占用与总时长无关。
+    """
+    def __init__(self, noise_type, duration, sr, amplitude=1.0, env_type='none', env_kwargs=None,
+                 filter_type='none', filter_kwargs=None, periodic_modulation=False, periodic_kwargs=None,
+                 block_size=DEFAULT_BLOCK_SIZE):
+        self.generator = _make_generator(noise_type, duration, sr, amplitude)
+        self.sr = sr
+        self.samples = self.generator.samples
+        self.block_size = block_size
+        self.env_type = env_type
+        self.env_kwargs = env_kwargs or {}
+        self.filter_coeffs = _butter_coeffs(sr, filter_type, **(filter_kwargs or {}))
+        self.periodic_modulation = periodic_modulation
+        self.periodic_kwargs = periodic_kwargs or {}
+
+    def __iter__(self):
+        self.generator.reset()
+        env_lfo = _Lfo(self.env_kwargs.get('freq', 2), self.sr) if self.env_type == 'lfo' else None
+        mod_lfo = _Lfo(self.periodic_kwargs.get('freq', 2), self.sr) if self.periodic_modulation else None
+        depth = self.periodic_kwargs.get('depth', 0.5)
+        if self.filter_coeffs is not None:
+            b, a = self.filter_coeffs
+            zi = np.zeros(max(len(a), len(b)) - 1)
+        start = 0
+        while start < self.samples:
+            n = min(self.block_size, self.samples - start)
+            block = self.generator.generate_block(n)
+            if env_lfo is not None:
+                block *= 0.5 * (1 + env_lfo.next(n))
+            elif self.env_type in ('linear', 'adsr'):
+                block *= envelope_block(start, n, self.samples, self.env_type, **self.env_kwargs)
+            if self.filter_coeffs is not None:
+                block, zi = lfilter(b, a, block, zi=zi)
+            if mod_lfo is not None:
+                block *= 1 + depth * mod_lfo.next(n)
+            start += n
+            yield block
+
+def write_noise_wav(path, noise_type, duration, sr, subtype='PCM_16', **kwargs):
+    """将流式生成的噪声逐块写入WAV文件，返回写入的采样点数"""
+    stream = NoiseStream(noise_type, duration, sr, **kwargs)
+    written = 0
+    with sf.SoundFile(path, 'w', samplerate=sr, channels=1, subtype=subtype) as f:
+        for block in stream:
+            f.write(np.clip(block, -1.0, 1.0))
+            f.flush()
+            written += len(block)
+    return written
+
+def generate_noise(noise_type, duration, sr, amplitude=1.0, env_type='none', env_kwargs=None, filter_type='none', filter_kwargs=None, periodic_modulation=False, periodic_kwargs=None):
+    generator = _make_generator(noise_type, duration, sr, amplitude)
     signal = generator.generate()
     if env_kwargs is None:
         env_kwargs = {}
@@ -96,4 +229,7 @@ def generate_noise(noise_type, duration, sr, amplitude=1.0, env_type='none', env
     return signal
 
 # Example usage:
-# noise = generate_noise('White Noise', 5, 16000, amplitude=0.5, env_type='linear', filter_type='lowpass', filter_kwargs={'cutoff':3000}) 
\ No newline at end of file
+# noise = generate_noise('White Noise', 5, 16000, amplitude=0.5, env_type='linear', filter_type='lowpass', filter_kwargs={'cutoff':3000})
+# 长时间噪声流式写入（内存占用恒定）:
+# write_noise_wav('soak.wav', 'Pink Noise', 3600, 48000, amplitude=0.5, filter_type='highpass', filter_kwargs={'cutoff':100})
+# for block in NoiseStream('Pink Noise', 3600, 48000, amplitude=0.5): play(block) 
\ No newline at end of file